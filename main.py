@@ -1,12 +1,15 @@
 import sys
 import os
+from datetime import timedelta
 from pathlib import Path
 
 import flet as ft
 
 from dotenv import load_dotenv
 
-from utils.database.trading_db_postgres import TradingDBPostgres
+from utils.database import create_database
+from utils.database.pnl_recorder import PnlRecorder
+from utils.position_monitor import PositionMonitor
 
 load_dotenv(override=True)
 
@@ -36,6 +39,7 @@ def initialize_registry():
                 'telegram_bot_token': "",
                 'admin_ids': [],
                 'api_url': "http://localhost:8000",
+                'db_backend': "postgres",
                 'db_path': "",
                 'bot_users_db': "",
                 'auto_start': False,
@@ -64,7 +68,7 @@ def load_config():
 
     return token, admin_ids
 
-def initialize_bot():
+def initialize_bot(db=None):
     script_dir = Path(__file__).parent
     bot_dir = script_dir / 'tg_bot'
 
@@ -80,11 +84,25 @@ def initialize_bot():
 
     if not token:
         print("⚠️ Bot token missing → demo mode")
-        bot = TradingBot(token="demo", admin_ids=admins)
+        bot = TradingBot(token="demo", admin_ids=admins, db=db)
         bot.has_valid_token = False
         return bot
 
-    bot = TradingBot(token=token, admin_ids=admins)
+    from settings import config
+    # без реестра load_config() только что прочитал .env — берём значения заново,
+    # а не снимок, сделанный при импорте config
+    if config.get_setting('bot_process', config.BOT_PROCESS) == "process":
+        # бот в своём процессе: рассылки не тормозят UI и наоборот
+        from tg_bot.process import BotProcess
+        print("🤖 Bot runs in a separate process")
+        return BotProcess(
+            token,
+            admins,
+            heartbeat_interval=float(config.get_setting('bot_heartbeat_interval', config.BOT_HEARTBEAT_INTERVAL)),
+            heartbeat_timeout=float(config.get_setting('bot_heartbeat_timeout', config.BOT_HEARTBEAT_TIMEOUT))
+        )
+
+    bot = TradingBot(token=token, admin_ids=admins, db=db)
     bot.has_valid_token = True
     return bot
 
@@ -93,7 +111,10 @@ class App:
     def __init__(self):
         self.trading_bot = None
         self.page: ft.Page | None = None
-        self.db = TradingDBPostgres()
+        self.db = create_database()
+        self.pnl_recorder = None
+        self.position_monitor = None
+        self.terminal_page = None
         self.main_container = ft.Container(expand=True)
 
 
@@ -102,11 +123,29 @@ class App:
 
         initialize_registry()
 
+        from settings import config
+        self.pnl_recorder = PnlRecorder(
+            self.db,
+            sample_interval=config.PNL_SAMPLE_INTERVAL,
+            retention=timedelta(days=config.PNL_RETENTION_DAYS)
+        )
+        self.pnl_recorder.start()
+
+        # TP/SL отслеживаются в своём потоке, независимо от открытой вкладки
+        self.position_monitor = PositionMonitor(
+            self.db,
+            interval=config.POSITION_MONITOR_INTERVAL,
+            reload_interval=config.POSITION_MONITOR_RELOAD,
+            pnl_recorder=self.pnl_recorder
+        )
+        self.position_monitor.subscribe(self._on_position_closed)
+
         ws = WindowSettings()
         cl = Colors()
 
         page.window.icon = str(BASE_DIR / "terminal_icon.ico")
-        self.trading_bot = initialize_bot()
+        self.trading_bot = initialize_bot(self.db)
+        self.position_monitor.start()
 
         page.window.height = ws.height
         page.window.width = ws.width
@@ -119,14 +158,16 @@ class App:
         app_bar = pages.AppBarTop(page, cl, on_tab_change=self.change_tab)
 
         # стартовая страница
-        terminal_page = pages.TerminalPage(
+        self.terminal_page = pages.TerminalPage(
             page,
             cl,
             database=self.db,
-            trading_bot=self.trading_bot
+            trading_bot=self.trading_bot,
+            pnl_recorder=self.pnl_recorder,
+            position_monitor=self.position_monitor
         )
 
-        self.main_container.content = terminal_page.app_page
+        self.main_container.content = self.terminal_page.app_page
 
         page.add(
             ft.Column(
@@ -151,19 +192,42 @@ class App:
             return
 
         if tab_name == "terminal":
-            view = pages.TerminalPage(
+            self.terminal_page = pages.TerminalPage(
                 self.page,
                 Colors(),
                 database=self.db,
-                trading_bot=self.trading_bot
+                trading_bot=self.trading_bot,
+                pnl_recorder=self.pnl_recorder,
+                position_monitor=self.position_monitor
             )
 
-            self.main_container.content = view.app_page
+            self.main_container.content = self.terminal_page.app_page
 
         elif tab_name == "database":
+            self.terminal_page = None
             view = pages.DatabasePage(self.page, Colors(),database=self.db)
             self.main_container.content = view.app_page
 
+    def _on_position_closed(self, event):
+        """Подписчик PositionMonitor: вызывается из его потока"""
+        self.pnl_recorder.forget(event.position_id)
+
+        bot = self.trading_bot
+        if bot and bot.has_valid_token and self.page:
+            bot.remove_position(event.position_id)
+            self.page.run_task(
+                bot.notify_position_closed,
+                event.name,
+                event.pos_type,
+                event.entry_price,
+                event.close_price,
+                event.close_reason,
+                event.final_pnl
+            )
+
+        if self.terminal_page:
+            self.terminal_page.on_position_closed(event)
+
 
 
 
@@ -2,21 +2,26 @@ import webbrowser
 
 import flet as ft
 import threading, time
-import utils.webbrowser_open as wbb
 import sys
 import os
 import asyncio
 from datetime import datetime
 from parsing.coin_price_parcing import get_bybit_futures_price
+from pages.position_list import PositionList
+from tg_bot.outbox import PRIORITY_ALERT
+from utils.position_rows import PositionRows, load_positions
 from typing import Dict, Optional
 
 
 
 class TerminalPage:
-    def __init__(self, page, cl, database, trading_bot=None):
+    def __init__(self, page, cl, database, trading_bot=None, pnl_recorder=None, position_monitor=None):
         self.page = page
         self.cl = cl
         self.trading_bot = trading_bot
+        self.pnl_recorder = pnl_recorder
+        # TP/SL закрывает PositionMonitor, страница только отображает
+        self.position_monitor = position_monitor
         self._stop_update = False
         self._stop_price_updates = False
         self._is_shutting_down = False
@@ -35,7 +40,7 @@ class TerminalPage:
         # Создаем UI элементы
         self._create_text_fields()
         self._create_buttons()
-        self._create_position_containers()
+        self._create_position_list()
         self._create_change_price_containers()
         self._create_target_container()
 
@@ -98,6 +103,16 @@ class TerminalPage:
     def _load_positions_from_db(self):
         self.page.run_task(self._load_positions_from_db_async)
 
+    def on_position_closed(self, event):
+        """PositionMonitor закрыл позицию (вызов из его потока)"""
+        for pos in self._positions_cache:
+            if pos.get("id") == event.position_id:
+                # карточка сразу показывает TP/SL HIT, не дожидаясь БД
+                pos["is_active"] = False
+                pos["close_reason"] = event.close_reason
+                pos["final_pnl"] = event.final_pnl
+        self._load_positions_from_db()
+
     async def _start_price_updates_async(self):
         from parsing.detected_24h_price import get_global_screener
         screener = get_global_screener()
@@ -120,24 +135,20 @@ class TerminalPage:
             await asyncio.sleep(2)
     async def _load_positions_from_db_async(self):
         try:
-            positions = await asyncio.to_thread(
-                self.db.get_all_positions,
-                False
-            )
+            # активные целиком, закрытые — только последние CLOSED_LIMIT
+            positions = await asyncio.to_thread(load_positions, self.db)
 
             self._positions_cache = positions
+            self.position_rows.set_positions(positions)
 
-            price_cache = await self._get_prices_async(positions)
-
-            for i in range(8):
-                if i < len(positions):
-                    pos = positions[i]
-                    name = pos.get("name")
-                    last_price = price_cache.get(name, "N/A")
-                    self._update_container_with_data(i, pos, last_price)
-                else:
-                    self._clear_position_container(i)
+            snapshot = self.position_monitor.snapshot if self.position_monitor else None
+            if snapshot is not None:
+                self.position_rows.set_prices(snapshot.prices, snapshot)
+            else:
+                price_cache = await self._get_prices_async(positions)
+                self.position_rows.set_prices(price_cache)
 
+            self.position_list.render()
             self.page.update()
 
         except Exception as e:
@@ -219,25 +230,14 @@ class TerminalPage:
         )
         self.cancel_delete_button.visible = False
 
-    def _create_position_containers(self):
-        """Создает контейнеры для позиций"""
-        self.position_containers = []
-        for i in range(8):
-            container = ft.Container(
-                width=330,
-                height=190,
-                bgcolor=self.cl.color_bg,
-                border_radius=20,
-                content=ft.Column(
-                    controls=[
-                        ft.Text(f'Позиция {i + 1}', color=self.cl.text_secondary),
-                        ft.Text('Отсутствует', color=self.cl.text_secondary, size=12),
-                    ],
-                    alignment=ft.MainAxisAlignment.CENTER,
-                    horizontal_alignment=ft.CrossAxisAlignment.CENTER
-                )
-            )
-            self.position_containers.append(container)
+    def _create_position_list(self):
+        """Список позиций: видимые карточки переиспользуются при прокрутке"""
+        self.position_rows = PositionRows()
+        self.position_list = PositionList(
+            self.cl,
+            self.position_rows,
+            on_select=self._delete_selected_position
+        )
 
     def _create_field_group(self, label, field):
         """Создает группу с меткой и полем ввода"""
@@ -406,22 +406,28 @@ class TerminalPage:
                     await asyncio.sleep(1)
                     continue
 
-                # берём уникальные монеты
-                coins = {p["name"] for p in self._positions_cache if p.get("name")}
+                snapshot = self.position_monitor.snapshot if self.position_monitor else None
+                if snapshot is not None:
+                    # цены и PnL уже посчитал монитор за свой тик
+                    self.position_rows.set_prices(snapshot.prices, snapshot)
+                else:
+                    # берём уникальные монеты
+                    coins = {p["name"] for p in self._positions_cache if p.get("name")}
 
-                async def fetch(coin):
-                    data = await asyncio.to_thread(get_bybit_futures_price, coin)
-                    return coin, data["last_price"] if data["found"] else None
+                    async def fetch(coin):
+                        data = await asyncio.to_thread(get_bybit_futures_price, coin)
+                        return coin, data["last_price"] if data["found"] else None
 
-                results = await asyncio.gather(*(fetch(c) for c in coins))
-                price_map = dict(results)
+                    results = await asyncio.gather(*(fetch(c) for c in coins))
+                    self.position_rows.set_prices(dict(results))
 
-                # обновляем UI + TP/SL
-                for i, pos in enumerate(self._positions_cache[:8]):
-                    price = price_map.get(pos["name"])
-                    if price is not None:
-                        self._update_container_with_data(i, pos, price)
+                    # сэмпл для временного ряда PnL (буферизуется, пишется пачкой)
+                    if self.pnl_recorder:
+                        for position_id, price, pnl in self.position_rows.snapshot.rows():
+                            self.pnl_recorder.record(position_id, price, pnl)
 
+                # только отображение видимых карточек: TP/SL закрывает PositionMonitor
+                self.position_list.render()
                 self.page.update()
 
             except Exception as e:
@@ -701,31 +707,17 @@ class TerminalPage:
                     f"<a href='https://www.binance.com/en/trade/{alert['name'].replace('USDT', '_USDT')}'>Open Binance</a>"
                 )
 
-                import threading
-
-                def send_in_thread():
-                    """Отправка в отдельном потоке"""
-                    import asyncio
-
-                    # Создаем новый event loop для этого потока
-                    loop = asyncio.new_event_loop()
-                    asyncio.set_event_loop(loop)
-
-                    try:
-                        # Запускаем асинхронную отправку
-                        loop.run_until_complete(self.trading_bot.send_to_all_users(message))
-                        print(f"✅ Уведомление об алерте {alert['name']} отправлено")
-                    except Exception as e:
-                        print(f"❌ Ошибка отправки в Telegram: {e}")
-                    finally:
-                        loop.close()
+                async def send_alert():
+                    await self.trading_bot.notify(
+                        message, symbol=alert['name'], priority=PRIORITY_ALERT
+                    )
+                    print(f"✅ Уведомление об алерте {alert['name']} поставлено в очередь")
 
-                # Запускаем отправку в отдельном потоке
-                thread = threading.Thread(target=send_in_thread, daemon=True)
-                thread.start()
+                # Рассылка идёт в общем event loop бота (rate limiter привязан к нему)
+                self.page.run_task(send_alert)
 
             else:
-                print("⚠️ TradingBot не инициализирован или нет метода send_to_all_users")
+                print("⚠️ TradingBot не инициализирован или нет метода notify")
 
         except Exception as e:
             print(f"❌ Ошибка отправки в Telegram: {e}")
@@ -841,23 +833,8 @@ class TerminalPage:
                                                 color=self.cl.text_primary),
                                 alignment=ft.alignment.center
                             ),
-                            ft.Row(
-                                controls=[
-                                    ft.Column(
-                                        controls=self.position_containers[:4],
-                                        spacing=15,
-                                        horizontal_alignment=ft.CrossAxisAlignment.CENTER
-                                    ),
-                                    ft.Column(
-                                        controls=self.position_containers[4:],
-                                        spacing=15,
-                                        horizontal_alignment=ft.CrossAxisAlignment.CENTER
-                                    )
-                                ],
-                                spacing=20,
-                                alignment=ft.MainAxisAlignment.CENTER,
-                                vertical_alignment=ft.CrossAxisAlignment.START
-                            )
+                            self.position_list.toolbar,
+                            self.position_list.list_view
                         ],
                         horizontal_alignment=ft.CrossAxisAlignment.CENTER,
                         spacing=20
@@ -925,158 +902,6 @@ class TerminalPage:
             controls=[first_column, second_column, third_column],
         )
 
-    def _update_container_with_data(self, index: int, position_data: Dict, last_price: str):
-        try:
-
-            # --- base data ---
-            id = position_data.get('id')
-            name = position_data.get('name')
-            pos_type = position_data.get('pos_type')
-
-            entry_price = float(position_data.get('entry_price')) if position_data.get(
-                'entry_price') is not None else None
-            tp = float(position_data.get('take_profit')) if position_data.get('take_profit') is not None else None
-            sl = float(position_data.get('stop_loss')) if position_data.get('stop_loss') is not None else None
-            cross_margin = float(position_data.get('cross_margin')) if position_data.get(
-                'cross_margin') is not None else None
-            percent = float(position_data.get('percent')) if position_data.get('percent') is not None else None
-
-            is_active = position_data.get('is_active', True)
-            close_reason = position_data.get('close_reason')
-
-            last_price_f = float(last_price) if last_price != "N/A" else None
-
-            # --- pnl calculation ---
-            if entry_price and last_price_f and cross_margin:
-                entry = float(entry_price)
-                current = float(last_price_f)
-                leverage = float(cross_margin)
-
-                if pos_type == "short":
-                    pnl_percent = (entry - current) / entry * leverage * 100
-                else:  # long
-                    pnl_percent = (current - entry) / entry * leverage * 100
-
-                pnl_percent = round(pnl_percent, 2)
-            else:
-                pnl_percent = 0.0
-
-
-            # --- TP / SL check ---
-            tp_hit = sl_hit = False
-            if is_active and last_price_f:
-                if pos_type == "short":
-                    tp_hit = tp and last_price_f <= tp
-                    sl_hit = sl and last_price_f >= sl
-                else:
-                    tp_hit = tp and last_price_f >= tp
-                    sl_hit = sl and last_price_f <= sl
-
-            # --- close position ---
-            if is_active and (tp_hit or sl_hit):
-                close_reason = "tp" if tp_hit else "sl"
-
-                self.db.update_position(
-                    position_id=id,
-                    is_active=False,
-                    close_reason=close_reason,
-                    closed_at=datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-                    final_pnl=pnl_percent
-                )
-
-                is_active = False
-
-                if self.trading_bot:
-                    self.trading_bot.remove_position(id)
-
-            # --- status / color ---
-            if not is_active:
-                status = "TP HIT" if close_reason == "tp" else "SL HIT"
-                text_color = ft.Colors.GREEN_400 if close_reason == "tp" else ft.Colors.RED_400
-            else:
-                status = f"+{pnl_percent}%" if pnl_percent > 0 else f"{pnl_percent}%"
-                text_color = ft.Colors.GREEN_400 if pnl_percent > 0 else ft.Colors.RED_400
-
-            # --- UI ---
-            self.position_containers[index].content = ft.Column(
-                alignment=ft.MainAxisAlignment.CENTER,
-                horizontal_alignment=ft.CrossAxisAlignment.CENTER,
-                spacing=6,
-                controls=[
-                    ft.Text(
-                        f"ID: {id} | {name.upper()}",
-                        size=16,
-                        weight=ft.FontWeight.W_600
-                    ),
-
-                    ft.Row(
-                        alignment=ft.MainAxisAlignment.CENTER,
-                        controls=[
-                            ft.Text(
-                                pos_type.upper(),
-                                color=ft.Colors.GREEN_400 if pos_type == "long" else ft.Colors.RED_400,
-                                weight=ft.FontWeight.W_600
-                            ),
-                            ft.Text(f"| CROSS: {cross_margin} | PERCENT: {percent}%")
-                        ]
-                    ),
-
-                    ft.Text(f"Entry: {entry_price} | Current: {last_price}"),
-                    ft.Text(f"TP: {tp or 'N/A'} | SL: {sl or 'N/A'}"),
-                    ft.Text(status, color=text_color, weight=ft.FontWeight.W_700),
-
-                    ft.Row(
-                        alignment=ft.MainAxisAlignment.CENTER,
-                        spacing=6,
-                        controls=[
-                            ft.ElevatedButton(
-                                "Bybit",
-                                bgcolor=self.cl.secondary_bg,
-                                color=self.cl.text_primary,
-                                width=70,
-                                height=32,
-                                on_click=lambda e: wbb.bybit_open(name)
-                            ),
-                            ft.ElevatedButton(
-                                "Binance",
-                                bgcolor=self.cl.secondary_bg,
-                                color=self.cl.text_primary,
-                                width=70,
-                                height=32,
-                                on_click=lambda e: wbb.binance_open(name)
-                            ),
-                            ft.ElevatedButton(
-                                "BingX",
-                                bgcolor=self.cl.secondary_bg,
-                                color=self.cl.text_primary,
-                                width=70,
-                                height=32,
-                                on_click=lambda e: wbb.binx_open(name)
-                            ),
-                            ft.ElevatedButton(
-                                "Mexc",
-                                bgcolor=self.cl.secondary_bg,
-                                color=self.cl.text_primary,
-                                width=70,
-                                height=32,
-                                on_click=lambda e: wbb.mexc_open(name)
-                            ),
-                        ]
-                    )
-                ]
-            )
-
-            # --- delete mode ---
-            if self.delete_mode:
-                self.position_containers[index].border = ft.border.all(2, ft.Colors.RED_400)
-                self.position_containers[index].on_click = lambda e, i=index: self._delete_selected_position(i)
-            else:
-                self.position_containers[index].border = None
-                self.position_containers[index].on_click = None
-
-        except Exception as e:
-            print(f"❌ Ошибка обновления позиции {index}: {e}")
-
     def _update_single_price_container(self, index: int, pair_data: Optional[Dict]):
         """Обновляет один контейнер с ценой"""
         container = self.change_price_containers[index]
@@ -1181,13 +1006,9 @@ class TerminalPage:
         )
         self.cancel_delete_button.visible = self.delete_mode
 
-        for idx, container in enumerate(self.position_containers):
-            if self.delete_mode and idx < len(self._positions_cache):
-                container.border = ft.border.all(2, ft.Colors.RED_400)
-                container.on_click = lambda e, i=idx: self._delete_selected_position(i)
-            else:
-                container.border = None
-                container.on_click = None
+        # видимые карточки получают рамку и обработчик клика
+        self.position_list.delete_mode = self.delete_mode
+        self.position_list.render()
 
         self._show_message(
             "🔴 РЕЖИМ УДАЛЕНИЯ АКТИВЕН" if self.delete_mode else "✅ Режим удаления отключен"
@@ -1202,11 +1023,9 @@ class TerminalPage:
         self.delete_position_button.bgcolor = self.cl.surface
         self.cancel_delete_button.visible = False
 
-        # Сбрасываем стили контейнеров
-        for container in self.position_containers:
-            container.bgcolor = self.cl.color_bg
-            container.border = None
-            container.on_click = None
+        # Сбрасываем стили карточек
+        self.position_list.delete_mode = False
+        self.position_list.render()
 
         print("✅ Режим удаления отменен")
         self._show_message("✅ Режим удаления отменен")
@@ -1214,21 +1033,20 @@ class TerminalPage:
         if self.page:
             self.page.update()
 
-    def _delete_selected_position(self, index: int):
+    def _delete_selected_position(self, pos: Dict):
         if not self.delete_mode:
             return
 
-        if index >= len(self._positions_cache):
+        if not pos or pos.get("id") is None:
             self._show_message("❌ Позиция не найдена", is_error=True)
             return
 
-        pos = self._positions_cache[index]
-        self._show_delete_confirmation(pos["id"], pos["name"], index)
+        self._show_delete_confirmation(pos["id"], pos["name"])
 
     async def _delete_position_async(self, position_id: int):
         return await asyncio.to_thread(self.db.delete_position, position_id)
 
-    def _show_delete_confirmation(self, position_id, position_name, index):
+    def _show_delete_confirmation(self, position_id, position_name):
 
         async def confirm_delete_async():
             success = await self._delete_position_async(position_id)
@@ -1238,6 +1056,8 @@ class TerminalPage:
 
                 if self.trading_bot:
                     self.trading_bot.remove_position(position_id)
+                if self.position_monitor:
+                    self.position_monitor.wake()
 
                 self._load_positions_from_db()
             else:
@@ -1271,14 +1091,14 @@ class TerminalPage:
         if self.page:
             self.page.update()
 
-    async def _get_prices_async(self, positions: list[Dict]) -> Dict[str, str]:
+    async def _get_prices_async(self, positions: list[Dict]) -> Dict[str, Optional[float]]:
         coins = {p["name"] for p in positions if p.get("name")}
         if not coins:
             return {}
 
         async def fetch(coin):
             data = await asyncio.to_thread(get_bybit_futures_price, coin)
-            return coin, data["last_price"] if data["found"] else "N/A"
+            return coin, data["last_price"] if data["found"] else None
 
         results = await asyncio.gather(*(fetch(c) for c in coins))
         return dict(results)
@@ -1316,6 +1136,8 @@ class TerminalPage:
             )
 
             if pid:
+                if self.position_monitor:
+                    self.position_monitor.wake()
                 self._load_positions_from_db()
                 self.page.update()
 
@@ -1348,28 +1170,3 @@ class TerminalPage:
 
         except Exception as e:
             print(f"⚠️ Ошибка закрытия позиции: {e}")
-
-    def _clear_position_container(self, index: int):
-        """Очищает контейнер позиции (если позиции нет)"""
-        if index >= len(self.position_containers):
-            return
-
-        self.position_containers[index].content = ft.Column(
-            controls=[
-                ft.Text(
-                    f'Позиция {index + 1}',
-                    color=self.cl.text_secondary
-                ),
-                ft.Text(
-                    'Отсутствует',
-                    color=self.cl.text_secondary,
-                    size=12
-                ),
-            ],
-            alignment=ft.MainAxisAlignment.CENTER,
-            horizontal_alignment=ft.CrossAxisAlignment.CENTER
-        )
-
-        self.position_containers[index].bgcolor = self.cl.color_bg
-        self.position_containers[index].border = None
-        self.position_containers[index].on_click = None
@@ -2,15 +2,19 @@ import webbrowser
 
 import flet as ft
 
+from utils.database.analytics import TradingAnalytics
+
 class DatabasePage:
     def __init__(self, page, cl, database, trading_bot=None):
         self.page = page
         self.cl = cl
         self.trading_bot = trading_bot
         self.db = database
-        self.users_count = len(self.db.get_active_users())
+        self.analytics = TradingAnalytics(self.db)
+        self.stats_text = self.analytics.format_summary(html=False)
         self.users_all_info = []
         self.load_user_from_db()
+        self.users_count = len(self.users_all_info)
         self._create_buttons_user()
 
         self.app_page = self._build_app_view()
@@ -20,8 +24,8 @@ class DatabasePage:
 
         self.users_buttons = []
         for i in range(self.users_count):
-            username = self.users_all_info[i]['username'] or 'no_username'
-            user_id = self.users_all_info[i]['user_id']
+            username = self.users_all_info[i].username or 'no_username'
+            user_id = self.users_all_info[i].user_id
             button = ft.ElevatedButton(
                     text=f'{username} | {user_id}',
                     on_click= lambda e: webbrowser.open(f't.me/{username}'),
@@ -36,7 +40,7 @@ class DatabasePage:
 
 #LOAD FUNCS
     def load_user_from_db(self):
-        self.users_all_info = self.db.get_active_users()
+        self.users_all_info = list(self.db.iter_users(columns=("user_id", "username")))
         return
 
 #UPDATE FUNCS
@@ -55,7 +59,9 @@ class DatabasePage:
                     content=ft.Column(
                         controls=[
                             ft.Text(
-                                'Text'
+                                self.stats_text,
+                                size=16,
+                                color=self.cl.text_primary
                             )
                         ]
                     )
@@ -0,0 +1,278 @@
+import math
+from typing import Callable, Dict, Optional
+
+import flet as ft
+
+import utils.webbrowser_open as wbb
+from utils.position_rows import (
+    PositionRows,
+    SIDE_ANY,
+    SORT_CREATED,
+    SORT_NAME,
+    SORT_PNL,
+    STATUS_ACTIVE,
+    STATUS_ANY,
+    STATUS_CLOSED,
+)
+
+CARD_WIDTH = 330
+CARD_HEIGHT = 190
+# высота строки сетки вместе с отступом — по ней считается, какие строки видны
+ROW_EXTENT = 205
+
+SORT_OPTIONS = {
+    "Newest": (SORT_CREATED, True),
+    "Oldest": (SORT_CREATED, False),
+    "PnL ↓": (SORT_PNL, True),
+    "PnL ↑": (SORT_PNL, False),
+    "Name": (SORT_NAME, False),
+}
+
+
+class PositionCard:
+    """Карточка-слот: контролы создаются один раз, bind() меняет только значения"""
+
+    def __init__(self, cl, on_click: Callable[[Dict], None]):
+        self.cl = cl
+        self.position: Optional[Dict] = None
+        self._on_click = on_click
+
+        self.title = ft.Text(size=16, weight=ft.FontWeight.W_600)
+        self.side = ft.Text(weight=ft.FontWeight.W_600)
+        self.details = ft.Text()
+        self.prices = ft.Text()
+        self.levels = ft.Text()
+        self.status = ft.Text(weight=ft.FontWeight.W_700)
+
+        exchanges = (
+            ("Bybit", wbb.bybit_open),
+            ("Binance", wbb.binance_open),
+            ("BingX", wbb.binx_open),
+            ("Mexc", wbb.mexc_open),
+        )
+        buttons = [
+            ft.ElevatedButton(
+                label,
+                bgcolor=cl.secondary_bg,
+                color=cl.text_primary,
+                width=70,
+                height=32,
+                on_click=lambda e, open_exchange=open_exchange: self._open(open_exchange)
+            )
+            for label, open_exchange in exchanges
+        ]
+
+        self.container = ft.Container(
+            width=CARD_WIDTH,
+            height=CARD_HEIGHT,
+            bgcolor=cl.color_bg,
+            border_radius=20,
+            visible=False,
+            content=ft.Column(
+                alignment=ft.MainAxisAlignment.CENTER,
+                horizontal_alignment=ft.CrossAxisAlignment.CENTER,
+                spacing=6,
+                controls=[
+                    self.title,
+                    ft.Row(alignment=ft.MainAxisAlignment.CENTER, controls=[self.side, self.details]),
+                    self.prices,
+                    self.levels,
+                    self.status,
+                    ft.Row(alignment=ft.MainAxisAlignment.CENTER, spacing=6, controls=buttons),
+                ]
+            )
+        )
+
+    def _open(self, open_exchange):
+        if self.position:
+            open_exchange(self.position.get("name"))
+
+    def _click(self, e):
+        if self.position:
+            self._on_click(self.position)
+
+    def bind(self, position: Dict, price, pnl: Optional[float], delete_mode: bool):
+        self.position = position
+
+        name = position.get("name") or ""
+        pos_type = position.get("pos_type") or ""
+        is_active = position.get("is_active", True)
+        close_reason = position.get("close_reason")
+
+        self.title.value = f"ID: {position.get('id')} | {name.upper()}"
+        self.side.value = pos_type.upper()
+        self.side.color = ft.Colors.GREEN_400 if pos_type == "long" else ft.Colors.RED_400
+        self.details.value = f"| CROSS: {position.get('cross_margin')} | PERCENT: {position.get('percent')}%"
+        self.prices.value = f"Entry: {position.get('entry_price')} | Current: {price if price is not None else 'N/A'}"
+        self.levels.value = f"TP: {position.get('take_profit') or 'N/A'} | SL: {position.get('stop_loss') or 'N/A'}"
+
+        if not is_active:
+            self.status.value = "TP HIT" if close_reason == "tp" else "SL HIT"
+            self.status.color = ft.Colors.GREEN_400 if close_reason == "tp" else ft.Colors.RED_400
+        else:
+            pnl = pnl or 0.0
+            self.status.value = f"+{pnl}%" if pnl > 0 else f"{pnl}%"
+            self.status.color = ft.Colors.GREEN_400 if pnl > 0 else ft.Colors.RED_400
+
+        self.container.border = ft.border.all(2, ft.Colors.RED_400) if delete_mode else None
+        self.container.on_click = self._click if delete_mode else None
+        self.container.visible = True
+
+    def clear(self):
+        self.position = None
+        self.container.on_click = None
+        self.container.visible = False
+
+
+class PositionList:
+    """
+    Виртуализированный список позиций: сетка из columns карточек в строке,
+    но контролы есть только для видимых строк (плюс overscan). При прокрутке
+    слоты переиспользуются — им назначаются другие позиции, а место
+    невидимых строк занимают два спейсера. Стоимость отрисовки не зависит
+    от числа позиций; сортировка и фильтр — в памяти (PositionRows)
+    """
+
+    def __init__(
+        self,
+        cl,
+        rows: PositionRows,
+        on_select: Callable[[Dict], None],
+        viewport_height: int = 740,
+        columns: int = 2,
+        overscan: int = 1,
+    ):
+        self.cl = cl
+        self.rows = rows
+        self.columns = columns
+        self.overscan = overscan
+        self.delete_mode = False
+        self._first_row = 0
+
+        self.pool_rows = math.ceil(viewport_height / ROW_EXTENT) + 2 * overscan
+        self.cards = [PositionCard(cl, on_select) for _ in range(self.pool_rows * columns)]
+
+        self.top_spacer = ft.Container(height=0)
+        self.bottom_spacer = ft.Container(height=0)
+        self.empty_text = ft.Text('Позиций нет', color=cl.text_secondary, visible=False)
+        self.grid_rows = [
+            ft.Container(
+                height=ROW_EXTENT,
+                content=ft.Row(
+                    controls=[card.container for card in self.cards[i:i + columns]],
+                    spacing=20,
+                    alignment=ft.MainAxisAlignment.CENTER,
+                    vertical_alignment=ft.CrossAxisAlignment.START
+                )
+            )
+            for i in range(0, len(self.cards), columns)
+        ]
+        self.list_view = ft.Column(
+            height=viewport_height,
+            spacing=0,
+            scroll=ft.ScrollMode.AUTO,
+            on_scroll=self._on_scroll,
+            on_scroll_interval=30,
+            horizontal_alignment=ft.CrossAxisAlignment.CENTER,
+            controls=[
+                self.top_spacer,
+                self.empty_text,
+                *self.grid_rows,
+                self.bottom_spacer,
+            ]
+        )
+
+        self.counter = ft.Text(color=cl.text_secondary, size=12)
+        self.search = ft.TextField(
+            hint_text='Coin',
+            width=140,
+            height=40,
+            bgcolor=cl.color_bg,
+            border_radius=16,
+            border_color=cl.secondary_bg,
+            text_style=ft.TextStyle(color=cl.text_primary, size=14),
+            on_change=lambda e: self._apply_filter(query=e.control.value),
+        )
+        self.side_filter = self._dropdown(
+            {"All sides": SIDE_ANY, "Long": "long", "Short": "short"},
+            lambda value: self._apply_filter(side=value)
+        )
+        self.status_filter = self._dropdown(
+            {"All": STATUS_ANY, "Active": STATUS_ACTIVE, "Closed": STATUS_CLOSED},
+            lambda value: self._apply_filter(status=value)
+        )
+        self.sort = self._dropdown(
+            {label: label for label in SORT_OPTIONS},
+            lambda value: self._apply_sort(value)
+        )
+        self.toolbar = ft.Row(
+            controls=[self.search, self.side_filter, self.status_filter, self.sort, self.counter],
+            spacing=10,
+            alignment=ft.MainAxisAlignment.CENTER,
+            vertical_alignment=ft.CrossAxisAlignment.CENTER
+        )
+
+    def _dropdown(self, options: Dict[str, str], on_change):
+        values = list(options.values())
+        return ft.Dropdown(
+            width=130,
+            value=values[0],
+            bgcolor=self.cl.color_bg,
+            border_radius=16,
+            border_color=self.cl.secondary_bg,
+            text_style=ft.TextStyle(color=self.cl.text_primary, size=14),
+            options=[ft.dropdown.Option(key=value, text=label) for label, value in options.items()],
+            on_change=lambda e: on_change(e.control.value),
+        )
+
+    # ==========================
+    # FILTER / SORT
+    # ==========================
+
+    def _apply_filter(self, **kwargs):
+        self.rows.set_filter(**kwargs)
+        self._rerender_from_top()
+
+    def _apply_sort(self, label: str):
+        self.rows.set_sort(*SORT_OPTIONS[label])
+        self._rerender_from_top()
+
+    def _rerender_from_top(self):
+        self._first_row = 0
+        self.render()
+        self.list_view.scroll_to(offset=0, duration=0)
+        self.list_view.update()
+        self.toolbar.update()
+
+    # ==========================
+    # VIRTUALIZATION
+    # ==========================
+
+    def _on_scroll(self, e: ft.OnScrollEvent):
+        first_row = max(0, int(e.pixels // ROW_EXTENT) - self.overscan)
+        if first_row == self._first_row:
+            return
+        self._first_row = first_row
+        self.render()
+        self.list_view.update()
+
+    def render(self):
+        """Назначает видимым слотам их позиции; контролы не создаются"""
+        total = len(self.rows)
+        total_rows = math.ceil(total / self.columns)
+        # после фильтра строк могло стать меньше, чем прокручено
+        self._first_row = min(self._first_row, max(0, total_rows - self.pool_rows))
+
+        first = self._first_row * self.columns
+        visible = self.rows.window(first, len(self.cards))
+        for card, position in zip(self.cards, visible):
+            card.bind(position, self.rows.price_of(position), self.rows.pnl_of(position), self.delete_mode)
+        for card in self.cards[len(visible):]:
+            card.clear()
+        for i, row in enumerate(self.grid_rows):
+            row.visible = i * self.columns < len(visible)
+
+        self.top_spacer.height = self._first_row * ROW_EXTENT
+        self.bottom_spacer.height = max(0, total_rows - self._first_row - self.pool_rows) * ROW_EXTENT
+        self.empty_text.visible = total == 0
+        self.counter.value = f"{total} поз."
@@ -41,6 +41,18 @@ class BybitFuturesAPI:
         except Exception as e:
             return None
 
+    def get_tickers(self, category: str = "linear") -> Dict[str, Dict]:
+        """Все тикеры категории одним запросом: {symbol: ticker}"""
+        data = self._make_request("market/tickers", {"category": category}, timeout=10)
+        if not data or data.get("retCode") != 0:
+            return {}
+
+        return {
+            ticker["symbol"]: ticker
+            for ticker in data.get("result", {}).get("list", [])
+            if ticker.get("symbol")
+        }
+
     def _fetch_category_instruments(self, category: str) -> List[Dict]:
         """Получение инструментов для категории"""
         data = self._make_request("market/instruments-info", {"category": category})
@@ -231,6 +243,46 @@ def get_bybit_futures_price(coin: str, max_workers: int = 10) -> Dict:
     api = BybitFuturesAPI(max_workers=max_workers)
     return api.search_futures(coin)
 
+_shared_api: Optional[BybitFuturesAPI] = None
+
+
+def get_bybit_last_prices(symbols: List[str]) -> Dict[str, Optional[float]]:
+    """
+    Последние цены сразу для нескольких символов.
+
+    Один запрос всех linear-тикеров вместо search_futures на каждый символ;
+    только не найденные в нём ищутся по-старому, параллельно
+
+    Returns:
+        dict: {symbol: last_price или None}
+    """
+    global _shared_api
+    if _shared_api is None:
+        # одна сессия на все вызовы — без нового TCP/TLS на каждый запрос
+        _shared_api = BybitFuturesAPI()
+
+    tickers = _shared_api.get_tickers("linear")
+
+    prices: Dict[str, Optional[float]] = {}
+    missing = []
+    for symbol in dict.fromkeys(symbols):
+        ticker = tickers.get(symbol.upper().strip())
+        try:
+            prices[symbol] = float(ticker["lastPrice"]) if ticker else None
+        except (KeyError, TypeError, ValueError):
+            prices[symbol] = None
+        if prices[symbol] is None:
+            missing.append(symbol)
+
+    if missing:
+        for symbol, result in search_multiple_coins(missing).items():
+            try:
+                prices[symbol] = float(result["last_price"]) if result.get("found") else None
+            except (KeyError, TypeError, ValueError):
+                prices[symbol] = None
+
+    return prices
+
 # Многопоточный поиск для нескольких монет одновременно
 def search_multiple_coins(coins: List[str], max_workers_per_search: int = 5) -> Dict[str, Dict]:
     """
@@ -0,0 +1,274 @@
+import bisect
+import concurrent.futures
+import logging
+import threading
+import time
+from typing import Dict, List, Optional
+
+from parsing.coin_price_parcing import BybitFuturesAPI, search_multiple_coins
+
+logger = logging.getLogger(__name__)
+
+
+class PriceCache:
+    """
+    Общий снимок цен всех linear-тикеров Bybit в памяти.
+
+    Снимок обновляется одним запросом market/tickers (фоновым потоком
+    раз в refresh_interval или по требованию, если старше ttl), поэтому
+    get() и complete() — обращение к словарю и бинарный поиск по
+    отсортированному списку символов, без сети.
+
+    Символы, которых нет в снимке, ищутся через fetch_missing(): все
+    промахи, пришедшие за coalesce_window, уходят одним поиском,
+    а не найденные запоминаются на miss_ttl, чтобы не долбить API
+    """
+
+    def __init__(
+        self,
+        api: BybitFuturesAPI | None = None,
+        ttl: float = 5.0,
+        refresh_interval: float = 2.0,
+        coalesce_window: float = 0.05,
+        miss_ttl: float = 60.0,
+    ):
+        self.api = api or BybitFuturesAPI()
+        self.ttl = ttl
+        self.refresh_interval = refresh_interval
+        self.coalesce_window = coalesce_window
+        self.miss_ttl = miss_ttl
+
+        self._prices: Dict[str, float] = {}
+        self._symbols: List[str] = []
+        # найденные поиском вне снимка: символ -> (цена, когда нашли)
+        self._extra: Dict[str, tuple[float, float]] = {}
+        # запрос пользователя -> символ контракта из поиска (PEPE -> 1000PEPEUSDT)
+        self._aliases: Dict[str, str] = {}
+        self._updated = 0.0
+        self._refresh_lock = threading.Lock()
+
+        # промахи: символ -> когда не нашли; следующий пакет поиска
+        self._misses: Dict[str, float] = {}
+        self._wanted: set[str] = set()
+        self._round: concurrent.futures.Future | None = None
+        self._lock = threading.Lock()
+
+        self._stop_flag = False
+        self._thread: threading.Thread | None = None
+
+    # ==========================
+    # SNAPSHOT
+    # ==========================
+
+    @property
+    def age(self) -> float:
+        return time.monotonic() - self._updated if self._updated else float("inf")
+
+    def refresh(self) -> bool:
+        """Один запрос всех тикеров; одновременные вызовы ждут один и тот же"""
+        started = time.monotonic()
+        with self._refresh_lock:
+            # пока ждали lock, снимок мог обновить другой поток
+            if self._updated >= started:
+                return True
+
+            tickers = self.api.get_tickers("linear")
+            if not tickers:
+                logger.warning("Price snapshot refresh failed, keeping the old one")
+                return False
+
+            prices = {}
+            for symbol, ticker in tickers.items():
+                try:
+                    prices[symbol] = float(ticker["lastPrice"])
+                except (KeyError, TypeError, ValueError):
+                    continue
+
+            now = time.monotonic()
+            for symbol, (price, found_at) in list(self._extra.items()):
+                if now - found_at < self.ttl and symbol not in prices:
+                    prices[symbol] = price
+                else:
+                    del self._extra[symbol]
+
+            # новый словарь и список целиком: читатели без lock видят либо старый, либо новый
+            self._prices = prices
+            self._symbols = sorted(prices)
+            self._aliases = {
+                query: symbol for query, symbol in self._aliases.items() if symbol in prices
+            }
+            self._updated = now
+            return True
+
+    def get(self, symbol: str) -> Optional[float]:
+        """Цена из снимка: BTCUSDT, btcusdt или просто btc"""
+        symbol = self.normalize(symbol)
+        price = self._prices.get(symbol)
+        if price is None and not symbol.endswith("USDT"):
+            price = self._prices.get(symbol + "USDT")
+        if price is None and symbol in self._aliases:
+            price = self._prices.get(self._aliases[symbol])
+        return price
+
+    def resolve(self, symbol: str) -> Optional[str]:
+        """Символ снимка для пользовательского ввода или None"""
+        symbol = self.normalize(symbol)
+        if symbol in self._prices:
+            return symbol
+        if symbol + "USDT" in self._prices:
+            return symbol + "USDT"
+        alias = self._aliases.get(symbol)
+        if alias in self._prices:
+            return alias
+        return None
+
+    def complete(self, prefix: str, limit: int = 10) -> List[str]:
+        """Символы, начинающиеся с prefix, по алфавиту: O(log n + limit)"""
+        prefix = self.normalize(prefix)
+        symbols = self._symbols
+
+        result = []
+        for i in range(bisect.bisect_left(symbols, prefix), len(symbols)):
+            if not symbols[i].startswith(prefix) or len(result) >= limit:
+                break
+            result.append(symbols[i])
+        return result
+
+    @staticmethod
+    def normalize(symbol: str) -> str:
+        return symbol.strip().upper().lstrip("$")
+
+    # ==========================
+    # BATCH / MISSES
+    # ==========================
+
+    def prices(self, symbols: List[str]) -> Dict[str, Optional[float]]:
+        """
+        {symbol: price или None} — замена get_bybit_last_prices:
+        несвежий снимок обновляется одним запросом, промахи — fetch_missing
+        """
+        if self.age > self.ttl:
+            self.refresh()
+
+        result = {symbol: self.get(symbol) for symbol in dict.fromkeys(symbols)}
+        missing = [symbol for symbol, price in result.items() if price is None]
+        if missing:
+            result.update(self.fetch_missing(missing))
+        return result
+
+    __call__ = prices
+
+    def fetch_missing(self, symbols: List[str]) -> Dict[str, Optional[float]]:
+        """
+        Поиск символов, которых нет в снимке. Промахи всех потоков за
+        coalesce_window собираются в один пакет, все ждут его результата
+        """
+        now = time.monotonic()
+        wanted = {
+            self.normalize(symbol) for symbol in symbols
+            if now - self._misses.get(self.normalize(symbol), -self.miss_ttl) >= self.miss_ttl
+        }
+
+        if wanted:
+            with self._lock:
+                self._wanted |= wanted
+                future = self._round
+                leader = future is None
+                if leader:
+                    future = self._round = concurrent.futures.Future()
+
+            if leader:
+                self._run_round(future)
+            future.result()
+
+        return {symbol: self.get(symbol) for symbol in symbols}
+
+    def _run_round(self, future: concurrent.futures.Future):
+        # даём другим промахам присоединиться к пакету
+        time.sleep(self.coalesce_window)
+        with self._lock:
+            batch, self._wanted = self._wanted, set()
+            self._round = None
+
+        try:
+            found = self._lookup(batch)
+            future.set_result(found)
+        except Exception as e:
+            logger.exception("Missing symbols lookup failed")
+            future.set_exception(e)
+
+    def _lookup(self, batch: set[str]) -> int:
+        # новый листинг обычно уже есть в свежем снимке
+        if self.age > self.refresh_interval:
+            self.refresh()
+        still = [symbol for symbol in batch if self.get(symbol) is None]
+
+        # запрос -> (символ контракта, цена): поиск находит и 1000PEPEUSDT по PEPE
+        found = {}
+        if still:
+            for query, data in search_multiple_coins(still).items():
+                try:
+                    if data.get("found"):
+                        symbol = self.normalize(data.get("symbol") or query)
+                        found[query] = (symbol, float(data["last_price"]))
+                except (KeyError, TypeError, ValueError):
+                    pass
+
+        now = time.monotonic()
+        if found:
+            with self._refresh_lock:
+                self._extra.update((symbol, (price, now)) for symbol, price in found.values())
+                self._prices = {**self._prices, **dict(found.values())}
+                self._symbols = sorted(self._prices)
+                self._aliases = {
+                    **self._aliases,
+                    **{query: symbol for query, (symbol, _) in found.items() if query != symbol},
+                }
+
+        for symbol in still:
+            if symbol not in found:
+                self._misses[symbol] = now
+
+        logger.info("Missing symbols lookup | batch=%d found=%d", len(batch), len(batch) - len(still) + len(found))
+        return len(found)
+
+    # ==========================
+    # BACKGROUND REFRESH
+    # ==========================
+
+    def start(self):
+        if self._thread and self._thread.is_alive():
+            return self._thread
+
+        self._stop_flag = False
+        self._thread = threading.Thread(target=self._run, daemon=True, name="price_cache")
+        self._thread.start()
+        return self._thread
+
+    def stop(self):
+        self._stop_flag = True
+        if self._thread:
+            self._thread.join()
+            self._thread = None
+
+    def _run(self):
+        while not self._stop_flag:
+            try:
+                self.refresh()
+            except Exception:
+                logger.exception("Price cache refresh failed")
+            time.sleep(self.refresh_interval)
+
+
+_shared: Optional[PriceCache] = None
+_shared_lock = threading.Lock()
+
+
+def shared_price_cache() -> PriceCache:
+    """Один снимок цен на процесс — его читают бот, алерты и /positions"""
+    global _shared
+    if _shared is None:
+        with _shared_lock:
+            if _shared is None:
+                _shared = PriceCache()
+    return _shared
@@ -79,9 +79,53 @@ TELEGRAM_BOT_TOKEN = get_setting('telegram_bot_token', "")
 ADMIN_IDS = get_setting_list('admin_ids', [])
 API_URL = get_setting('api_url', "http://localhost:8000")
 
+DB_BACKEND = get_setting('db_backend', "postgres")
 DB_PATH = get_setting('db_path', get_default_db_path())
 BOT_USERS_DB = get_setting('bot_users_db', get_default_users_db_path())
 
+USER_FLUSH_INTERVAL_MS = int(get_setting('user_flush_interval_ms', 500))
+USER_FLUSH_MAX_ROWS = int(get_setting('user_flush_max_rows', 500))
+
+PNL_SAMPLE_INTERVAL = float(get_setting('pnl_sample_interval', 10))
+PNL_RETENTION_DAYS = int(get_setting('pnl_retention_days', 30))
+
+BROADCAST_RATE = float(get_setting('broadcast_rate', 25))
+BROADCAST_CONCURRENCY = int(get_setting('broadcast_concurrency', 20))
+# Дополнительные токены ботов для рассылки (через запятую): лимит — на каждый токен
+BROADCAST_TOKENS = get_setting_list('broadcast_tokens', [])
+
+# Режим получения апдейтов: 'polling' или 'webhook'
+BOT_MODE = get_setting('bot_mode', "polling")
+WEBHOOK_URL = get_setting('webhook_url', "")
+WEBHOOK_PATH = get_setting('webhook_path', "/telegram/webhook")
+WEBHOOK_SECRET = get_setting('webhook_secret', "")
+WEBHOOK_HOST = get_setting('webhook_host', "0.0.0.0")
+WEBHOOK_PORT = int(get_setting('webhook_port', 8080))
+WEBHOOK_MAX_CONCURRENCY = int(get_setting('webhook_max_concurrency', 50))
+
+# Где работает бот: 'inline' — в event loop UI, 'process' — отдельный процесс
+BOT_PROCESS = get_setting('bot_process', "inline")
+BOT_HEARTBEAT_INTERVAL = float(get_setting('bot_heartbeat_interval', 5))
+BOT_HEARTBEAT_TIMEOUT = float(get_setting('bot_heartbeat_timeout', 30))
+
+# Параллельная обработка апдейтов разных чатов и предел очереди
+UPDATE_CONCURRENCY = int(get_setting('update_concurrency', 20))
+UPDATE_MAX_PENDING = int(get_setting('update_max_pending', 500))
+
+# Не чаще одной правки «живой» карточки позиции за столько секунд
+LIVE_CARD_INTERVAL = float(get_setting('live_card_interval', 15))
+
+# Пользовательские алерты /alert: период проверки, сек, и лимит на пользователя
+ALERT_CHECK_INTERVAL = float(get_setting('alert_check_interval', 2))
+ALERT_MAX_PER_USER = int(get_setting('alert_max_per_user', 50))
+
+# Мониторинг TP/SL: период тика, сек, и сверки с БД (позиции из бота/других терминалов)
+POSITION_MONITOR_INTERVAL = float(get_setting('position_monitor_interval', 1))
+POSITION_MONITOR_RELOAD = float(get_setting('position_monitor_reload', 30))
+
+# События за это окно склеиваются в одну сводку на получателя (0 — выключено)
+DIGEST_WINDOW_MS = int(get_setting('digest_window_ms', 1500))
+
 AUTO_START = get_setting('auto_start', False)
 UPDATE_INTERVAL = get_setting('update_interval', 60)
 ENABLE_LOGGING = get_setting('enable_logging', True)
@@ -92,8 +136,34 @@ _settings_cache = {
     'telegram_bot_token': TELEGRAM_BOT_TOKEN,
     'admin_ids': ADMIN_IDS,
     'api_url': API_URL,
+    'db_backend': DB_BACKEND,
     'db_path': DB_PATH,
     'bot_users_db': BOT_USERS_DB,
+    'user_flush_interval_ms': USER_FLUSH_INTERVAL_MS,
+    'user_flush_max_rows': USER_FLUSH_MAX_ROWS,
+    'pnl_sample_interval': PNL_SAMPLE_INTERVAL,
+    'pnl_retention_days': PNL_RETENTION_DAYS,
+    'broadcast_rate': BROADCAST_RATE,
+    'broadcast_concurrency': BROADCAST_CONCURRENCY,
+    'broadcast_tokens': BROADCAST_TOKENS,
+    'bot_mode': BOT_MODE,
+    'webhook_url': WEBHOOK_URL,
+    'webhook_path': WEBHOOK_PATH,
+    'webhook_secret': WEBHOOK_SECRET,
+    'webhook_host': WEBHOOK_HOST,
+    'webhook_port': WEBHOOK_PORT,
+    'webhook_max_concurrency': WEBHOOK_MAX_CONCURRENCY,
+    'bot_process': BOT_PROCESS,
+    'bot_heartbeat_interval': BOT_HEARTBEAT_INTERVAL,
+    'bot_heartbeat_timeout': BOT_HEARTBEAT_TIMEOUT,
+    'update_concurrency': UPDATE_CONCURRENCY,
+    'update_max_pending': UPDATE_MAX_PENDING,
+    'live_card_interval': LIVE_CARD_INTERVAL,
+    'digest_window_ms': DIGEST_WINDOW_MS,
+    'alert_check_interval': ALERT_CHECK_INTERVAL,
+    'alert_max_per_user': ALERT_MAX_PER_USER,
+    'position_monitor_interval': POSITION_MONITOR_INTERVAL,
+    'position_monitor_reload': POSITION_MONITOR_RELOAD,
     'auto_start': AUTO_START,
     'update_interval': UPDATE_INTERVAL,
     'enable_logging': ENABLE_LOGGING,
@@ -108,7 +178,9 @@ def update_setting(key, value):
         if success:
             # Обновляем глобальные переменные
             global_vars = globals()
-            if key in ['telegram_bot_token', 'api_url', 'db_signals', 'bot_users_db', 'log_level']:
+            if key in ['telegram_bot_token', 'api_url', 'db_backend', 'db_signals', 'bot_users_db', 'log_level',
+                       'bot_mode', 'webhook_url', 'webhook_path', 'webhook_secret', 'webhook_host',
+                       'bot_process']:
                 global_vars[key.upper()] = value
             elif key == 'admin_ids':
                 global_vars['ADMIN_IDS'] = value
@@ -128,8 +200,34 @@ def get_all_settings():
         'telegram_bot_token': TELEGRAM_BOT_TOKEN,
         'admin_ids': ADMIN_IDS,
         'api_url': API_URL,
+        'db_backend': DB_BACKEND,
         'db_signals': DB_PATH,
         'bot_users_db': BOT_USERS_DB,
+        'user_flush_interval_ms': USER_FLUSH_INTERVAL_MS,
+        'user_flush_max_rows': USER_FLUSH_MAX_ROWS,
+        'pnl_sample_interval': PNL_SAMPLE_INTERVAL,
+        'pnl_retention_days': PNL_RETENTION_DAYS,
+        'broadcast_rate': BROADCAST_RATE,
+        'broadcast_concurrency': BROADCAST_CONCURRENCY,
+        'broadcast_tokens': BROADCAST_TOKENS,
+        'bot_mode': BOT_MODE,
+        'webhook_url': WEBHOOK_URL,
+        'webhook_path': WEBHOOK_PATH,
+        'webhook_secret': WEBHOOK_SECRET,
+        'webhook_host': WEBHOOK_HOST,
+        'webhook_port': WEBHOOK_PORT,
+        'webhook_max_concurrency': WEBHOOK_MAX_CONCURRENCY,
+        'bot_process': BOT_PROCESS,
+        'bot_heartbeat_interval': BOT_HEARTBEAT_INTERVAL,
+        'bot_heartbeat_timeout': BOT_HEARTBEAT_TIMEOUT,
+        'update_concurrency': UPDATE_CONCURRENCY,
+        'update_max_pending': UPDATE_MAX_PENDING,
+        'live_card_interval': LIVE_CARD_INTERVAL,
+        'digest_window_ms': DIGEST_WINDOW_MS,
+        'alert_check_interval': ALERT_CHECK_INTERVAL,
+        'alert_max_per_user': ALERT_MAX_PER_USER,
+        'position_monitor_interval': POSITION_MONITOR_INTERVAL,
+        'position_monitor_reload': POSITION_MONITOR_RELOAD,
         'auto_start': AUTO_START,
         'update_interval': UPDATE_INTERVAL,
         'enable_logging': ENABLE_LOGGING,
@@ -145,6 +243,9 @@ def reset_settings():
         'telegram_bot_token': "",
         'admin_ids': [],
         'api_url': "http://localhost:8000",
+        'db_backend': "postgres",
+        'bot_mode': "polling",
+        'bot_process': "inline",
         'db_path': get_default_db_path(),  # Используем путь по умолчанию
         'bot_users_db': get_default_users_db_path(),  # Используем путь по умолчанию
         'auto_start': False,
@@ -0,0 +1,110 @@
+import asyncio
+import random
+import time
+
+import pytest
+
+from tg_bot.alerts import PriceAlerts
+from tg_bot.outbox import PRIORITY_ALERT
+from utils.database.trading_db_sqlite import TradingDBSQLite
+from utils.triggers import ABOVE, BELOW, TriggerBook
+
+
+def test_trigger_book_pops_only_crossed_levels():
+    rng = random.Random(7)
+    symbols = [f"COIN{i}USDT" for i in range(300)]
+    book, alerts = TriggerBook(), {}
+
+    for key in range(100_000):
+        symbol = rng.choice(symbols)
+        level = rng.uniform(50, 150)
+        direction = rng.choice((ABOVE, BELOW))
+        book.add(key, symbol, level, direction)
+        alerts[key] = (symbol, level, direction)
+
+    assert len(book) == 100_000 and book.symbols() == sorted(symbols)
+
+    started = time.perf_counter()
+    fired = set()
+    for symbol in symbols:
+        fired.update(book.crossed(symbol, 101.0))
+    elapsed = time.perf_counter() - started
+
+    expected = {
+        key for key, (symbol, level, direction) in alerts.items()
+        if (direction == ABOVE and level <= 101.0) or (direction == BELOW and level >= 101.0)
+    }
+    assert fired == expected
+    assert len(book) == 100_000 - len(expected)
+    # тик по всем символам — доли секунды даже на 100k алертов
+    assert elapsed < 0.5
+
+    # повторный тик по той же цене ничего не снимает
+    assert all(book.crossed(symbol, 101.0) == [] for symbol in symbols)
+
+    key = next(iter(set(alerts) - expected))
+    assert book.remove(key) and key not in book and not book.remove(key)
+
+
+class RecordingOutbox:
+    def __init__(self):
+        self.jobs = []
+
+    async def enqueue(self, message, subscribers=None, priority=3, recipients=None):
+        self.jobs.append((message, priority, sorted(recipients)))
+        return len(self.jobs)
+
+
+def test_price_alerts_fire_once_and_survive_restart(tmp_path):
+    db = TradingDBSQLite(str(tmp_path / "trading.db"))
+    prices = {"BTCUSDT": 60000.0, "ETHUSDT": 3000.0}
+    outbox = RecordingOutbox()
+
+    async def run():
+        alerts = PriceAlerts(db, outbox, price_fetcher=lambda symbols: {s: prices[s] for s in symbols if s in prices})
+        assert (await alerts.add(1, "BTCUSDT", 65000))[1] == ABOVE
+        assert (await alerts.add(2, "BTCUSDT", 65000))[1] == ABOVE
+        assert (await alerts.add(2, "ETHUSDT", 2500))[1] == BELOW
+
+        # после перезапуска алерты поднимаются из БД
+        restarted = PriceAlerts(db, outbox, price_fetcher=alerts.price_fetcher)
+        await restarted.load()
+        assert len(restarted) == 3
+
+        assert await restarted.check({"BTCUSDT": 64000.0, "ETHUSDT": 2600.0}) == 0
+        assert await restarted.check({"BTCUSDT": 65010.0, "ETHUSDT": 2600.0}) == 2
+        assert await restarted.check({"BTCUSDT": 66000.0}) == 0
+        return restarted
+
+    restarted = asyncio.run(run())
+
+    # оба пользователя с одинаковым алертом — одно задание
+    assert len(outbox.jobs) == 1
+    message, priority, recipients = outbox.jobs[0]
+    assert recipients == [1, 2] and priority == PRIORITY_ALERT and "BTCUSDT" in message
+
+    assert restarted.alerts(1) == []
+    assert [row[1:] for row in db.get_price_alerts()] == [(2, "ETHUSDT", 2500.0, BELOW)]
+
+
+def test_invalid_alert_levels_are_rejected(tmp_path):
+    book = TriggerBook()
+    for level in (float("nan"), float("inf"), 0, -5.0):
+        with pytest.raises(ValueError):
+            book.add("bad", "BTCUSDT", level, BELOW)
+    assert len(book) == 0
+
+    db = TradingDBSQLite(str(tmp_path / "trading.db"))
+    alerts = PriceAlerts(db, RecordingOutbox(), price_fetcher=lambda symbols: {s: 120.0 for s in symbols})
+
+    async def run():
+        with pytest.raises(ValueError):
+            await alerts.add(1, "BTCUSDT", float("nan"))
+        await alerts.add(2, "BTCUSDT", 100.0)
+        await alerts.add(3, "BTCUSDT", 90.0)
+        # чужой NaN не влияет на срабатывание остальных
+        return alerts.book.crossed("BTCUSDT", 95.0), alerts.book.crossed("BTCUSDT", 50.0)
+
+    first, second = asyncio.run(run())
+    assert len(first) == 1 and len(second) == 1
+    assert [row[1] for row in db.get_price_alerts()] == [2, 3]
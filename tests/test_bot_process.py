@@ -0,0 +1,65 @@
+import asyncio
+import os
+import signal
+import time
+
+import pytest
+
+from tg_bot.process import BotProcess
+
+
+class EchoBot:
+    """Бот без Telegram: notify отвечает своим pid"""
+
+    def __init__(self, token, admin_ids):
+        self._stopped = None
+
+    async def start(self):
+        self._stopped = asyncio.Event()
+        await self._stopped.wait()
+
+    async def stop(self):
+        self._stopped.set()
+
+    async def notify(self, message, symbol=None, side=None, priority=3):
+        return os.getpid(), message
+
+
+def wait_for(condition, timeout=10.0):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if condition():
+            return True
+        time.sleep(0.05)
+    return False
+
+
+@pytest.mark.skipif(not hasattr(os, "fork"), reason="fork start method required")
+def test_bot_process_answers_and_restarts_after_crash():
+    process = BotProcess(
+        "demo",
+        heartbeat_interval=0.1,
+        heartbeat_timeout=5,
+        tick=0.05,
+        bot_factory=EchoBot,
+        start_method="fork",
+    )
+
+    async def run():
+        await process.start()
+        try:
+            first_pid, message = await process.notify("hello")
+            assert message == "hello" and first_pid != os.getpid()
+            assert wait_for(lambda: time.time() - process.last_heartbeat < 1)
+
+            os.kill(first_pid, signal.SIGKILL)
+            assert wait_for(lambda: process.restarts == 1)
+
+            second_pid, _ = await process.notify("again")
+            assert second_pid != first_pid
+            assert process._process.is_alive()
+        finally:
+            await process.stop(timeout=5)
+
+    asyncio.run(run())
+    assert not process._process.is_alive()
@@ -0,0 +1,82 @@
+import asyncio
+
+from tg_bot.digest import DigestCoalescer, DigestEvent
+from tg_bot.outbox import PRIORITY_SIGNAL, PRIORITY_TPSL
+from tg_bot.subscriptions import ANY, SubscriptionIndex
+from utils.database.trading_db_sqlite import TradingDBSQLite
+
+
+class EnqueueOnly:
+    """OutboxWorker без отправки: только постановка заданий"""
+
+    def __init__(self, db):
+        self.db = db
+
+    async def enqueue(self, message, subscribers=None, priority=3, recipients=None):
+        return self.db.enqueue_broadcast(message, subscribers, priority, recipients)
+
+
+def test_burst_becomes_one_digest_per_recipient(tmp_path):
+    db = TradingDBSQLite(str(tmp_path / "trading.db"))
+    db.add_users_bulk([(i, None, None, None) for i in range(1, 5)])
+    db.add_subscription(1, "BTCUSDT", ANY)
+    db.add_subscription(2, "ETHUSDT", ANY)
+
+    index = SubscriptionIndex()
+    index.load(db.get_all_subscriptions())
+
+    async def run():
+        digest = DigestCoalescer(EnqueueOnly(db), index, window_ms=50)
+        await digest.add("BTC SL", "BTCUSDT", "long", PRIORITY_TPSL)
+        await digest.add("ETH TP", "ETHUSDT", "short", PRIORITY_TPSL)
+        await digest.add("SOL signal", "SOLUSDT", "long", PRIORITY_SIGNAL)
+        await asyncio.sleep(0.1)
+
+    asyncio.run(run())
+
+    deliveries = db.claim_broadcast_batch(limit=100)
+    by_user = {}
+    for job_id, user_id, message, priority in deliveries:
+        by_user.setdefault(user_id, []).append(message)
+        assert priority == PRIORITY_TPSL
+
+    # 3 события × 4 пользователя = 12 отправок, а стало 4
+    assert len(deliveries) == 4
+    assert all(len(messages) == 1 for messages in by_user.values())
+    assert "BTC SL" in by_user[1][0] and "ETH TP" not in by_user[1][0]
+    assert "ETH TP" in by_user[2][0] and "BTC SL" not in by_user[2][0]
+    assert all(text in by_user[3][0] for text in ("BTC SL", "ETH TP", "SOL signal"))
+
+
+def test_digest_splits_long_bursts():
+    events = [DigestEvent("x" * 1000) for _ in range(8)]
+    parts = DigestCoalescer.render(events)
+    assert len(parts) == 3
+    assert all(len(part) < 4096 for part in parts)
+
+
+def test_failed_flush_keeps_events_and_retries(tmp_path):
+    db = TradingDBSQLite(str(tmp_path / "trading.db"))
+    db.add_users_bulk([(1, None, None, None)])
+
+    class FlakyOutbox(EnqueueOnly):
+        failures = 1
+
+        async def enqueue(self, *args, **kwargs):
+            if self.failures:
+                self.failures -= 1
+                raise RuntimeError("database is locked")
+            return await super().enqueue(*args, **kwargs)
+
+    async def run():
+        digest = DigestCoalescer(FlakyOutbox(db), SubscriptionIndex(), window_ms=30)
+        await digest.add("BTC SL", "BTCUSDT", "long", PRIORITY_TPSL)
+        await digest.add("ETH TP", "ETHUSDT", "short", PRIORITY_TPSL)
+        await asyncio.sleep(0.15)
+        return digest
+
+    digest = asyncio.run(run())
+
+    messages = [row[2] for row in db.claim_broadcast_batch(limit=10)]
+    assert len(messages) == 1 and "BTC SL" in messages[0] and "ETH TP" in messages[0]
+    assert digest._events == [] and digest._timer is None
@@ -0,0 +1,48 @@
+import asyncio
+
+from tg_bot.dispatch import ChatScheduler
+
+
+def test_chat_scheduler_orders_per_chat_and_runs_chats_concurrently():
+    events = []
+
+    async def handler(chat_id, n):
+        events.append(("start", chat_id, n))
+        await asyncio.sleep(0.05)
+        events.append(("end", chat_id, n))
+
+    async def run():
+        scheduler = ChatScheduler(max_concurrency=10)
+        started = asyncio.get_running_loop().time()
+        await asyncio.gather(*(
+            scheduler.run(chat_id, handler, chat_id, n)
+            for n in range(3) for chat_id in (1, 2, 3)
+        ))
+        return scheduler, asyncio.get_running_loop().time() - started
+
+    scheduler, elapsed = asyncio.run(run())
+
+    # 3 чата параллельно по 3 апдейта подряд: ~0.15 с, а не 0.45
+    assert elapsed < 0.3
+    for chat_id in (1, 2, 3):
+        chat_events = [(kind, n) for kind, c, n in events if c == chat_id]
+        assert chat_events == [("start", 0), ("end", 0), ("start", 1), ("end", 1), ("start", 2), ("end", 2)]
+
+    assert scheduler.handler_time.count == 9
+    assert scheduler.queue_wait.count == 9
+    assert scheduler.pending == 0
+
+
+def test_chat_scheduler_rejects_when_overloaded():
+    async def handler():
+        await asyncio.sleep(0.05)
+        return "ok"
+
+    async def run():
+        scheduler = ChatScheduler(max_concurrency=1, max_pending=2)
+        results = await asyncio.gather(*(scheduler.run(i, handler) for i in range(4)))
+        return scheduler, results
+
+    scheduler, results = asyncio.run(run())
+    assert results == ["ok", "ok", None, None]
+    assert scheduler.rejected == 2
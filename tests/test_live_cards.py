@@ -0,0 +1,93 @@
+import asyncio
+
+from tg_bot.live_cards import CLOSED_FOOTER, LiveCards
+from tg_bot.positions_view import PositionsView
+from utils.database.trading_db_sqlite import TradingDBSQLite
+from utils.portfolio import PortfolioState
+
+
+class FakeView:
+    def __init__(self, positions, prices):
+        self.positions, self.prices = positions, prices
+
+    async def snapshot(self):
+        return self.positions, self.prices
+
+    @property
+    def portfolio(self):
+        return PortfolioState(self.positions).evaluate(self.prices)
+
+
+class FakeBroadcaster:
+    def __init__(self):
+        self.edits = []
+        self.bot = self
+
+    async def edit_message_text(self, text, chat_id, message_id):
+        self.edits.append((chat_id, message_id, text))
+
+    async def call(self, chat_id, request, latency=None):
+        await request()
+        return True
+
+
+def test_live_cards_skip_unchanged_throttle_and_finalize(tmp_path):
+    db = TradingDBSQLite(str(tmp_path / "trading.db"))
+    position = {
+        "id": 1, "name": "BTCUSDT", "pos_type": "long", "cross_margin": 10,
+        "entry_price": 100.0, "take_profit": 120.0, "stop_loss": 90.0,
+    }
+    view = FakeView([position], {"BTCUSDT": 100.0})
+    broadcaster = FakeBroadcaster()
+
+    async def run():
+        cards = LiveCards(db, broadcaster, view, interval=0.2)
+        await cards.open(42, 1, 777, PositionsView.render_position(position, 100.0))
+
+        # цена та же — правки нет
+        assert await cards.refresh() == 0
+
+        # цена изменилась, но interval ещё не прошёл — ждём
+        view.prices = {"BTCUSDT": 101.0}
+        assert await cards.refresh() == 0
+
+        await asyncio.sleep(0.25)
+        view.prices = {"BTCUSDT": 102.0}
+        assert await cards.refresh() == 1
+
+        # позиция закрылась — финальная правка и карточка удаляется
+        view.positions = []
+        assert await cards.refresh() == 1
+        return cards
+
+    cards = asyncio.run(run())
+
+    assert len(broadcaster.edits) == 2
+    assert "+20.00%" in broadcaster.edits[0][2]
+    assert broadcaster.edits[1][2].endswith(CLOSED_FOOTER.strip())
+    assert cards.cards == {}
+    assert db.get_live_cards() == []
+
+
+def test_restored_card_of_closed_position_keeps_its_content(tmp_path):
+    db = TradingDBSQLite(str(tmp_path / "trading.db"))
+    position_id = db.add_to_db("BTCUSDT", 10, 10, 100.0, 120.0, 90.0, "long")
+    db.save_live_card(42, position_id, 777)
+    db.save_live_card(42, 999, 778)
+    # пока бот не работал, позиция закрылась по TP
+    db.close_position(position_id, close_reason="tp", final_pnl=200.0)
+
+    broadcaster = FakeBroadcaster()
+
+    async def run():
+        cards = LiveCards(db, broadcaster, FakeView([], {}), interval=0.2)
+        await cards.load()
+        assert await cards.refresh() == 1
+        return cards
+
+    cards = asyncio.run(run())
+
+    (chat_id, message_id, text), = broadcaster.edits
+    assert (chat_id, message_id) == (42, 777)
+    assert "BTCUSDT" in text and "+200.00%" in text and text.endswith(CLOSED_FOOTER.strip())
+    assert cards.cards == {} and db.get_live_cards() == []
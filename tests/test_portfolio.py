@@ -0,0 +1,41 @@
+import random
+import time
+
+from tg_bot.positions_view import pnl_percent
+from utils.portfolio import PortfolioState
+
+
+def test_portfolio_matches_scalar_pnl_and_stays_in_microseconds():
+    rng = random.Random(11)
+    symbols = [f"COIN{i}USDT" for i in range(200)]
+    positions = []
+    for position_id in range(1, 5001):
+        entry = rng.uniform(50, 150)
+        positions.append({
+            "id": position_id,
+            "name": rng.choice(symbols),
+            "pos_type": rng.choice(("long", "short")),
+            "entry_price": entry,
+            "cross_margin": rng.choice((1, 5, 10, 20)),
+            "percent": rng.choice((1, 5, 10)),
+        })
+    prices = {symbol: rng.uniform(50, 150) for symbol in symbols}
+    prices[symbols[0]] = None
+
+    state = PortfolioState(positions)
+    snapshot = state.evaluate(prices)
+
+    for pos in positions:
+        price = prices[pos["name"]]
+        expected = pnl_percent(pos["entry_price"], price, pos["cross_margin"], pos["pos_type"])
+        assert snapshot.pnl_of(pos["id"]) == expected
+
+    assert snapshot.exposure == sum(pos["percent"] * pos["cross_margin"] for pos in positions)
+    assert snapshot.long_exposure + snapshot.short_exposure == snapshot.exposure
+
+    started = time.perf_counter()
+    for _ in range(100):
+        state.evaluate(prices)
+    elapsed = (time.perf_counter() - started) / 100
+    # тик по 5000 позиций — сотни микросекунд, а не цикл по карточкам
+    assert elapsed < 0.002
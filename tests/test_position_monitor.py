@@ -0,0 +1,50 @@
+from utils.database.trading_db_sqlite import TradingDBSQLite
+from utils.position_monitor import PositionMonitor
+
+
+def test_monitor_closes_only_crossed_positions_and_notifies(tmp_path):
+    db = TradingDBSQLite(str(tmp_path / "trading.db"))
+    prices = {"BTCUSDT": 60000.0, "ETHUSDT": 3000.0}
+    quoted = []
+
+    def fetch(symbols):
+        quoted.append(list(symbols))
+        return {symbol: prices.get(symbol) for symbol in symbols}
+
+    long_btc = db.add_to_db("BTCUSDT", 10, 10, 60000.0, 66000.0, 57000.0, "long")
+    short_btc = db.add_to_db("BTCUSDT", 10, 5, 60000.0, 54000.0, 63000.0, "short")
+    long_eth = db.add_to_db("ETHUSDT", 10, 10, 3000.0, 3300.0, 0, "long")
+
+    monitor = PositionMonitor(db, price_fetcher=fetch, reload_interval=3600)
+    events = []
+    monitor.subscribe(events.append)
+
+    assert monitor.tick() == []
+    assert len(monitor) == 3 and quoted == [["BTCUSDT", "ETHUSDT"]]
+
+    # BTC вверх: TP лонга и SL шорта, ETH без изменений
+    prices["BTCUSDT"] = 66500.0
+    closed = monitor.tick()
+    assert {(e.position_id, e.close_reason) for e in closed} == {(long_btc, "tp"), (short_btc, "sl")}
+    assert events == closed
+    # из индекса сняты только пересечённые уровни и уровни закрытых позиций
+    assert len(monitor.book) == 1 and (long_eth, "tp") in monitor.book
+
+    by_id = {e.position_id: e for e in closed}
+    assert by_id[long_btc].final_pnl == round((66500 - 60000) / 60000 * 10 * 100, 2)
+    assert by_id[short_btc].final_pnl == round((60000 - 66500) / 60000 * 5 * 100, 2)
+
+    positions = {p["id"]: p for p in db.get_all_positions(active_only=False)}
+    assert not positions[long_btc]["is_active"] and positions[long_btc]["close_reason"] == "tp"
+    assert not positions[short_btc]["is_active"] and positions[short_btc]["close_reason"] == "sl"
+    assert positions[long_eth]["is_active"]
+
+    # закрытые больше не котируются, SL=0 — уровня нет
+    assert monitor.tick() == [] and quoted[-1] == ["ETHUSDT"]
+    prices["ETHUSDT"] = 1.0
+    assert monitor.tick() == []
+
+    # позиция, удалённая в другом месте, снимается при сверке с БД
+    db.delete_position(long_eth)
+    monitor.wake()
+    assert monitor.tick() == [] and len(monitor) == 0
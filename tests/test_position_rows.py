@@ -0,0 +1,59 @@
+from datetime import datetime
+
+from utils.database.trading_db_sqlite import TradingDBSQLite
+from utils.position_rows import SORT_CREATED, SORT_NAME, SORT_PNL, STATUS_ACTIVE, PositionRows, load_positions
+
+
+def test_rows_filter_and_sort_in_memory():
+    # порядок БД: активные первыми, затем по дате
+    positions = [
+        {"id": 3, "name": "ETHUSDT", "pos_type": "short", "entry_price": 100.0, "cross_margin": 10, "is_active": True,
+         "created_at": datetime(2026, 1, 3)},
+        {"id": 2, "name": "BTCUSDT", "pos_type": "long", "entry_price": 100.0, "cross_margin": 10, "is_active": True,
+         "created_at": datetime(2026, 1, 2)},
+        {"id": 4, "name": "NEWUSDT", "pos_type": "long", "entry_price": 100.0, "cross_margin": 10, "is_active": True,
+         "created_at": datetime(2026, 1, 2)},
+        {"id": 1, "name": "BTCUSDT", "pos_type": "long", "entry_price": 100.0, "cross_margin": 10,
+         "is_active": False, "close_reason": "sl", "final_pnl": -50.0,
+         "created_at": datetime(2026, 1, 4)},
+    ]
+    rows = PositionRows()
+    rows.set_positions(positions)
+    rows.set_prices({"BTCUSDT": 102.0, "ETHUSDT": 99.0, "NEWUSDT": None})
+
+    # по умолчанию — новые первыми, закрытая не уходит в конец; у неё — final_pnl
+    assert [pos["id"] for pos in rows.view()] == [1, 3, 4, 2]
+    assert rows.pnl_of(positions[0]) == 10.0 and rows.pnl_of(positions[3]) == -50.0
+
+    rows.set_sort(SORT_CREATED, descending=False)
+    assert [pos["id"] for pos in rows.view()] == [2, 4, 3, 1]
+
+    rows.set_sort(SORT_PNL)
+    assert [pos["id"] for pos in rows.view()] == [2, 3, 1, 4]
+
+    # новый тик меняет порядок без запроса в БД
+    rows.set_prices({"BTCUSDT": 98.0, "ETHUSDT": 99.0})
+    assert [pos["id"] for pos in rows.view()] == [3, 2, 1, 4]
+
+    rows.set_filter(query="btc", status=STATUS_ACTIVE)
+    assert [pos["id"] for pos in rows.view()] == [2]
+
+    rows.set_filter(query="", side="long", status="all")
+    rows.set_sort(SORT_NAME, descending=False)
+    assert [pos["id"] for pos in rows.window(1, 2)] == [2, 4]
+    assert len(rows) == 3
+
+
+def test_load_positions_keeps_active_and_recent_closed_only(tmp_path):
+    db = TradingDBSQLite(str(tmp_path / "trading.db"))
+    ids = [db.add_to_db(f"COIN{i}USDT", 1, 1, 10.0, 0, 0, "long") for i in range(30)]
+    for position_id in ids[:25]:
+        db.close_position(position_id, close_reason="tp", final_pnl=1.0)
+
+    positions = load_positions(db, closed_limit=10)
+    active = [pos["id"] for pos in positions if pos["is_active"]]
+    closed = [pos["id"] for pos in positions if not pos["is_active"]]
+    assert sorted(active) == ids[25:]
+    # только последние закрытые, новые первыми
+    assert closed == ids[15:25][::-1]
+    assert "closed_at" not in positions[0] and positions[0]["name"].startswith("COIN")
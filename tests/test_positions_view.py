@@ -0,0 +1,36 @@
+import asyncio
+
+from tg_bot.positions_view import PositionsView, pnl_percent
+from utils.database.trading_db_sqlite import TradingDBSQLite
+
+
+def test_pnl_percent_respects_side_and_leverage():
+    assert pnl_percent(100, 110, 10, "long") == 100.0
+    assert pnl_percent(100, 110, 10, "short") == -100.0
+    assert pnl_percent(100, None, 10, "long") is None
+
+
+def test_positions_view_single_flight_and_pages(tmp_path):
+    db = TradingDBSQLite(str(tmp_path / "trading.db"))
+    for i in range(5):
+        db.add_to_db(f"COIN{i}USDT", 10, 10, 100.0, 110.0, 95.0, "long")
+
+    calls = []
+
+    def fetch_prices(symbols):
+        calls.append(symbols)
+        return {symbol: 101.0 for symbol in symbols}
+
+    async def run():
+        view = PositionsView(db, price_fetcher=fetch_prices, ttl=60, page_size=2)
+        results = await asyncio.gather(*(view.pages() for _ in range(20)))
+        cached = await view.pages()
+        return results, cached
+
+    results, cached = asyncio.run(run())
+
+    # 20 одновременных /positions — одна выборка и один батч цен
+    assert len(calls) == 1 and len(calls[0]) == 5
+    assert all(pages is cached for pages in results)
+    assert len(cached) == 3
+    assert "стр. 1/3" in cached[0] and "+10.00%" in cached[0]
@@ -0,0 +1,164 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+import parsing.price_cache as price_cache
+from parsing.price_cache import PriceCache
+
+SYMBOLS = [f"{base}USDT" for base in ("BTC", "BCH", "BNB", "BTT", "ETH", "ETC", "SOL", "XRP")] + [
+    f"COIN{i}USDT" for i in range(500)
+]
+
+
+class FakeAPI:
+    def __init__(self):
+        self.requests = 0
+
+    def get_tickers(self, category="linear"):
+        self.requests += 1
+        return {symbol: {"lastPrice": str(100 + i)} for i, symbol in enumerate(SYMBOLS)}
+
+
+def test_price_cache_serves_from_snapshot_with_prefix_autocomplete():
+    api = FakeAPI()
+    cache = PriceCache(api=api)
+    assert cache.refresh()
+
+    assert cache.get("btc") == cache.get("BTCUSDT") == 100.0
+    assert cache.complete("b", limit=3) == ["BCHUSDT", "BNBUSDT", "BTCUSDT"]
+    assert cache.complete("bt") == ["BTCUSDT", "BTTUSDT"]
+    assert cache.complete("zzz") == []
+
+    started = time.perf_counter()
+    for i in range(100_000):
+        cache.get("ETH")
+        cache.complete("COIN1", limit=10)
+    per_query = (time.perf_counter() - started) / 100_000
+    # без сети: микросекунды на запрос
+    assert per_query < 0.0005
+    assert api.requests == 1
+
+    # свежий снимок не перезапрашивается
+    cache.prices(["BTCUSDT", "ETHUSDT"])
+    assert api.requests == 1
+
+
+def test_missing_symbols_are_fetched_in_one_coalesced_batch(monkeypatch):
+    searches = []
+
+    def fake_search(coins):
+        searches.append(sorted(coins))
+        return {coin: {"found": coin.startswith("NEW"), "last_price": "1.5"} for coin in coins}
+
+    monkeypatch.setattr(price_cache, "search_multiple_coins", fake_search)
+    cache = PriceCache(api=FakeAPI(), coalesce_window=0.1)
+    cache.refresh()
+
+    results = {}
+
+    def ask(symbol):
+        results[symbol] = cache.fetch_missing([symbol])[symbol]
+
+    threads = [threading.Thread(target=ask, args=(f"NEW{i}",)) for i in range(10)]
+    threads.append(threading.Thread(target=ask, args=("NOPE",)))
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(searches) == 1 and len(searches[0]) == 11
+    assert all(results[f"NEW{i}"] == 1.5 for i in range(10))
+    assert results["NOPE"] is None
+
+    # не найденный символ не ищется повторно до истечения miss_ttl
+    assert cache.fetch_missing(["NOPE"]) == {"NOPE": None}
+    assert len(searches) == 1
+
+
+def test_price_command_throughput_against_fake_bot_api(tmp_path):
+    pytest.importorskip("aiogram")
+    web = pytest.importorskip("aiohttp.web")
+
+    from aiogram.client.telegram import TelegramAPIServer
+    from aiogram.types import Update
+    from aiohttp.test_utils import TestServer
+
+    from tg_bot.bot import TradingBot
+    from utils.database.trading_db_sqlite import TradingDBSQLite
+
+    answered = []
+
+    async def send_message(request):
+        data = await request.post()
+        answered.append(data["text"])
+        return web.json_response({"ok": True, "result": {
+            "message_id": len(answered),
+            "date": 1760000000,
+            "chat": {"id": int(data["chat_id"]), "type": "private"},
+            "text": data["text"],
+        }})
+
+    def price_update(update_id):
+        return Update.model_validate({
+            "update_id": update_id,
+            "message": {
+                "message_id": update_id,
+                "date": 1760000000,
+                "chat": {"id": update_id, "type": "private"},
+                "from": {"id": update_id, "is_bot": False, "first_name": "Test"},
+                "text": "/price btc",
+                "entities": [{"type": "bot_command", "offset": 0, "length": 6}],
+            },
+        })
+
+    queries = 2000
+
+    async def run():
+        app = web.Application()
+        app.router.add_post("/bot{token}/sendMessage", send_message)
+        async with TestServer(app) as server:
+            bot = TradingBot("123456:TEST", db=TradingDBSQLite(str(tmp_path / "trading.db")))
+            bot.bot.session.api = TelegramAPIServer.from_base(str(server.make_url("")).rstrip("/"))
+            bot.prices = PriceCache(api=FakeAPI())
+            bot.prices.refresh()
+
+            updates = [price_update(i + 1) for i in range(queries)]
+            started = time.perf_counter()
+            for i in range(0, queries, 200):
+                await asyncio.gather(*(bot.dp.feed_update(bot.bot, u) for u in updates[i:i + 200]))
+            end_to_end = time.perf_counter() - started
+
+            # сам ответ из снимка, без разбора апдейта и HTTP
+            started = time.perf_counter()
+            for _ in range(queries):
+                await bot._price_text("btc")
+            answer = time.perf_counter() - started
+
+            await bot.stop()
+            return end_to_end, answer
+
+    end_to_end, answer = asyncio.run(run())
+
+    assert len(answered) == queries and "BTCUSDT" in answered[0]
+    # пороги с большим запасом на загруженный CI: без кэша каждый /price —
+    # HTTP-запрос к бирже, это единицы запросов в секунду
+    assert queries / end_to_end > 50
+    assert answer / queries < 0.005
+
+
+def test_search_hit_is_stored_under_the_contract_symbol(monkeypatch):
+    monkeypatch.setattr(price_cache, "search_multiple_coins", lambda coins: {
+        coin: {"found": True, "symbol": "1000PEPEUSDT", "last_price": "0.012"} for coin in coins
+    })
+    cache = PriceCache(api=FakeAPI(), coalesce_window=0)
+    cache.refresh()
+
+    assert cache.fetch_missing(["pepe"]) == {"pepe": 0.012}
+    assert cache.resolve("PEPE") == "1000PEPEUSDT"
+    assert cache.complete("PEPE") == [] and cache.complete("1000PEPE") == ["1000PEPEUSDT"]
+
+    # после обновления снимка найденный контракт и его псевдоним живут ttl
+    cache.refresh()
+    assert cache.resolve("pepe") == "1000PEPEUSDT"
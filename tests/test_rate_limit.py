@@ -0,0 +1,114 @@
+import asyncio
+import time
+
+from aiogram.exceptions import TelegramNetworkError, TelegramRetryAfter
+from aiogram.methods import SendMessage
+
+from tg_bot import broadcast
+from tg_bot.broadcast import Broadcaster
+from tg_bot.metrics import LatencyHistogram
+from tg_bot.rate_limit import PerChatLimiter, TokenBucket
+
+
+def test_token_bucket_limits_rate():
+    async def run():
+        bucket = TokenBucket(rate=50, capacity=5)
+        started = time.monotonic()
+        await asyncio.gather(*(bucket.acquire() for _ in range(15)))
+        return time.monotonic() - started
+
+    # 5 токенов из запаса, остальные 10 — по 20 мс
+    assert 0.15 <= asyncio.run(run()) < 0.5
+
+
+def test_per_chat_limiter_spaces_messages_to_same_chat():
+    async def run():
+        limiter = PerChatLimiter(interval=0.1)
+        started = time.monotonic()
+        await limiter.acquire(1)
+        await limiter.acquire(2)
+        await limiter.acquire(1)
+        return time.monotonic() - started
+
+    assert 0.09 <= asyncio.run(run()) < 0.3
+
+
+def test_latency_histogram_percentiles():
+    histogram = LatencyHistogram(buckets=(0.1, 1.0))
+    for value in (0.05, 0.05, 0.05, 0.5, 2.0):
+        histogram.observe(value)
+
+    stats = histogram.as_dict()
+    assert stats["count"] == 5
+    assert stats["p50"] == 0.1
+    assert stats["p90"] == 2.0
+    assert stats["buckets"] == {"<=0.1s": 3, "<=1.0s": 1, ">1.0s": 1}
+
+
+class FlakyBot:
+    """send_message по очереди бросает ошибки из errors, потом отвечает"""
+
+    def __init__(self, errors=(), fail_chats=()):
+        self.errors = list(errors)
+        self.fail_chats = set(fail_chats)
+        self.calls = []
+
+    async def send_message(self, chat_id, text, **kwargs):
+        self.calls.append((chat_id, time.monotonic()))
+        if chat_id in self.fail_chats:
+            raise RuntimeError("callback failed")
+        if self.errors:
+            raise self.errors.pop(0)
+
+
+def test_retry_after_pauses_the_whole_bot_and_retries():
+    method = SendMessage(chat_id=1, text="hi")
+    bot = FlakyBot([TelegramRetryAfter(method, "Too Many Requests", 1)])
+    broadcaster = Broadcaster(bot, rate=100, per_chat_interval=0)
+
+    async def run():
+        return await asyncio.gather(broadcaster.send(1, "hi"), broadcaster.send(2, "hi"))
+
+    assert asyncio.run(run()) == [True, True]
+    (_, failed_at), *retries = bot.calls
+    # пауза общая: ждёт и повтор, и отправка в другой чат
+    assert sorted(chat_id for chat_id, _ in retries) == [1, 2]
+    assert all(at - failed_at >= 0.9 for _, at in retries)
+
+
+def test_transient_errors_are_retried_with_backoff(monkeypatch):
+    method = SendMessage(chat_id=1, text="hi")
+    delays = []
+    real_sleep = asyncio.sleep
+
+    async def fake_sleep(delay):
+        delays.append(delay)
+        await real_sleep(0)
+
+    monkeypatch.setattr(broadcast.asyncio, "sleep", fake_sleep)
+
+    async def run(errors, max_retries):
+        bot = FlakyBot([TelegramNetworkError(method, "boom") for _ in range(errors)])
+        broadcaster = Broadcaster(bot, rate=1000, per_chat_interval=0, max_retries=max_retries)
+        return await broadcaster.send(1, "hi"), len(bot.calls)
+
+    assert asyncio.run(run(errors=2, max_retries=3)) == (True, 3)
+    assert delays == [1.0, 2.0]
+
+    delays.clear()
+    assert asyncio.run(run(errors=5, max_retries=2)) == (False, 3)
+    assert delays == [1.0, 2.0]
+
+
+def test_broadcast_survives_a_failing_send():
+    bot = FlakyBot(fail_chats=range(0, 100, 2))
+
+    async def recipients():
+        yield list(range(100))
+
+    async def run():
+        broadcaster = Broadcaster(bot, rate=10_000, concurrency=4, per_chat_interval=0)
+        return await asyncio.wait_for(broadcaster.broadcast(recipients(), "hi"), 5)
+
+    report = asyncio.run(run())
+    assert (report["total"], report["sent"], report["failed"]) == (100, 50, 50)
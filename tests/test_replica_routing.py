@@ -0,0 +1,65 @@
+"""
+Проверка чтения с реплики. Нужны два локальных PostgreSQL со streaming
+replication: DATABASE_URL (primary) и DATABASE_REPLICA_URL (standby)
+"""
+
+import os
+import time
+
+import pytest
+
+pytest.importorskip("psycopg2")
+
+pytestmark = pytest.mark.skipif(
+    not (os.getenv("DATABASE_URL") and os.getenv("DATABASE_REPLICA_URL")),
+    reason="needs primary and replica PostgreSQL"
+)
+
+
+def _in_recovery(db, readonly):
+    conn = db._get_conn(readonly=readonly)
+    try:
+        with conn.cursor() as cur:
+            cur.execute("SELECT pg_is_in_recovery() AS standby")
+            return cur.fetchone()["standby"]
+    finally:
+        db._put_conn(conn)
+
+
+def test_reads_see_own_writes():
+    from utils.database.trading_db_postgres import TradingDBPostgres
+
+    db = TradingDBPostgres()
+    position_id = db.add_to_db("RYWTESTUSDT", 10, 10, 1.0, 2.0, 0.5, "long")
+    try:
+        assert position_id in {p["id"] for p in db.get_all_positions()}
+    finally:
+        db.delete_position(position_id)
+
+
+def test_reads_go_to_replica_when_caught_up():
+    from utils.database.trading_db_postgres import TradingDBPostgres
+
+    db = TradingDBPostgres()
+    deadline = time.monotonic() + 10
+    while not db._replica_usable() and time.monotonic() < deadline:
+        time.sleep(0.1)
+
+    assert _in_recovery(db, readonly=True) is True
+    assert _in_recovery(db, readonly=False) is False
+
+
+def test_lagging_replica_falls_back_to_primary():
+    from utils.database.trading_db_postgres import TradingDBPostgres
+
+    db = TradingDBPostgres(max_replica_lag=-1)
+    assert _in_recovery(db, readonly=True) is False
+
+
+def test_primary_reads_do_not_move_write_lsn():
+    from utils.database.trading_db_postgres import TradingDBPostgres
+
+    db = TradingDBPostgres()
+    before = TradingDBPostgres._last_write_lsn
+    db.get_broadcast_report(0)
+    assert TradingDBPostgres._last_write_lsn == before
@@ -0,0 +1,104 @@
+import asyncio
+
+import pytest
+
+pytest.importorskip("aiogram")
+pytest.importorskip("aiohttp")
+
+from aiogram import Bot
+from aiogram.client.session.aiohttp import AiohttpSession
+from aiogram.client.telegram import TelegramAPIServer
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+
+from tg_bot.sharding import ShardedBroadcaster, shard_of
+
+TOKENS = ["111:AAA", "222:BBB", "333:CCC"]
+BLOCKED = 7
+# не нажимали Start у ботов шардов — им пишет только основной бот
+NOT_STARTED = {11, 12, 13, 14, 15, 16}
+
+
+def fake_bot_api(received):
+    """Bot API: sendMessage запоминает (токен, chat_id), BLOCKED заблокировал бота"""
+
+    async def send_message(request):
+        token = request.match_info["token"]
+        chat_id = int((await request.post())["chat_id"])
+        if chat_id == BLOCKED:
+            return web.json_response(
+                {"ok": False, "error_code": 403, "description": "Forbidden: bot was blocked by the user"},
+                status=403
+            )
+        if chat_id in NOT_STARTED and token != TOKENS[0]:
+            return web.json_response(
+                {"ok": False, "error_code": 403, "description": "Forbidden: bot can't initiate conversation with a user"},
+                status=403
+            )
+
+        received.append((token, chat_id))
+        return web.json_response({"ok": True, "result": {
+            "message_id": len(received),
+            "date": 1760000000,
+            "chat": {"id": chat_id, "type": "private"},
+            "text": "ok",
+        }})
+
+    app = web.Application()
+    app.router.add_post("/bot{token}/sendMessage", send_message)
+    return app
+
+
+async def recipients(user_ids, size=50):
+    for i in range(0, len(user_ids), size):
+        yield user_ids[i:i + size]
+
+
+def test_sharded_broadcast_routes_users_stably_and_aggregates():
+    received, unreachable = [], []
+    user_ids = list(range(1, 301))
+
+    async def run():
+        async with TestServer(fake_bot_api(received)) as server:
+            api = TelegramAPIServer.from_base(str(server.make_url("")).rstrip("/"))
+            bots = [Bot(token, session=AiohttpSession(api=api)) for token in TOKENS]
+            broadcaster = ShardedBroadcaster(
+                bots,
+                rate=1000,
+                concurrency=10,
+                on_unreachable=lambda chat_id, reason: unreachable.append((chat_id, reason))
+            )
+            try:
+                return await broadcaster.broadcast(recipients(user_ids), "hello")
+            finally:
+                for bot in bots:
+                    await bot.session.close()
+
+    report = asyncio.run(run())
+
+    assert report["total"] == 300
+    assert report["sent"] == 299 and report["failed"] == 1
+    assert all(60 <= shard["total"] <= 140 for shard in report["shards"])
+    # отключён только заблокировавший основной бот, не запускавшие шард — нет
+    assert unreachable == [(BLOCKED, "blocked")]
+
+    # каждый пользователь получил ровно одно сообщение — от бота своего шарда
+    assert sorted(chat_id for _, chat_id in received) == [u for u in user_ids if u != BLOCKED]
+    keys = [int(token.split(":")[0]) for token in TOKENS]
+    for token, chat_id in received:
+        if chat_id in NOT_STARTED:
+            assert token == TOKENS[0]
+        else:
+            assert token == TOKENS[shard_of(chat_id, keys)]
+    assert any(shard_of(chat_id, keys) != 0 for chat_id in NOT_STARTED)
+
+
+def test_new_token_moves_only_its_share_of_users():
+    user_ids = range(10_000)
+    before = {u: [111, 222, 333][shard_of(u, [111, 222, 333])] for u in user_ids}
+    after = {u: [111, 222, 333, 444][shard_of(u, [111, 222, 333, 444])] for u in user_ids}
+
+    moved = [u for u in user_ids if before[u] != after[u]]
+    # переезжают только на новый бот, примерно четверть
+    assert all(after[u] == 444 for u in moved)
+    assert 2000 < len(moved) < 3000
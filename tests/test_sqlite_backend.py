@@ -0,0 +1,287 @@
+from datetime import datetime, timedelta
+
+from utils.database.analytics import TradingAnalytics
+from utils.database.pnl_recorder import PnlRecorder
+from utils.database.rows import page_cursor
+from utils.database.trading_db_sqlite import TradingDBSQLite
+from utils.database.write_behind import UserUpsertBuffer
+
+
+def make_db(tmp_path):
+    return TradingDBSQLite(str(tmp_path / "trading.db"))
+
+
+def test_positions_roundtrip(tmp_path):
+    db = make_db(tmp_path)
+
+    first = db.add_to_db("BTCUSDT", 10, 30, 100.0, 110.0, 95.0, "long")
+    second = db.add_to_db("ETHUSDT", 10, 20, 50.0, 45.0, 55.0, "short")
+
+    positions = db.get_all_positions()
+    assert [p["id"] for p in positions] == [second, first]
+    assert positions[0]["is_active"] is True
+    assert positions[0]["pos_type"] == "short"
+
+    assert db.delete_position(first) is True
+    assert [p["id"] for p in db.get_all_positions(active_only=False)] == [second]
+
+
+def test_users_upsert(tmp_path):
+    db = make_db(tmp_path)
+
+    db.add_user(1, "alice", "Alice", None)
+    db.add_user(2, "bob", "Bob", None)
+    db.add_user(1, "alice_new", "Alice", "A")
+
+    users = {u["user_id"]: u for u in db.get_active_users()}
+    assert set(users) == {1, 2}
+    assert users[1]["username"] == "alice_new"
+    assert users[1]["last_name"] == "A"
+
+
+def test_wal_enabled(tmp_path):
+    db = make_db(tmp_path)
+    mode = db._get_conn().execute("PRAGMA journal_mode").fetchone()
+    assert mode["journal_mode"] == "wal"
+
+
+def test_memory_database_shared_between_threads():
+    import threading
+
+    db = TradingDBSQLite(":memory:")
+    thread = threading.Thread(
+        target=db.add_to_db, args=("SOLUSDT", 10, 10, 1.0, 2.0, 0.5, "long")
+    )
+    thread.start()
+    thread.join()
+
+    assert len(db.get_all_positions()) == 1
+
+
+def test_keyset_pagination_with_projection(tmp_path):
+    db = make_db(tmp_path)
+    ids = [db.add_to_db(f"C{i}USDT", 10, 10, 1.0, 2.0, 0.5, "long") for i in range(7)]
+
+    first = db.get_positions_page(columns=("id", "name"), limit=3)
+    assert first[0]._fields == ("id", "name", "created_at")
+    assert [r.id for r in first] == ids[::-1][:3]
+
+    second = db.get_positions_page(columns=("id", "name"), after=page_cursor(first), limit=3)
+    assert [r.id for r in second] == ids[::-1][3:6]
+
+    assert [r.id for r in db.iter_positions(columns=("id",), page_size=2)] == ids[::-1]
+
+
+def test_recipient_chunks(tmp_path):
+    db = make_db(tmp_path)
+    for user_id in range(1, 6):
+        db.add_user(user_id, None, None, None)
+
+    assert list(db.iter_recipient_chunks(chunk_size=2)) == [[1, 2], [3, 4], [5]]
+
+
+def test_user_buffer_coalesces_and_flushes_on_stop(tmp_path):
+    db = make_db(tmp_path)
+    buffer = UserUpsertBuffer(db, flush_interval_ms=60_000, max_rows=1000)
+
+    buffer.add(1, "old", "A", None)
+    buffer.add(2, "bob", "B", None)
+    buffer.add(1, "new", "A", None)
+    assert db.get_active_users() == []
+
+    buffer.stop()
+
+    users = {u["user_id"]: u["username"] for u in db.get_active_users()}
+    assert users == {1: "new", 2: "bob"}
+
+    # /start, пришедший уже после остановки, пишется сразу
+    buffer.add(3, "late", "C", None)
+    assert {u["user_id"] for u in db.get_active_users()} == {1, 2, 3}
+
+
+def test_close_position_updates_stats_once(tmp_path):
+    db = make_db(tmp_path)
+    analytics = TradingAnalytics(db)
+    win = db.add_to_db("BTCUSDT", 10, 10, 100.0, 110.0, 95.0, "long")
+    loss = db.add_to_db("BTCUSDT", 10, 10, 100.0, 90.0, 105.0, "short")
+
+    assert db.update_position(position_id=win, is_active=False, close_reason="tp", final_pnl=100.0)
+    assert db.close_position(loss, close_reason="sl", final_pnl=-50.0)
+    assert not db.close_position(loss, close_reason="sl", final_pnl=-50.0)
+
+    summary = analytics.get_summary()
+    assert (summary.trades, summary.wins, summary.pnl_sum) == (2, 1, 50.0)
+    assert summary.win_rate == 50.0
+    assert [symbol for symbol, _ in analytics.get_symbol_stats()] == ["BTCUSDT"]
+    assert analytics.get_daily_stats(days=1)[0][1].trades == 2
+
+    # сводка для /stats читает агрегаты один раз
+    reads = []
+    get_stats_totals = db.get_stats_totals
+    db.get_stats_totals = lambda: reads.append(1) or get_stats_totals()
+    assert "Trades: 2" in analytics.format_summary() and len(reads) == 1
+    del db.get_stats_totals
+
+    assert db.rebuild_stats()
+    assert analytics.get_summary().trades == 2
+
+
+def test_pnl_recorder_downsamples_and_flushes(tmp_path):
+    db = make_db(tmp_path)
+    recorder = PnlRecorder(db, sample_interval=0, heartbeat_interval=3600)
+
+    recorder.record(1, 100.0, 1.0)
+    recorder.record(1, 100.0, 1.0)  # PnL не изменился — пропускаем
+    recorder.record(1, 101.0, 2.0)
+    assert recorder.flush() == 2
+    assert [row[2] for row in db.get_pnl_series(1)] == [1.0, 2.0]
+
+    start = datetime(2026, 1, 1)
+    db.write_pnl_samples([(2, start + timedelta(seconds=i), 1.0, float(i)) for i in range(10)])
+    assert db.downsample_pnl_samples(start, start + timedelta(hours=1), 300) == 9
+    assert [row[2] for row in db.get_pnl_series(2)] == [9.0]
+
+    assert db.prune_pnl_samples(start + timedelta(days=1)) == 1
+
+
+def test_broadcast_outbox_resumes_after_restart(tmp_path):
+    import asyncio
+
+    from tg_bot.outbox import OutboxWorker
+
+    db = make_db(tmp_path)
+    db.add_users_bulk([(i, None, None, None) for i in range(1, 6)])
+    job_id = db.enqueue_broadcast("signal")
+
+    # "упавший" процесс забрал пачку, отправил одному и не отметил остальных
+    claimed = db.claim_broadcast_batch(limit=3, stale_after=120)
+    assert [row[1] for row in claimed] == [1, 2, 3]
+    assert db.complete_broadcast_batch([(job_id, 1, True, None)]) == []
+    assert db.claim_broadcast_batch(limit=10, stale_after=120) == [
+        (job_id, 4, "signal", 3), (job_id, 5, "signal", 3)
+    ]
+
+    class FakeBroadcaster:
+        concurrency = 2
+        sent = []
+
+        async def send(self, chat_id, text, latency=None, **kwargs):
+            self.sent.append(chat_id)
+            return chat_id != 5
+
+    async def run():
+        # после перезапуска брошенные 'sending' забираются повторно
+        worker = OutboxWorker(db, FakeBroadcaster(), stale_after=0, poll_interval=0.05)
+        worker.start()
+        report = await asyncio.wait_for(worker.wait(job_id), 5)
+        await worker.stop()
+        return report
+
+    report = asyncio.run(run())
+    assert sorted(FakeBroadcaster.sent) == [2, 3, 4, 5]
+    assert (report["total"], report["sent"], report["failed"], report["pending"]) == (5, 4, 1, 0)
+    assert report["status"] == "done"
+
+
+def test_weighted_claim_takes_each_delivery_once(tmp_path):
+    db = make_db(tmp_path)
+    db.add_users_bulk([(i, None, None, None) for i in range(1, 6)])
+    urgent = db.enqueue_broadcast("tp", priority=0)
+    bulk = db.enqueue_broadcast("bulk", priority=3)
+
+    # stale_after=0: добор после долей классов не должен счесть
+    # только что взятые строки брошенными
+    claimed = db.claim_broadcast_batch(limit=8, stale_after=0, quotas={0: 2, 3: 2})
+    keys = [(row[0], row[1]) for row in claimed]
+    assert len(keys) == len(set(keys)) == 8
+    assert [row[1] for row in claimed if row[0] == urgent] == [1, 2, 3, 4, 5]
+    assert [row[1] for row in claimed if row[0] == bulk] == [1, 2, 3]
+
+
+def test_unreachable_users_are_deactivated_until_next_start(tmp_path):
+    from tg_bot.pruning import UnreachableUsers
+
+    db = make_db(tmp_path)
+    db.add_users_bulk([(i, None, None, None) for i in range(1, 5)])
+
+    pruner = UnreachableUsers(db, rate=2)
+    pruner.add(2, "blocked")
+    pruner.add(3, "chat_not_found")
+    assert pruner.flush() == 2
+
+    assert [u for chunk in db.iter_recipient_chunks() for u in chunk] == [1, 4]
+    assert pruner.stats() == {
+        "pruned": 2,
+        "by_reason": {"blocked": 1, "chat_not_found": 1},
+        "saved_per_broadcast": 1.0,
+    }
+
+    # пользователь снова нажал /start — возвращается в рассылку
+    db.add_user(2, None, None, None)
+    assert db.get_deactivation_stats() == {"chat_not_found": 1}
+    assert [u for chunk in db.iter_recipient_chunks() for u in chunk] == [1, 2, 4]
+
+
+def test_outbox_batches_prefer_urgent_jobs_without_starving_bulk(tmp_path):
+    import asyncio
+
+    from tg_bot.outbox import OutboxWorker, PRIORITY_BULK, PRIORITY_TPSL
+
+    db = make_db(tmp_path)
+    db.add_users_bulk([(i, None, None, None) for i in range(1, 101)])
+    bulk = db.enqueue_broadcast("admin news", priority=PRIORITY_BULK)
+    tpsl = db.enqueue_broadcast("SL hit", priority=PRIORITY_TPSL)
+
+    worker = OutboxWorker(db, broadcaster=None, batch_size=30)
+    batch = asyncio.run(worker._claim())
+
+    jobs = [row[0] for row in batch]
+    assert len(batch) == 30
+    # срочные первыми, но доля bulk (1/15 пачки) сохраняется
+    assert jobs[0] == tpsl and jobs[-1] == bulk
+    assert jobs.count(bulk) == 2
+
+
+def test_outbox_survives_raising_send_and_pruner(tmp_path):
+    import asyncio
+
+    from tg_bot.outbox import OutboxWorker
+
+    db = make_db(tmp_path)
+    db.add_users_bulk([(i, None, None, None) for i in range(1, 5)])
+    job_id = db.enqueue_broadcast("signal")
+
+    class FlakyBroadcaster:
+        concurrency = 2
+
+        async def send(self, chat_id, text, latency=None, **kwargs):
+            if chat_id == 2:
+                raise RuntimeError("network down")
+            return True
+
+    class BrokenPruner:
+        async def flush_async(self):
+            raise RuntimeError("db down")
+
+    async def run():
+        worker = OutboxWorker(db, FlakyBroadcaster(), poll_interval=0.05, pruner=BrokenPruner())
+        worker.start()
+        report = await asyncio.wait_for(worker.wait(job_id), 5)
+        await worker.stop()
+        return report
+
+    report = asyncio.run(run())
+    assert (report["total"], report["sent"], report["failed"], report["pending"]) == (4, 3, 1, 0)
+
+
+def test_backend_converts_types_without_touching_global_sqlite3(tmp_path):
+    import sqlite3
+
+    db = make_db(tmp_path)
+    db.add_to_db("BTCUSDT", 10, 10, 100.0, 120.0, 90.0, "long")
+
+    position = db.get_all_positions()[0]
+    assert position["is_active"] is True and isinstance(position["created_at"], datetime)
+    # после прохода по курсору created_at снова годится как параметр
+    assert db.get_positions_page(after=page_cursor(db.get_positions_page(limit=1))) == []
+    assert "BOOLEAN" not in sqlite3.converters
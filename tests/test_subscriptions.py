@@ -0,0 +1,79 @@
+import asyncio
+
+import pytest
+
+from tg_bot.subscriptions import ANY, SubscriptionIndex
+from utils.database.trading_db_sqlite import TradingDBSQLite
+
+
+def test_index_matches_symbol_side_and_wildcards():
+    index = SubscriptionIndex()
+    index.load([
+        (1, "BTCUSDT", ANY),
+        (2, "BTCUSDT", "short"),
+        (3, ANY, "long"),
+    ])
+
+    assert index.match("BTCUSDT", "long") == {1, 3}
+    assert index.match("BTCUSDT", "short") == {1, 2}
+    assert index.match("ETHUSDT", "long") == {3}
+    assert index.match("ETHUSDT", "short") == set()
+
+    # без подписок — получает всё
+    assert index.allows(4, set())
+    assert not index.allows(2, index.match("ETHUSDT", "short"))
+
+    index.remove(1, "BTCUSDT")
+    assert index.subscriptions(1) == []
+    assert index.allows(1, set())
+
+    assert SubscriptionIndex.parse(["btcusdt", "LONG"]) == ("BTCUSDT", "long")
+    assert SubscriptionIndex.parse(["short"]) == (ANY, "short")
+
+
+def test_targeted_enqueue_skips_unmatched_subscribers(tmp_path):
+    db = TradingDBSQLite(str(tmp_path / "trading.db"))
+    db.add_users_bulk([(i, None, None, None) for i in range(1, 5)])
+    db.add_subscription(1, "BTCUSDT", ANY)
+    db.add_subscription(2, "ETHUSDT", ANY)
+
+    index = SubscriptionIndex()
+    index.load(db.get_all_subscriptions())
+
+    job_id = db.enqueue_broadcast("BTC closed", index.match("BTCUSDT", "long"))
+    recipients = sorted(row[1] for row in db.claim_broadcast_batch(limit=10))
+
+    # 2 подписан только на ETH, 3 и 4 без подписок
+    assert recipients == [1, 3, 4]
+    assert db.get_broadcast_report(job_id)["total"] == 3
+
+    assert db.remove_subscriptions(2) == 1
+    assert db.get_all_subscriptions() == [(1, "BTCUSDT", ANY)]
+
+
+def test_subscribe_symbol_resolves_to_contract(tmp_path, monkeypatch):
+    pytest.importorskip("aiogram")
+
+    import parsing.price_cache as price_cache
+    from parsing.price_cache import PriceCache
+    from tg_bot.bot import TradingBot
+
+    class FakeAPI:
+        def get_tickers(self, category="linear"):
+            return {"BTCUSDT": {"lastPrice": "100"}}
+
+    monkeypatch.setattr(
+        price_cache, "search_multiple_coins",
+        lambda coins: {coin: {"found": False} for coin in coins},
+    )
+
+    async def run():
+        bot = TradingBot("123456:TEST", db=TradingDBSQLite(str(tmp_path / "trading.db")))
+        bot.prices = PriceCache(api=FakeAPI(), coalesce_window=0)
+        bot.prices.refresh()
+        try:
+            return await bot._resolve_symbol("btc"), await bot._resolve_symbol("nope")
+        finally:
+            await bot.stop()
+
+    assert asyncio.run(run()) == ("BTCUSDT", None)
@@ -0,0 +1,35 @@
+from utils.database import transfer
+from utils.database.trading_db_sqlite import TradingDBSQLite
+
+
+def dump(db, table):
+    return [row for rows in db.iter_table_chunks(table) for row in rows]
+
+
+def test_csv_roundtrip_keeps_closed_positions_and_unsubscribed_users(tmp_path):
+    source = TradingDBSQLite(str(tmp_path / "source.db"))
+    target = TradingDBSQLite(str(tmp_path / "target.db"))
+
+    closed = source.add_to_db("BTCUSDT", 10, 10, 100.0, 120.0, 90.0, "long")
+    source.add_to_db("ETHUSDT", 5, 20, 50.0, 0, None, "short")
+    source.close_position(closed, close_reason="tp", final_pnl=200.0)
+
+    source.add_users_bulk([(1, "alice", "Alice", None), (2, None, "Bob, Jr.", "O'Neil"), (3, None, None, None)])
+    source.deactivate_users([(2, "blocked")])
+
+    for table in ("positions", "bot_users"):
+        path = tmp_path / f"{table}.csv"
+        assert transfer.export_table(source, table, path) == len(dump(source, table))
+        assert transfer.import_table(target, table, path) == len(dump(source, table))
+        assert dump(target, table) == dump(source, table)
+
+    users = {row[0]: row for row in dump(target, "bot_users")}
+    assert users[2][4] is False and users[2][-1] == "blocked" and users[2][-2] is not None
+
+    # повторный импорт без --upsert ничего не меняет, с --upsert — перезаписывает
+    assert transfer.import_table(target, "bot_users", tmp_path / "bot_users.csv") == 0
+    assert transfer.import_table(target, "bot_users", tmp_path / "bot_users.csv", upsert=True) == 3
+    assert dump(target, "bot_users") == dump(source, "bot_users")
+
+    # новые позиции продолжают нумерацию после импортированных
+    assert target.add_to_db("SOLUSDT", 1, 1, 10.0, 0, 0, "long") > max(row[0] for row in dump(source, "positions"))
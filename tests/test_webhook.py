@@ -0,0 +1,104 @@
+import asyncio
+
+import pytest
+
+pytest.importorskip("aiogram")
+pytest.importorskip("aiohttp")
+
+from aiogram import Bot, Dispatcher
+from aiogram.filters import Command
+from aiohttp.test_utils import TestClient, TestServer
+
+from tg_bot.webhook import SECRET_HEADER, WebhookServer
+
+SECRET = "s3cret"
+
+
+def recorded_update(update_id, chat_id, text):
+    return {
+        "update_id": update_id,
+        "message": {
+            "message_id": update_id,
+            "date": 1760000000,
+            "chat": {"id": chat_id, "type": "private"},
+            "from": {"id": chat_id, "is_bot": False, "first_name": "Test"},
+            "text": text,
+            "entities": [{"type": "bot_command", "offset": 0, "length": len(text.split()[0])}],
+        },
+    }
+
+
+def make_server(handled, delay=0.0):
+    bot = Bot("123456:TEST")
+    dp = Dispatcher()
+
+    @dp.message(Command("stats"))
+    async def cmd_stats(message):
+        await asyncio.sleep(delay)
+        handled.append(message.chat.id)
+
+    return WebhookServer(bot, dp, path="/hook", secret_token=SECRET, max_concurrency=4)
+
+
+def test_webhook_rejects_wrong_secret_and_handles_updates():
+    handled = []
+
+    async def run():
+        server = make_server(handled)
+        async with TestClient(TestServer(server.build_app())) as client:
+            bad = await client.post("/hook", json=recorded_update(1, 10, "/stats"))
+            assert bad.status == 401
+
+            for i in range(5):
+                response = await client.post(
+                    "/hook",
+                    json=recorded_update(i + 2, 10 + i, "/stats"),
+                    headers={SECRET_HEADER: SECRET},
+                )
+                assert response.status == 200
+
+            await server.stop()
+        await server.bot.session.close()
+
+    asyncio.run(run())
+    assert sorted(handled) == [10, 11, 12, 13, 14]
+
+
+def test_webhook_drains_in_flight_updates_on_stop():
+    handled = []
+
+    async def run():
+        server = make_server(handled, delay=0.2)
+        async with TestClient(TestServer(server.build_app())) as client:
+            response = await client.post(
+                "/hook", json=recorded_update(1, 42, "/stats"), headers={SECRET_HEADER: SECRET}
+            )
+            assert response.status == 200
+            assert handled == []
+
+            await server.stop()
+            assert handled == [42]
+
+            # после stop новые апдейты не принимаются — Telegram повторит
+            late = await client.post(
+                "/hook", json=recorded_update(2, 43, "/stats"), headers={SECRET_HEADER: SECRET}
+            )
+            assert late.status == 503
+        await server.bot.session.close()
+
+    asyncio.run(run())
+
+
+def test_webhook_without_configured_secret_still_requires_one():
+    async def run():
+        server = WebhookServer(Bot("123456:TEST"), Dispatcher(), path="/hook")
+        assert server.secret_token
+        async with TestClient(TestServer(server.build_app())) as client:
+            forged = await client.post("/hook", json=recorded_update(1, 10, "/notify_all hi"))
+            assert forged.status == 401
+            empty = await client.post(
+                "/hook", json=recorded_update(2, 10, "/notify_all hi"), headers={SECRET_HEADER: ""}
+            )
+            assert empty.status == 401
+
+    asyncio.run(run())
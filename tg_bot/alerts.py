@@ -0,0 +1,190 @@
+import asyncio
+import logging
+import math
+
+from tg_bot.outbox import PRIORITY_ALERT
+from utils.triggers import ABOVE, BELOW, TriggerBook
+
+logger = logging.getLogger(__name__)
+
+
+class PriceAlerts:
+    """
+    Пользовательские ценовые алерты (/alert SYMBOL PRICE).
+
+    Алерты хранятся в price_alerts, в памяти — TriggerBook: на тике
+    одним батчем котируются только символы, по которым есть алерты,
+    и снимаются только пересечённые уровни. Направление фиксируется
+    при создании: цель выше текущей цены — ждём роста, ниже — падения.
+    Алерт одноразовый: сработал — удалён. Пользователи с одинаковым
+    набором сработавших алертов получают одно задание outbox
+    """
+
+    def __init__(
+        self,
+        db,
+        outbox,
+        price_fetcher=None,
+        interval: float = 2.0,
+        max_per_user: int = 50,
+    ):
+        if price_fetcher is None:
+            from parsing.coin_price_parcing import get_bybit_last_prices
+            price_fetcher = get_bybit_last_prices
+
+        self.db = db
+        self.outbox = outbox
+        self.price_fetcher = price_fetcher
+        self.interval = interval
+        self.max_per_user = max_per_user
+
+        self.book = TriggerBook()
+        # user_id -> {alert_id}; alert_id -> (user_id, price, direction)
+        self._by_user: dict[int, set[int]] = {}
+        self._alerts: dict[int, tuple[int, float, str]] = {}
+
+        self.fired = 0
+        self._stop_flag = False
+        self._task: asyncio.Task | None = None
+
+    def __len__(self) -> int:
+        return len(self.book)
+
+    async def load(self):
+        rows = await asyncio.to_thread(self.db.get_price_alerts)
+        for alert_id, user_id, symbol, price, direction in rows:
+            try:
+                self._index(alert_id, user_id, symbol, price, direction)
+            except (TypeError, ValueError):
+                # строка из БД мимо /alert — в индекс не берём, остальным не мешает
+                logger.warning("Skipping invalid price alert | id=%s price=%r", alert_id, price)
+        logger.info("Price alerts loaded | alerts=%d symbols=%d", len(rows), len(self.book.symbols()))
+
+    def _index(self, alert_id, user_id, symbol, price, direction):
+        self.book.add(alert_id, symbol, price, direction)
+        self._by_user.setdefault(user_id, set()).add(alert_id)
+        self._alerts[alert_id] = (user_id, float(price), direction)
+
+    def _forget(self, alert_id):
+        alert = self._alerts.pop(alert_id, None)
+        if alert is None:
+            return None
+
+        alerts = self._by_user.get(alert[0])
+        if alerts is not None:
+            alerts.discard(alert_id)
+            if not alerts:
+                del self._by_user[alert[0]]
+        return alert
+
+    def alerts(self, user_id: int) -> list[tuple[int, str, str, float]]:
+        """Алерты пользователя: (alert_id, symbol, direction, price)"""
+        result = []
+        for alert_id in sorted(self._by_user.get(user_id, ())):
+            where = self.book.get(alert_id)
+            if where is not None:
+                result.append((alert_id, *where))
+        return result
+
+    async def add(self, user_id: int, symbol: str, price: float) -> tuple[int, str, float]:
+        """
+        Создаёт алерт, возвращает (alert_id, direction, текущая цена).
+        ValueError — лимит алертов, неизвестный символ или некорректная цена
+        """
+        if not math.isfinite(price) or price <= 0:
+            raise ValueError("Цена должна быть положительным числом")
+        if len(self._by_user.get(user_id, ())) >= self.max_per_user:
+            raise ValueError(f"Не больше {self.max_per_user} алертов")
+
+        prices = await asyncio.to_thread(self.price_fetcher, [symbol])
+        current = prices.get(symbol)
+        if current is None:
+            raise ValueError(f"Символ {symbol} не найден")
+
+        direction = ABOVE if price > float(current) else BELOW
+        alert_id = await asyncio.to_thread(self.db.add_price_alert, user_id, symbol, price, direction)
+        self._index(alert_id, user_id, symbol, price, direction)
+        return alert_id, direction, float(current)
+
+    async def remove(self, user_id: int, symbol: str | None = None) -> int:
+        removed = await asyncio.to_thread(self.db.remove_price_alerts, user_id, symbol)
+        for alert_id in removed:
+            self.book.remove(alert_id)
+            self._forget(alert_id)
+        return len(removed)
+
+    # ==========================
+    # ENGINE
+    # ==========================
+
+    async def check(self, prices: dict) -> int:
+        """Снимает пересечённые алерты и ставит уведомления в outbox"""
+        fired = []
+        for symbol, price in prices.items():
+            if price is None:
+                continue
+            for alert_id in self.book.crossed(symbol, price):
+                fired.append((alert_id, symbol, float(price)))
+
+        if not fired:
+            return 0
+
+        # user_id -> строки сработавших алертов
+        lines: dict[int, list[str]] = {}
+        alert_ids = []
+        for alert_id, symbol, price in fired:
+            alert_ids.append(alert_id)
+            alert = self._forget(alert_id)
+            if alert is not None:
+                user_id, level, direction = alert
+                lines.setdefault(user_id, []).append(self.render_line(symbol, level, direction, price))
+
+        # одинаковый текст — одно задание на всех его получателей
+        groups: dict[str, list[int]] = {}
+        for user_id, user_lines in lines.items():
+            groups.setdefault("🔔 <b>Price alert</b>\n\n" + "\n".join(user_lines), []).append(user_id)
+
+        for text, user_ids in groups.items():
+            await self.outbox.enqueue(text, priority=PRIORITY_ALERT, recipients=user_ids)
+        await asyncio.to_thread(self.db.delete_price_alerts, alert_ids)
+
+        self.fired += len(fired)
+        logger.info("Price alerts fired | alerts=%d users=%d jobs=%d", len(fired), len(lines), len(groups))
+        return len(fired)
+
+    @staticmethod
+    def render_line(symbol: str, level: float, direction: str, price: float) -> str:
+        sign = "≥" if direction == ABOVE else "≤"
+        return (
+            f"<b>{symbol}</b> {sign} {level} — now {price}\n"
+            f"<a href='https://www.bybit.com/trade/usdt/{symbol}'>Open Bybit</a>"
+        )
+
+    def start(self) -> asyncio.Task:
+        if self._task is None or self._task.done():
+            self._stop_flag = False
+            self._task = asyncio.create_task(self._run(), name="price_alerts")
+        return self._task
+
+    async def stop(self):
+        self._stop_flag = True
+        if self._task:
+            await self._task
+            self._task = None
+
+    async def _run(self):
+        try:
+            await self.load()
+        except Exception:
+            logger.exception("Failed to load price alerts")
+
+        while not self._stop_flag:
+            try:
+                symbols = self.book.symbols()
+                if symbols:
+                    # один запрос котировок на все символы, а не на каждый алерт
+                    prices = await asyncio.to_thread(self.price_fetcher, symbols)
+                    await self.check(prices)
+            except Exception:
+                logger.exception("Price alerts check failed")
+            await asyncio.sleep(self.interval)
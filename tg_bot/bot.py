@@ -1,32 +1,155 @@
 import asyncio
 import logging
+import math
 from typing import List
 
-from aiogram import Bot, Dispatcher
+from aiogram import Bot, Dispatcher, F
+from aiogram.exceptions import TelegramBadRequest
 from aiogram.filters import Command
-from aiogram.types import Message
+from aiogram.types import (
+    CallbackQuery,
+    InlineKeyboardButton,
+    InlineKeyboardMarkup,
+    InlineQuery,
+    InlineQueryResultArticle,
+    InputTextMessageContent,
+    Message,
+)
 from aiogram.enums import ParseMode
 from aiogram.client.default import DefaultBotProperties
 
-from utils.database.trading_db_postgres import TradingDBPostgres
+from parsing.price_cache import shared_price_cache
+from tg_bot.alerts import PriceAlerts
+from tg_bot.broadcast import Broadcaster
+from tg_bot.digest import DigestCoalescer
+from tg_bot.dispatch import ChatScheduler
+from tg_bot.live_cards import LiveCards
+from tg_bot.outbox import (
+    OutboxWorker,
+    PRIORITY_BULK,
+    PRIORITY_SIGNAL,
+    PRIORITY_TPSL,
+)
+from tg_bot.positions_view import PositionsView
+from tg_bot.pruning import UnreachableUsers
+from tg_bot.sharding import ShardedBroadcaster
+from tg_bot.subscriptions import ANY, SubscriptionIndex
+from tg_bot.webhook import WebhookServer
+from utils.database import create_database
+from utils.database.analytics import TradingAnalytics
+from utils.database.write_behind import UserUpsertBuffer
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Сколько вариантов показывать в inline-автодополнении
+INLINE_RESULTS = 20
+
 
 class TradingBot:
-    def __init__(self, token: str, admin_ids: List[int] | None = None):
+    def __init__(self, token: str, admin_ids: List[int] | None = None, db=None):
+        from settings import config
+
         self.bot = Bot(
             token=token,
             default=DefaultBotProperties(parse_mode=ParseMode.HTML)
         )
 
-        # PostgreSQL DB (stateless, thread-safe)
-        self.db = TradingDBPostgres()
+        # Хранилище (PostgreSQL или SQLite — см. db_backend), thread-safe
+        self.db = db or create_database()
+
+        # /start пишет пользователей пачками, а не upsert'ом на каждое сообщение
+        self.user_buffer = UserUpsertBuffer(
+            self.db,
+            flush_interval_ms=config.USER_FLUSH_INTERVAL_MS,
+            max_rows=config.USER_FLUSH_MAX_ROWS
+        )
+
+        self.analytics = TradingAnalytics(self.db)
+
+        # подписки на символы/стороны — индекс в памяти поверх user_subscriptions
+        self.subscriptions = SubscriptionIndex()
+        try:
+            self.subscriptions.load(self.db.get_all_subscriptions())
+        except Exception:
+            logger.exception("Failed to load subscriptions, notifying everyone")
+
+        # снимок цен всех тикеров в памяти: /price, inline, /positions, алерты
+        self.prices = shared_price_cache()
+
+        # /positions собирается раз в несколько секунд на всех пользователей
+        self.positions_view = PositionsView(self.db, price_fetcher=self.prices.prices)
+
+        # заблокировавшие бота отключаются и выпадают из следующих рассылок
+        self.unreachable = UnreachableUsers(self.db, rate=config.BROADCAST_RATE)
+
+        # дополнительные токены — рассылка шардируется по пользователям
+        self.shard_bots = [
+            Bot(token=shard_token, default=DefaultBotProperties(parse_mode=ParseMode.HTML))
+            for shard_token in config.BROADCAST_TOKENS
+            if shard_token
+        ]
+        limits = dict(
+            rate=config.BROADCAST_RATE,
+            concurrency=config.BROADCAST_CONCURRENCY,
+            on_unreachable=self.unreachable.add
+        )
+        if self.shard_bots:
+            self.broadcaster = ShardedBroadcaster([self.bot, *self.shard_bots], **limits)
+        else:
+            self.broadcaster = Broadcaster(self.bot, **limits)
+
+        # Сигналы идут через durable outbox в БД и переживают перезапуск
+        self.outbox = OutboxWorker(self.db, self.broadcaster, pruner=self.unreachable)
+
+        # всплеск TP/SL и алертов — одна сводка на пользователя
+        self.digest = DigestCoalescer(
+            self.outbox,
+            self.subscriptions,
+            window_ms=config.DIGEST_WINDOW_MS
+        )
+
+        # /alert SYMBOL PRICE — личные ценовые алерты пользователей
+        self.price_alerts = PriceAlerts(
+            self.db,
+            self.outbox,
+            price_fetcher=self.prices.prices,
+            interval=config.ALERT_CHECK_INTERVAL,
+            max_per_user=config.ALERT_MAX_PER_USER
+        )
+
+        # /live — карточки позиций, обновляемые правкой сообщения
+        self.live_cards = LiveCards(
+            self.db,
+            self.broadcaster,
+            self.positions_view,
+            interval=config.LIVE_CARD_INTERVAL
+        )
 
         self.dp = Dispatcher()
         self.admin_ids = admin_ids or []
 
+        # разные чаты — параллельно, один чат — по порядку
+        self.scheduler = ChatScheduler(
+            max_concurrency=config.UPDATE_CONCURRENCY,
+            max_pending=config.UPDATE_MAX_PENDING
+        )
+        self.dp.update.outer_middleware(self.scheduler)
+
+        # polling или webhook — см. bot_mode в настройках
+        self.mode = config.BOT_MODE
+        self.webhook_url = config.WEBHOOK_URL
+        self.webhook = WebhookServer(
+            self.bot,
+            self.dp,
+            path=config.WEBHOOK_PATH,
+            secret_token=config.WEBHOOK_SECRET or None,
+            host=config.WEBHOOK_HOST,
+            port=config.WEBHOOK_PORT,
+            max_concurrency=config.WEBHOOK_MAX_CONCURRENCY
+        )
+        self._stopped = asyncio.Event()
+
         self._register_handlers()
 
     # ==========================
@@ -37,48 +160,242 @@ class TradingBot:
 
         @self.dp.message(Command("start"))
         async def cmd_start(message: Message):
-            await asyncio.to_thread(
-                self.db.add_user,
+            self.user_buffer.add(
                 message.from_user.id,
                 message.from_user.username,
                 message.from_user.first_name,
                 message.from_user.last_name,
             )
 
-            await message.answer(
+            text = (
                 f"👋 <b>Привет, {message.from_user.first_name}!</b>\n\n"
                 "/help — список команд"
             )
+            if self.shard_bots:
+                username = await self.broadcaster.link_for(message.chat.id)
+                if username:
+                    text += f"\n\n📬 Уведомления приходят от @{username} — нажмите там Start"
+
+            await message.answer(text)
 
         @self.dp.message(Command("help"))
         async def cmd_help(message: Message):
             await message.answer(
                 "📚 Доступные команды:\n"
-                "/positions — активные позиции"
+                "/positions — активные позиции\n"
+                "/price BTC — текущая цена (или @бот BTC в любом чате)\n"
+                "/stats — статистика сделок\n"
+                "/subscribe BTCUSDT [long|short] — уведомления только по символу/стороне\n"
+                "/unsubscribe [BTCUSDT|all] — отменить подписку\n"
+                "/subscriptions — мои подписки\n"
+                "/alert BTCUSDT 70000 — уведомить о цене (/alert — мои алерты, /alert off [BTCUSDT] — удалить)\n"
+                "/live — обновляемые карточки позиций (/live off — выключить)"
             )
 
-        @self.dp.message(Command("positions"))
-        async def cmd_positions(message: Message):
-            from parsing.coin_price_parcing import get_bybit_futures_price
+        @self.dp.message(Command("live"))
+        async def cmd_live(message: Message):
+            chat_id = message.chat.id
+            args = message.text.split()[1:]
 
-            positions = await asyncio.to_thread(
-                self.db.get_all_positions, True
-            )
+            if args and args[0].lower() == "off":
+                removed = await self.live_cards.close_chat(chat_id)
+                await message.answer(f"⏹ Обновление карточек выключено ({removed})")
+                return
 
+            positions, prices = await self.positions_view.snapshot()
+            positions = [
+                pos for pos in positions
+                if self.subscriptions.allows(
+                    chat_id, self.subscriptions.match(pos["name"], pos["pos_type"])
+                )
+            ]
             if not positions:
                 await message.answer("📭 Нет активных позиций")
                 return
 
             for pos in positions:
-                price_data = await asyncio.to_thread(
-                    get_bybit_futures_price, pos["name"]
+                text = PositionsView.render_position(
+                    pos, prices.get(pos["name"]), self.positions_view.portfolio.pnl_of(pos["id"])
                 )
+                sent = await message.answer(text)
+                await self.live_cards.open(chat_id, pos["id"], sent.message_id, text)
+
+        @self.dp.message(Command("subscribe"))
+        async def cmd_subscribe(message: Message):
+            args = message.text.split()[1:]
+            if not args:
+                await message.answer("❗ Пример: /subscribe BTCUSDT long")
+                return
+
+            symbol, side = SubscriptionIndex.parse(args)
+            if symbol != ANY:
+                # тот же символ, что приходит в уведомлениях: BTC -> BTCUSDT
+                resolved = await self._resolve_symbol(symbol)
+                if resolved is None:
+                    await message.answer(self._not_found_text(symbol))
+                    return
+                symbol = resolved
+
+            await asyncio.to_thread(
+                self.db.add_subscription, message.chat.id, symbol, side
+            )
+            self.subscriptions.add(message.chat.id, symbol, side)
+
+            await message.answer(
+                f"✅ Подписка: {self._describe_subscription(symbol, side)}\n"
+                "Остальные сигналы приходить не будут"
+            )
+
+        @self.dp.message(Command("unsubscribe"))
+        async def cmd_unsubscribe(message: Message):
+            args = message.text.split()[1:]
+            if not args or args[0].lower() == "all":
+                symbol = side = None
+            else:
+                symbol, side = SubscriptionIndex.parse(args)
+                side = None if side == ANY else side
+                if symbol != ANY:
+                    symbol = self.prices.resolve(symbol) or symbol
+
+            removed = await asyncio.to_thread(
+                self.db.remove_subscriptions, message.chat.id, symbol, side
+            )
+            self.subscriptions.remove(message.chat.id, symbol, side)
+
+            if not self.subscriptions.subscriptions(message.chat.id):
+                await message.answer(f"🔕 Удалено подписок: {removed}. Снова приходят все сигналы")
+            else:
+                await message.answer(f"🔕 Удалено подписок: {removed}")
+
+        @self.dp.message(Command("subscriptions"))
+        async def cmd_subscriptions(message: Message):
+            items = self.subscriptions.subscriptions(message.chat.id)
+            if not items:
+                await message.answer("📬 Подписок нет — приходят все сигналы")
+                return
 
+            await message.answer(
+                "📬 Ваши подписки:\n"
+                + "\n".join(f"• {self._describe_subscription(*item)}" for item in items)
+            )
+
+        @self.dp.message(Command("price"))
+        async def cmd_price(message: Message):
+            args = message.text.split()[1:]
+            if not args:
+                await message.answer("❗ Пример: /price BTC")
+                return
+
+            await message.answer(await self._price_text(args[0]))
+
+        @self.dp.inline_query()
+        async def inline_price(query: InlineQuery):
+            # автодополнение по префиксу — только из снимка, без сети
+            results = []
+            for symbol in self.prices.complete(query.query, limit=INLINE_RESULTS):
+                price = self.prices.get(symbol)
+                results.append(InlineQueryResultArticle(
+                    id=symbol,
+                    title=f"{symbol} — {price}",
+                    input_message_content=InputTextMessageContent(
+                        message_text=self._format_price(symbol, price)
+                    ),
+                ))
+
+            await query.answer(results, cache_time=2)
+
+        @self.dp.message(Command("alert"))
+        async def cmd_alert(message: Message):
+            chat_id = message.chat.id
+            args = message.text.split()[1:]
+
+            if not args:
+                items = self.price_alerts.alerts(chat_id)
+                if not items:
+                    await message.answer("🔔 Алертов нет. Пример: /alert BTCUSDT 70000")
+                    return
                 await message.answer(
-                    f"<b>{pos['name']}</b>\n"
-                    f"Тип: {pos['pos_type']}\n"
-                    f"Цена: {price_data.get('last_price')}"
+                    "🔔 Ваши алерты:\n" + "\n".join(
+                        f"• {symbol} {'≥' if direction == 'above' else '≤'} {price}"
+                        for _, symbol, direction, price in items
+                    )
                 )
+                return
+
+            if args[0].lower() == "off":
+                symbol = args[1].upper() if len(args) > 1 else None
+                removed = await self.price_alerts.remove(chat_id, symbol)
+                await message.answer(f"🔕 Удалено алертов: {removed}")
+                return
+
+            try:
+                symbol, price = args[0].upper(), float(args[1].replace(",", "."))
+                # nan/inf/0 float() пропускает — такой уровень сломал бы индекс алертов
+                if not math.isfinite(price) or price <= 0:
+                    raise ValueError(price)
+            except (IndexError, ValueError):
+                await message.answer("❗ Пример: /alert BTCUSDT 70000")
+                return
+
+            try:
+                _, direction, current = await self.price_alerts.add(chat_id, symbol, price)
+            except ValueError as e:
+                await message.answer(f"❗ {e}")
+                return
+
+            await message.answer(
+                f"✅ Алерт: {symbol} {'≥' if direction == 'above' else '≤'} {price}\n"
+                f"Сейчас: {current}"
+            )
+
+        @self.dp.message(Command("stats"))
+        async def cmd_stats(message: Message):
+            text = await asyncio.to_thread(self.analytics.format_summary)
+            await message.answer(text)
+
+        @self.dp.message(Command("positions"))
+        async def cmd_positions(message: Message):
+            pages = await self.positions_view.pages()
+            await message.answer(
+                pages[0],
+                reply_markup=self._positions_keyboard(0, len(pages))
+            )
+
+        @self.dp.callback_query(F.data.startswith("positions:"))
+        async def cb_positions_page(callback: CallbackQuery):
+            pages = await self.positions_view.pages()
+            page = min(int(callback.data.split(":", 1)[1]), len(pages) - 1)
+
+            try:
+                await callback.message.edit_text(
+                    pages[page],
+                    reply_markup=self._positions_keyboard(page, len(pages))
+                )
+            except TelegramBadRequest:
+                # "message is not modified" — страница не изменилась
+                pass
+            await callback.answer()
+
+        @self.dp.message(Command("metrics"))
+        async def cmd_metrics(message: Message):
+            if not self.is_admin(message.from_user.id):
+                await message.answer("⛔ Только для администраторов")
+                return
+
+            stats = self.scheduler.stats()
+            wait, handler = stats["queue_wait"], stats["handler_time"]
+            await message.answer(
+                "📈 <b>Обработка апдейтов</b>\n\n"
+                f"В очереди/в работе: {stats['pending']}, отклонено: {stats['rejected']}\n"
+                f"Ожидание: p50 {wait['p50']}s, p90 {wait['p90']}s, p99 {wait['p99']}s\n"
+                f"Хендлер: p50 {handler['p50']}s, p90 {handler['p90']}s, p99 {handler['p99']}s "
+                f"(всего {handler['count']})\n\n"
+                "📮 <b>Доставка рассылок</b> (от постановки до отправки)\n"
+                + "\n".join(
+                    f"{name}: p50 {h['p50']}s, p99 {h['p99']}s (всего {h['count']})"
+                    for name, h in self.outbox.stats().items()
+                )
+            )
 
         @self.dp.message(Command("notify_all"))
         async def cmd_notify_all(message: Message):
@@ -91,7 +408,66 @@ class TradingBot:
                 await message.answer("❗ Укажи текст рассылки")
                 return
 
-            await self.send_to_all_users(text)
+            report = await self.send_to_all_users(text)
+            pruned = await asyncio.to_thread(self.unreachable.stats)
+            await message.answer(
+                f"📢 Рассылка завершена: {report['sent']}/{report['total']}, "
+                f"ошибок {report['failed']}, {report['throughput']} msg/s\n"
+                f"🧹 Отключено недоступных: {pruned['pruned']} "
+                f"(~{pruned['saved_per_broadcast']} сек экономии на рассылку)"
+            )
+
+    @staticmethod
+    def _positions_keyboard(page: int, total: int) -> InlineKeyboardMarkup | None:
+        if total <= 1:
+            return None
+
+        buttons = []
+        if page > 0:
+            buttons.append(InlineKeyboardButton(text="◀️", callback_data=f"positions:{page - 1}"))
+        buttons.append(InlineKeyboardButton(text=f"{page + 1}/{total}", callback_data=f"positions:{page}"))
+        if page < total - 1:
+            buttons.append(InlineKeyboardButton(text="▶️", callback_data=f"positions:{page + 1}"))
+
+        return InlineKeyboardMarkup(inline_keyboard=[buttons])
+
+    async def _resolve_symbol(self, query: str) -> str | None:
+        """Символ биржи для ввода пользователя (btc -> BTCUSDT) или None"""
+        symbol = self.prices.resolve(query)
+        if symbol is None:
+            # промахи одновременных запросов уходят одним поиском
+            try:
+                await asyncio.to_thread(self.prices.fetch_missing, [query])
+            except Exception:
+                logger.exception("Price lookup failed | %s", query)
+            symbol = self.prices.resolve(query)
+        return symbol
+
+    def _not_found_text(self, query: str) -> str:
+        suggestions = self.prices.complete(query, limit=5)
+        if suggestions:
+            return f"❓ {query.upper()} не найден. Возможно: {', '.join(suggestions)}"
+        return f"❓ {query.upper()} не найден"
+
+    async def _price_text(self, query: str) -> str:
+        symbol = await self._resolve_symbol(query)
+        if symbol is None:
+            return self._not_found_text(query)
+
+        return self._format_price(symbol, self.prices.get(symbol))
+
+    @staticmethod
+    def _format_price(symbol: str, price) -> str:
+        return (
+            f"<b>{symbol}</b>: {price}\n"
+            f"<a href='https://www.bybit.com/trade/usdt/{symbol}'>Open Bybit</a>"
+        )
+
+    @staticmethod
+    def _describe_subscription(symbol: str, side: str) -> str:
+        symbol_text = "все символы" if symbol == ANY else symbol
+        side_text = "long и short" if side == ANY else side
+        return f"{symbol_text}, {side_text}"
 
     def remove_position(self, position_id: int):
         # Хук для UI
@@ -108,7 +484,8 @@ class TradingBot:
         pos_type: str
     ) -> int:
         """
-        Создаёт позицию в БД и отправляет уведомление в Telegram
+        Создаёт позицию в БД и ставит уведомление в outbox.
+        Возвращается сразу после постановки, рассылку делает OutboxWorker
         """
 
         position_id = await asyncio.to_thread(
@@ -133,11 +510,11 @@ class TradingBot:
             f"<b>DON'T FORGET TO SEND A SCREEN OF THE POSITION</b>\n\n"
         )
 
-
-        await self.send_to_all_users(message)
+        await self.notify(message, name, pos_type, PRIORITY_SIGNAL)
+        self.positions_view.invalidate()
 
         logger.info(
-            "Signal created and notified | id=%s %s",
+            "Signal created and queued | id=%s %s",
             position_id,
             name
         )
@@ -165,26 +542,72 @@ class TradingBot:
             f"Reason: {'Take Profit' if close_reason == 'tp' else 'Stop Loss'}"
         )
 
-        await self.send_to_all_users(message)
+        # закрытие по TP/SL — самый срочный класс, обгоняет массовые рассылки
+        await self.notify(message, name, pos_type, PRIORITY_TPSL)
+        self.positions_view.invalidate()
 
 
     # ==========================
     # BROADCAST
     # ==========================
 
-    async def send_to_all_users(self, message: str):
-        users = await asyncio.to_thread(self.db.get_active_users)
+    async def notify(
+        self,
+        message: str,
+        symbol: str | None = None,
+        side: str | None = None,
+        priority: int = PRIORITY_BULK
+    ):
+        """
+        Уведомление о событии без ожидания рассылки: окно склейки
+        (DigestCoalescer), затем outbox
+        """
+        await self.digest.add(message, symbol, side, priority)
 
-        for user_id in users:
-            try:
-                await self.bot.send_message(
-                    user_id,
-                    message,
-                    disable_web_page_preview=True
-                )
-                await asyncio.sleep(0.05)
-            except Exception as e:
-                logger.warning(f"Send error {user_id}: {e}")
+    async def send_to_all_users(
+        self,
+        message: str,
+        symbol: str | None = None,
+        side: str | None = None,
+        priority: int = PRIORITY_BULK
+    ) -> dict:
+        """
+        Рассылка всем активным пользователям, возвращает отчёт {total, sent, failed, ...}.
+        С symbol/side — только тем, чьи подписки совпадают (и тем, у кого их нет).
+        priority — класс срочности в outbox (PRIORITY_* из tg_bot.outbox).
+        При запущенном боте идёт через outbox и ждёт завершения задания,
+        без него (NotificationSender, демо) — напрямую
+        """
+        matched = self.subscriptions.match(symbol, side) if symbol or side else None
+
+        if self.outbox.running:
+            job_id = await self.outbox.enqueue(message, matched, priority)
+            return await self.outbox.wait(job_id)
+
+        report = await self.broadcaster.broadcast(
+            self._iter_recipients(matched),
+            message,
+            disable_web_page_preview=True
+        )
+        await self.unreachable.flush_async()
+        return report
+
+    async def _iter_recipients(self, matched: set[int] | None = None):
+        # получатели приходят пачками из server-side курсора,
+        # отправка начинается сразу после первой пачки
+        chunks = self.db.iter_recipient_chunks()
+
+        try:
+            while True:
+                user_ids = await asyncio.to_thread(next, chunks, None)
+                if user_ids is None:
+                    break
+                if matched is not None:
+                    user_ids = [u for u in user_ids if self.subscriptions.allows(u, matched)]
+                yield user_ids
+        finally:
+            # освобождаем курсор и соединение, даже если рассылку прервали
+            await asyncio.to_thread(chunks.close)
 
     # ==========================
     # SERVICE
@@ -194,8 +617,37 @@ class TradingBot:
         return user_id in self.admin_ids
 
     async def start(self):
+        # досылает задания, прерванные прошлым запуском
+        self.prices.start()
+        self.outbox.start()
+        self.live_cards.start()
+        self.price_alerts.start()
+
+        if self.mode == "webhook":
+            self._stopped.clear()
+            await self.webhook.start(self.webhook_url or None)
+            logger.info("🤖 Bot webhook started")
+            # сервер работает в фоне — держим start() до stop(), как polling
+            await self._stopped.wait()
+            return
+
+        # с активным webhook getUpdates вернёт конфликт
+        await self.bot.delete_webhook()
         logger.info("🤖 Bot polling started")
-        await self.dp.start_polling(self.bot)
+        # каждый апдейт — отдельная задача, порядок внутри чата держит ChatScheduler
+        await self.dp.start_polling(self.bot, handle_as_tasks=True)
 
     async def stop(self):
-        await self.bot.session.close()
+        if self.mode == "webhook":
+            await self.webhook.stop()
+            self._stopped.set()
+
+        await self.live_cards.stop()
+        await self.price_alerts.stop()
+        await asyncio.to_thread(self.prices.stop)
+        # недособранная сводка уходит в outbox, а не теряется
+        await self.digest.stop()
+        await self.outbox.stop()
+        await asyncio.to_thread(self.user_buffer.stop)
+        for bot in (self.bot, *self.shard_bots):
+            await bot.session.close()
@@ -0,0 +1,162 @@
+import asyncio
+import logging
+import time
+
+from aiogram.exceptions import (
+    TelegramBadRequest,
+    TelegramForbiddenError,
+    TelegramNetworkError,
+    TelegramRetryAfter,
+    TelegramServerError,
+)
+
+from tg_bot.metrics import LatencyHistogram
+from tg_bot.rate_limit import PerChatLimiter, TokenBucket
+
+logger = logging.getLogger(__name__)
+
+# Ошибки, после которых имеет смысл повторить отправку
+TRANSIENT_ERRORS = (TelegramNetworkError, TelegramServerError, asyncio.TimeoutError)
+
+
+def unreachable_reason(error: Exception) -> str | None:
+    """
+    Причина, по которой чат больше недоступен боту, или None,
+    если ошибка не говорит о недоступности пользователя
+    """
+    text = str(error).lower()
+    if isinstance(error, TelegramForbiddenError):
+        if "blocked" in text:
+            return "blocked"
+        if "deactivated" in text:
+            return "deactivated"
+        return "forbidden"
+    if isinstance(error, TelegramBadRequest) and "chat not found" in text:
+        return "chat_not_found"
+    return None
+
+
+class Broadcaster:
+    """
+    Параллельная рассылка в пределах лимитов Telegram.
+
+    Общий token bucket держит глобальный лимит бота (~30 msg/s),
+    PerChatLimiter — не чаще сообщения в секунду в один чат.
+    RetryAfter ставит на паузу весь bucket, сетевые и 5xx ошибки
+    повторяются с экспоненциальной задержкой.
+    Недоступные чаты (бот заблокирован, аккаунт удалён) передаются
+    в on_unreachable(chat_id, reason) — см. UnreachableUsers
+    """
+
+    def __init__(
+        self,
+        bot,
+        rate: float = 25,
+        concurrency: int = 20,
+        per_chat_interval: float = 1.0,
+        max_retries: int = 3,
+        on_unreachable=None,
+    ):
+        self.bot = bot
+        self.bucket = TokenBucket(rate)
+        self.chat_limiter = PerChatLimiter(per_chat_interval)
+        self.concurrency = concurrency
+        self.max_retries = max_retries
+        self.on_unreachable = on_unreachable
+
+    async def broadcast(
+        self,
+        recipients,
+        text: str,
+        latency: LatencyHistogram | None = None,
+        **kwargs
+    ) -> dict:
+        """
+        recipients — async-итератор пачек chat_id.
+        Возвращает отчёт {total, sent, failed, duration, throughput, latency};
+        latency можно передать свою — например, общую для нескольких рассылок
+        """
+        started = time.perf_counter()
+        report = {"total": 0, "sent": 0, "failed": 0}
+        latency = latency if latency is not None else LatencyHistogram()
+        queue: asyncio.Queue = asyncio.Queue(maxsize=self.concurrency * 2)
+
+        async def produce():
+            try:
+                async for chat_ids in recipients:
+                    for chat_id in chat_ids:
+                        await queue.put(chat_id)
+            finally:
+                for _ in range(self.concurrency):
+                    await queue.put(None)
+
+        async def work():
+            while True:
+                chat_id = await queue.get()
+                if chat_id is None:
+                    return
+
+                report["total"] += 1
+                try:
+                    sent = await self.send(chat_id, text, latency, **kwargs)
+                except Exception:
+                    # упавший воркер оставил бы produce() ждать места в очереди
+                    logger.exception("Broadcast send failed | chat=%s", chat_id)
+                    sent = False
+                report["sent" if sent else "failed"] += 1
+
+        await asyncio.gather(produce(), *(work() for _ in range(self.concurrency)))
+
+        duration = time.perf_counter() - started
+        report.update(
+            duration=round(duration, 3),
+            throughput=round(report["sent"] / duration, 2) if duration else 0.0,
+            latency=latency.as_dict(),
+        )
+        logger.info(
+            "Broadcast done | total=%s sent=%s failed=%s %.1fs (%.1f msg/s)",
+            report["total"], report["sent"], report["failed"],
+            duration, report["throughput"]
+        )
+        return report
+
+    async def send(self, chat_id: int, text: str, latency: LatencyHistogram | None = None, **kwargs) -> bool:
+        return await self.call(
+            chat_id,
+            lambda: self.bot.send_message(chat_id, text, **kwargs),
+            latency
+        )
+
+    async def call(self, chat_id: int, request, latency: LatencyHistogram | None = None) -> bool:
+        """Выполняет запрос к Bot API для chat_id с лимитами и повторами"""
+        attempt = 0
+        while True:
+            await self.chat_limiter.acquire(chat_id)
+            await self.bucket.acquire()
+
+            started = time.perf_counter()
+            try:
+                await request()
+                if latency is not None:
+                    latency.observe(time.perf_counter() - started)
+                return True
+
+            except TelegramRetryAfter as e:
+                # flood control действует на весь бот — тормозим всех
+                logger.warning("Flood control, retry after %ss", e.retry_after)
+                self.bucket.pause(e.retry_after)
+
+            except TRANSIENT_ERRORS as e:
+                attempt += 1
+                if attempt > self.max_retries:
+                    logger.warning(f"Send error {chat_id}: {e}")
+                    return False
+                await asyncio.sleep(min(2 ** attempt * 0.5, 10))
+
+            except Exception as e:
+                reason = unreachable_reason(e)
+                if reason and self.on_unreachable:
+                    self.on_unreachable(chat_id, reason)
+                else:
+                    logger.warning(f"Send error {chat_id}: {e}")
+                return False
@@ -0,0 +1,154 @@
+import asyncio
+import logging
+from dataclasses import dataclass
+
+from tg_bot.outbox import PRIORITY_BULK
+
+logger = logging.getLogger(__name__)
+
+DIGEST_SEPARATOR = "\n\n──────────\n\n"
+# лимит Telegram — 4096 символов, оставляем запас на заголовок
+MAX_DIGEST_LENGTH = 3800
+
+
+@dataclass
+class DigestEvent:
+    text: str
+    symbol: str | None = None
+    side: str | None = None
+    priority: int = PRIORITY_BULK
+
+
+class DigestCoalescer:
+    """
+    Склейка всплеска уведомлений в одну сводку на получателя.
+
+    Первое событие открывает окно window_ms; всё, что пришло за окно,
+    уходит в outbox одной сводкой. Получатель видит только события,
+    совпавшие с его подписками: пользователи без подписок получают
+    общую сводку, подписчики группируются по набору своих событий —
+    на каждую группу одно задание. Итого за всплеск по одному
+    сообщению на пользователя вместо событий × пользователей.
+    Одиночное событие уходит как обычно, сводка — с приоритетом
+    самого срочного события. Если outbox не принял сводку (ошибка БД),
+    события возвращаются в окно и уходят следующей попыткой — как и
+    у outbox, гарантия at-least-once
+    """
+
+    def __init__(self, outbox, subscriptions, window_ms: int = 1500):
+        self.outbox = outbox
+        self.subscriptions = subscriptions
+        self.window = window_ms / 1000
+
+        self._events: list[DigestEvent] = []
+        self._timer: asyncio.Task | None = None
+
+    async def add(self, text: str, symbol=None, side=None, priority: int = PRIORITY_BULK):
+        event = DigestEvent(text, symbol, side, priority)
+        if self.window <= 0:
+            await self._enqueue_single(event)
+            return
+
+        self._events.append(event)
+        if self._timer is None:
+            self._timer = asyncio.create_task(self._flush_later())
+
+    async def _flush_later(self):
+        await asyncio.sleep(self.window)
+        self._timer = None
+        try:
+            await self.flush()
+        except Exception:
+            logger.exception("Digest flush failed, retrying | events=%d", len(self._events))
+            if self._timer is None:
+                self._timer = asyncio.create_task(self._flush_later())
+
+    async def stop(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        try:
+            await self.flush()
+        except Exception:
+            logger.exception("Digest flush on stop failed | events=%d", len(self._events))
+
+    async def flush(self) -> list[int]:
+        events, self._events = self._events, []
+        if not events:
+            return []
+
+        try:
+            return await self._enqueue_events(events)
+        except Exception:
+            # перед событиями, пришедшими за время попытки
+            self._events[:0] = events
+            raise
+
+    async def _enqueue_events(self, events) -> list[int]:
+        if len(events) == 1:
+            return [await self._enqueue_single(events[0])]
+
+        logger.info("Coalescing %d events into digests", len(events))
+
+        # подписчик -> номера событий, которые он должен увидеть
+        subscribed = self.subscriptions.subscribers()
+        seen: dict[int, list[int]] = {}
+        for index, event in enumerate(events):
+            if event.symbol or event.side:
+                users = self.subscriptions.match(event.symbol, event.side)
+            else:
+                users = subscribed
+            for user_id in users:
+                seen.setdefault(user_id, []).append(index)
+
+        groups: dict[tuple[int, ...], list[int]] = {}
+        for user_id, indexes in seen.items():
+            groups.setdefault(tuple(indexes), []).append(user_id)
+
+        job_ids = []
+        # пользователи без подписок — все события; subscribers=[] отсекает подписчиков
+        job_ids += await self._enqueue_digest(events, subscribers=[])
+        for indexes, user_ids in groups.items():
+            job_ids += await self._enqueue_digest(
+                [events[i] for i in indexes], recipients=user_ids
+            )
+        return job_ids
+
+    async def _enqueue_single(self, event: DigestEvent) -> int:
+        matched = None
+        if event.symbol or event.side:
+            matched = self.subscriptions.match(event.symbol, event.side)
+        return await self.outbox.enqueue(event.text, matched, event.priority)
+
+    async def _enqueue_digest(self, events, subscribers=None, recipients=None) -> list[int]:
+        priority = min(event.priority for event in events)
+
+        job_ids = []
+        for text in self.render(events):
+            job_ids.append(await self.outbox.enqueue(
+                text, subscribers, priority, recipients=recipients
+            ))
+        return job_ids
+
+    @staticmethod
+    def render(events) -> list[str]:
+        """Сводка; если не влезает в одно сообщение — несколько частей"""
+        if len(events) == 1:
+            return [events[0].text]
+
+        parts, current = [], []
+        for event in events:
+            candidate = current + [event.text]
+            if current and len(DIGEST_SEPARATOR.join(candidate)) > MAX_DIGEST_LENGTH:
+                parts.append(current)
+                candidate = [event.text]
+            current = candidate
+        parts.append(current)
+
+        return [
+            f"📦 <b>Сводка: {len(events)} событий</b>"
+            + (f" (часть {number}/{len(parts)})" if len(parts) > 1 else "")
+            + "\n\n"
+            + DIGEST_SEPARATOR.join(part)
+            for number, part in enumerate(parts, start=1)
+        ]
@@ -0,0 +1,100 @@
+import asyncio
+import logging
+import time
+
+from tg_bot.metrics import LatencyHistogram
+
+logger = logging.getLogger(__name__)
+
+
+def update_chat_id(update) -> int | None:
+    """chat_id апдейта: сообщение, callback или inline-запрос (по пользователю)"""
+    message = getattr(update, "message", None) or getattr(update, "edited_message", None)
+    if message is not None:
+        return message.chat.id
+
+    callback = getattr(update, "callback_query", None)
+    if callback is not None:
+        if callback.message is not None:
+            return callback.message.chat.id
+        return callback.from_user.id
+
+    inline = getattr(update, "inline_query", None)
+    if inline is not None:
+        return inline.from_user.id
+
+    return None
+
+
+class ChatScheduler:
+    """
+    Outer-middleware для dp.update: апдейты разных чатов обрабатываются
+    параллельно (не больше max_concurrency хендлеров), апдейты одного чата —
+    строго по очереди, в порядке поступления.
+
+    Admission control: если в очереди и в работе уже max_pending апдейтов,
+    новый отбрасывается (rejected) вместо бесконечного роста очереди.
+    queue_wait — время от поступления до начала обработки,
+    handler_time — время самого хендлера
+    """
+
+    def __init__(self, max_concurrency: int = 20, max_pending: int = 500):
+        self.max_concurrency = max_concurrency
+        self.max_pending = max_pending
+
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        # chat_id -> [lock, сколько апдейтов чата ждут или в работе]
+        self._chats: dict[int | None, list] = {}
+        self._pending = 0
+
+        self.queue_wait = LatencyHistogram()
+        self.handler_time = LatencyHistogram()
+        self.rejected = 0
+
+    @property
+    def pending(self) -> int:
+        return self._pending
+
+    async def __call__(self, handler, event, data):
+        return await self.run(update_chat_id(event), handler, event, data)
+
+    async def run(self, chat_id, handler, *args):
+        if self._pending >= self.max_pending:
+            self.rejected += 1
+            logger.warning("Update rejected, overloaded | chat=%s pending=%d", chat_id, self._pending)
+            return None
+
+        self._pending += 1
+        queued = time.perf_counter()
+
+        chat = self._chats.get(chat_id)
+        if chat is None:
+            # апдейты без чата не упорядочиваем — у каждого свой lock
+            chat = [asyncio.Lock(), 0]
+            if chat_id is not None:
+                self._chats[chat_id] = chat
+        chat[1] += 1
+
+        try:
+            # asyncio.Lock отдаёт захват в порядке очереди — порядок чата сохраняется
+            async with chat[0]:
+                async with self._semaphore:
+                    started = time.perf_counter()
+                    self.queue_wait.observe(started - queued)
+                    try:
+                        return await handler(*args)
+                    finally:
+                        self.handler_time.observe(time.perf_counter() - started)
+        finally:
+            self._pending -= 1
+            chat[1] -= 1
+            if not chat[1]:
+                self._chats.pop(chat_id, None)
+
+    def stats(self) -> dict:
+        return {
+            "pending": self._pending,
+            "rejected": self.rejected,
+            "queue_wait": self.queue_wait.as_dict(),
+            "handler_time": self.handler_time.as_dict(),
+        }
@@ -0,0 +1,166 @@
+import asyncio
+import logging
+import time
+from dataclasses import dataclass
+
+from tg_bot.positions_view import PositionsView
+
+logger = logging.getLogger(__name__)
+
+CLOSED_FOOTER = "\n\n🏁 <b>Позиция закрыта</b>"
+
+
+@dataclass
+class LiveCard:
+    message_id: int
+    text: str
+    edited_at: float = 0.0
+    failures: int = 0
+
+
+class LiveCards:
+    """
+    «Живые» карточки позиций: сообщение пользователя с PnL, которое
+    обновляется через editMessageText вместо новых сообщений.
+
+    Включается командой /live. Каждую tick сек карточки сверяются
+    с общим снимком PositionsView: неизменившийся текст не редактируется,
+    а одно сообщение правится не чаще раза в interval сек — промежуточные
+    цены схлопываются, уходит последняя. Правки идут через Broadcaster,
+    то есть в общем лимите Telegram. Закрытая позиция получает финальную
+    правку и перестаёт обновляться
+    """
+
+    def __init__(
+        self,
+        db,
+        broadcaster,
+        view: PositionsView,
+        interval: float = 15.0,
+        tick: float = 1.0,
+        max_failures: int = 3,
+    ):
+        self.db = db
+        self.broadcaster = broadcaster
+        self.view = view
+        self.interval = interval
+        self.tick = tick
+        self.max_failures = max_failures
+
+        self.cards: dict[tuple[int, int], LiveCard] = {}
+        self._stop_flag = False
+        self._task: asyncio.Task | None = None
+
+    async def load(self):
+        """Карточки прошлого запуска — продолжаем их обновлять"""
+        rows = await asyncio.to_thread(self.db.get_live_cards)
+        for chat_id, position_id, message_id in rows:
+            self.cards[(chat_id, position_id)] = LiveCard(message_id, text="")
+
+    async def open(self, chat_id: int, position_id: int, message_id: int, text: str):
+        self.cards[(chat_id, position_id)] = LiveCard(message_id, text, time.monotonic())
+        await asyncio.to_thread(self.db.save_live_card, chat_id, position_id, message_id)
+
+    async def close_chat(self, chat_id: int) -> int:
+        for key in [key for key in self.cards if key[0] == chat_id]:
+            del self.cards[key]
+        return await asyncio.to_thread(self.db.delete_live_cards, chat_id)
+
+    def start(self) -> asyncio.Task:
+        if self._task is None or self._task.done():
+            self._stop_flag = False
+            self._task = asyncio.create_task(self._run(), name="live_cards")
+        return self._task
+
+    async def stop(self):
+        self._stop_flag = True
+        if self._task:
+            await self._task
+            self._task = None
+
+    async def _run(self):
+        try:
+            await self.load()
+        except Exception:
+            logger.exception("Failed to load live cards")
+
+        while not self._stop_flag:
+            try:
+                await self.refresh()
+            except Exception:
+                logger.exception("Live cards refresh failed")
+            await asyncio.sleep(self.tick)
+
+    async def refresh(self) -> int:
+        """Одна сверка карточек со снимком, возвращает число отправленных правок"""
+        if not self.cards:
+            return 0
+
+        positions, prices = await self.view.snapshot()
+        active = {pos["id"]: pos for pos in positions}
+        now = time.monotonic()
+
+        edits = []
+        restored = []
+        for key, card in list(self.cards.items()):
+            pos = active.get(key[1])
+            if pos is None:
+                if not card.text:
+                    # карточка прошлого запуска, текста нет — соберём из закрытой позиции
+                    restored.append((key, card))
+                    continue
+                # позиция закрыта — последняя правка без ожидания интервала
+                edits.append(self._edit(key, card, (card.text + CLOSED_FOOTER).strip(), final=True))
+                continue
+
+            text = PositionsView.render_position(
+                pos, prices.get(pos["name"]), self.view.portfolio.pnl_of(pos["id"])
+            )
+            if text == card.text or now - card.edited_at < self.interval:
+                continue
+            edits.append(self._edit(key, card, text))
+
+        if restored:
+            edits += await self._final_edits(restored)
+
+        await asyncio.gather(*edits)
+        return len(edits)
+
+    async def _final_edits(self, restored) -> list:
+        """Финальные правки карточек, закрывшихся, пока бот не работал"""
+        position_ids = {key[1] for key, _ in restored}
+        positions = await asyncio.to_thread(self.db.get_all_positions, False)
+        closed = {pos["id"]: pos for pos in positions if pos["id"] in position_ids}
+
+        edits = []
+        for key, card in restored:
+            pos = closed.get(key[1])
+            if pos is None:
+                # позиция удалена — показать нечего, просто перестаём следить
+                self.cards.pop(key, None)
+                await asyncio.to_thread(self.db.delete_live_cards, *key)
+                continue
+
+            text = PositionsView.render_position(pos, None, pos.get("final_pnl")) + CLOSED_FOOTER
+            edits.append(self._edit(key, card, text, final=True))
+        return edits
+
+    async def _edit(self, key, card: LiveCard, text: str, final: bool = False):
+        chat_id, position_id = key
+        ok = await self.broadcaster.call(
+            chat_id,
+            lambda: self.broadcaster.bot.edit_message_text(
+                text=text, chat_id=chat_id, message_id=card.message_id
+            )
+        )
+
+        card.edited_at = time.monotonic()
+        if ok:
+            card.text, card.failures = text, 0
+        else:
+            # сообщение удалено или чат недоступен — не долбим его бесконечно
+            card.failures += 1
+
+        if final or card.failures >= self.max_failures:
+            self.cards.pop(key, None)
+            await asyncio.to_thread(self.db.delete_live_cards, chat_id, position_id)
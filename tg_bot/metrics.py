@@ -0,0 +1,53 @@
+import bisect
+
+# Границы корзин гистограммы задержек, сек
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+class LatencyHistogram:
+    """Гистограмма задержек с фиксированными корзинами и перцентилями по ним"""
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def observe(self, seconds: float):
+        self.counts[bisect.bisect_left(self.buckets, seconds)] += 1
+        self.count += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+
+    def merge(self, other: "LatencyHistogram"):
+        for i, value in enumerate(other.counts):
+            self.counts[i] += value
+        self.count += other.count
+        self.total += other.total
+        self.max = max(self.max, other.max)
+
+    def percentile(self, q: float) -> float:
+        """Верхняя граница корзины, в которую попадает q-й перцентиль"""
+        if not self.count:
+            return 0.0
+
+        rank = q / 100 * self.count
+        seen = 0
+        for i, value in enumerate(self.counts):
+            seen += value
+            if seen >= rank and value:
+                return self.buckets[i] if i < len(self.buckets) else self.max
+        return self.max
+
+    def as_dict(self) -> dict:
+        labels = [f"<={b}s" for b in self.buckets] + [f">{self.buckets[-1]}s"]
+        return {
+            "count": self.count,
+            "avg": round(self.total / self.count, 4) if self.count else 0.0,
+            "p50": self.percentile(50),
+            "p90": self.percentile(90),
+            "p99": self.percentile(99),
+            "max": round(self.max, 4),
+            "buckets": dict(zip(labels, self.counts)),
+        }
@@ -0,0 +1,286 @@
+import asyncio
+import logging
+import time
+from datetime import datetime, timedelta
+
+from tg_bot.metrics import LatencyHistogram
+
+logger = logging.getLogger(__name__)
+
+# Классы срочности рассылок: меньше — срочнее
+PRIORITY_TPSL = 0
+PRIORITY_ALERT = 1
+PRIORITY_SIGNAL = 2
+PRIORITY_BULK = 3
+
+PRIORITY_NAMES = {
+    PRIORITY_TPSL: "tp/sl",
+    PRIORITY_ALERT: "alerts",
+    PRIORITY_SIGNAL: "signals",
+    PRIORITY_BULK: "bulk",
+}
+
+# Доли пачки по классам: срочные получают большую часть лимита Telegram,
+# но и массовая рассылка не голодает
+PRIORITY_WEIGHTS = {
+    PRIORITY_TPSL: 8,
+    PRIORITY_ALERT: 4,
+    PRIORITY_SIGNAL: 2,
+    PRIORITY_BULK: 1,
+}
+
+# Сквозная задержка доставки измеряется минутами, а не долями секунды
+DELIVERY_BUCKETS = (1, 5, 15, 30, 60, 120, 300, 600, 1800)
+
+
+class OutboxWorker:
+    """
+    Доставка рассылок из durable outbox (broadcast_jobs / broadcast_deliveries).
+
+    enqueue() только пишет задание в БД и сразу возвращает job_id.
+    Воркер забирает доставки пачками (claim_broadcast_batch), отправляет их
+    через Broadcaster с общими лимитами и отмечает итог каждой строки.
+    Незавершённые задания после перезапуска продолжаются с того же места:
+    брошенные 'sending' забираются повторно через stale_after сек.
+    Гарантия — at-least-once: упав между отправкой и отметкой,
+    сообщение может уйти повторно.
+
+    Приоритеты: каждая пачка собирается по долям PRIORITY_WEIGHTS из
+    каждого класса, остаток добирается самыми срочными. Так TP/SL,
+    поставленный посреди длинной рассылки, уходит уже со следующей пачкой
+    (вытеснение между пачками), а массовая рассылка всё равно движется.
+    class_latency — задержка от постановки до отправки по классам
+    """
+
+    def __init__(
+        self,
+        db,
+        broadcaster,
+        batch_size: int = 100,
+        poll_interval: float = 5.0,
+        stale_after: int = 120,
+        retention: timedelta = timedelta(days=7),
+        maintenance_interval: float = 3600,
+        pruner=None,
+        **send_kwargs,
+    ):
+        self.db = db
+        self.broadcaster = broadcaster
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        self.stale_after = stale_after
+        self.retention = retention
+        self.maintenance_interval = maintenance_interval
+        self.pruner = pruner
+        self.send_kwargs = send_kwargs or {"disable_web_page_preview": True}
+
+        self._wakeup = asyncio.Event()
+        self._stop_flag = False
+        self._task: asyncio.Task | None = None
+        self._waiters: dict[int, list[asyncio.Future]] = {}
+        # метрики заданий, отправляемых этим процессом
+        self._started: dict[int, float] = {}
+        self._latency: dict[int, LatencyHistogram] = {}
+        self._enqueued: dict[int, float] = {}
+        self.class_latency = {
+            priority: LatencyHistogram(DELIVERY_BUCKETS) for priority in PRIORITY_NAMES
+        }
+        self._last_maintenance = 0.0
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def start(self) -> asyncio.Task:
+        if self.running:
+            return self._task
+
+        self._stop_flag = False
+        self._wakeup = asyncio.Event()
+        self._task = asyncio.create_task(self._run(), name="broadcast_outbox")
+        return self._task
+
+    async def stop(self, timeout: float = 10):
+        """Дожидается текущей пачки; недоставленное останется в outbox"""
+        self._stop_flag = True
+        self._wakeup.set()
+        if self._task:
+            try:
+                await asyncio.wait_for(self._task, timeout)
+            except asyncio.TimeoutError:
+                # забранные строки вернутся в работу через stale_after
+                logger.warning("Outbox worker did not stop in %ss, cancelling", timeout)
+            self._task = None
+
+    async def enqueue(
+        self,
+        message: str,
+        subscribers=None,
+        priority: int = PRIORITY_BULK,
+        recipients=None,
+    ) -> int:
+        """subscribers / recipients — адресная рассылка, см. enqueue_broadcast"""
+        job_id = await asyncio.to_thread(
+            self.db.enqueue_broadcast, message, subscribers, priority, recipients
+        )
+        self._enqueued[job_id] = time.perf_counter()
+        self._wakeup.set()
+        return job_id
+
+    async def wait(self, job_id: int) -> dict:
+        """Ждёт завершения задания и возвращает отчёт по нему"""
+        future = asyncio.get_running_loop().create_future()
+        self._waiters.setdefault(job_id, []).append(future)
+
+        # задание могло завершиться до подписки (например, без получателей)
+        report = await asyncio.to_thread(self.db.get_broadcast_report, job_id)
+        if report.get("status") == "done":
+            self._resolve(job_id, self._with_metrics(report))
+
+        return await future
+
+    # ==========================
+    # WORKER
+    # ==========================
+
+    async def _run(self):
+        logger.info("📮 Outbox worker started")
+
+        while not self._stop_flag:
+            try:
+                batch = await self._claim()
+            except Exception:
+                logger.exception("Outbox claim failed")
+                batch = []
+
+            if not batch:
+                await self._maintenance()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), self.poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+                self._wakeup.clear()
+                continue
+
+            try:
+                results = await self._deliver(batch)
+            except Exception:
+                # строки останутся 'sending' и будут отправлены повторно
+                logger.exception("Outbox delivery failed | rows=%d", len(batch))
+                continue
+
+            if self.pruner is not None:
+                # отключаем недоступных до следующей пачки
+                try:
+                    await self.pruner.flush_async()
+                except Exception:
+                    logger.exception("Outbox pruning failed")
+
+            try:
+                finished = await asyncio.to_thread(self.db.complete_broadcast_batch, results)
+            except Exception:
+                # строки останутся 'sending' и будут отправлены повторно
+                logger.exception("Outbox completion failed | rows=%d", len(results))
+                continue
+
+            for job_id in finished:
+                await self._finish(job_id)
+
+        logger.info("📮 Outbox worker stopped")
+
+    async def _claim(self):
+        """Пачка по весам классов, остаток — самыми срочными доставками"""
+        total_weight = sum(PRIORITY_WEIGHTS.values())
+        quotas = {
+            priority: max(1, self.batch_size * weight // total_weight)
+            for priority, weight in PRIORITY_WEIGHTS.items()
+        }
+        # одним вызовом: иначе при малом stale_after общий добор снова
+        # забирал бы строки, только что взятые по классам
+        batch = await asyncio.to_thread(
+            self.db.claim_broadcast_batch, self.batch_size, self.stale_after, quotas
+        )
+
+        # внутри пачки срочные уходят первыми
+        batch.sort(key=lambda row: row[3])
+        return batch
+
+    async def _deliver(self, batch):
+        queue: asyncio.Queue = asyncio.Queue()
+        for item in batch:
+            queue.put_nowait(item)
+
+        results = []
+        claimed = time.perf_counter()
+
+        async def work():
+            while not queue.empty():
+                job_id, user_id, message, priority = queue.get_nowait()
+                self._started.setdefault(job_id, time.perf_counter())
+                latency = self._latency.setdefault(job_id, LatencyHistogram())
+
+                try:
+                    sent = await self.broadcaster.send(user_id, message, latency, **self.send_kwargs)
+                    error = None if sent else "send failed"
+                except Exception as e:
+                    # упавший воркер оборвал бы gather и всю пачку
+                    logger.exception("Outbox send failed | job=%s chat=%s", job_id, user_id)
+                    sent, error = False, f"send error: {e}"
+                results.append((job_id, user_id, sent, error))
+
+                if sent and priority in self.class_latency:
+                    # задание из прошлого запуска — считаем от момента claim
+                    enqueued = self._enqueued.get(job_id, claimed)
+                    self.class_latency[priority].observe(time.perf_counter() - enqueued)
+
+        workers = min(self.broadcaster.concurrency, len(batch))
+        await asyncio.gather(*(work() for _ in range(workers)))
+        return results
+
+    def stats(self) -> dict:
+        """Сквозная задержка доставки по классам срочности"""
+        return {
+            PRIORITY_NAMES[priority]: histogram.as_dict()
+            for priority, histogram in self.class_latency.items()
+        }
+
+    async def _finish(self, job_id: int):
+        self._enqueued.pop(job_id, None)
+        report = await asyncio.to_thread(self.db.get_broadcast_report, job_id)
+        report = self._with_metrics(report)
+
+        logger.info(
+            "Broadcast job done | job=%s total=%s sent=%s failed=%s",
+            job_id, report.get("total"), report.get("sent"), report.get("failed")
+        )
+        self._resolve(job_id, report)
+
+    def _with_metrics(self, report: dict) -> dict:
+        job_id = report.get("job_id")
+        started = self._started.pop(job_id, None)
+        latency = self._latency.pop(job_id, None)
+
+        duration = time.perf_counter() - started if started else 0.0
+        report.update(
+            duration=round(duration, 3),
+            throughput=round(report.get("sent", 0) / duration, 2) if duration else 0.0,
+            latency=(latency or LatencyHistogram()).as_dict(),
+        )
+        return report
+
+    def _resolve(self, job_id: int, report: dict):
+        for future in self._waiters.pop(job_id, []):
+            if not future.done():
+                future.set_result(report)
+
+    async def _maintenance(self):
+        if time.monotonic() - self._last_maintenance < self.maintenance_interval:
+            return
+
+        self._last_maintenance = time.monotonic()
+        try:
+            await asyncio.to_thread(
+                self.db.prune_broadcast_jobs, datetime.now() - self.retention
+            )
+        except Exception:
+            logger.exception("Outbox maintenance failed")
@@ -0,0 +1,118 @@
+import asyncio
+import logging
+import time
+
+from utils.portfolio import PortfolioSnapshot, PortfolioState
+
+logger = logging.getLogger(__name__)
+
+
+def pnl_percent(entry_price, current_price, leverage, pos_type) -> float | None:
+    """PnL позиции в % с учётом плеча, как в карточках терминала"""
+    if not entry_price or not current_price or not leverage:
+        return None
+
+    entry, current = float(entry_price), float(current_price)
+    if pos_type == "short":
+        change = (entry - current) / entry
+    else:
+        change = (current - entry) / entry
+    return round(change * float(leverage) * 100, 2)
+
+
+class PositionsView:
+    """
+    Ответ на /positions: все активные позиции с текущими ценами и PnL,
+    разбитые на страницы по page_size.
+
+    Цены берутся одним батчем (price_fetcher(symbols) -> {symbol: price}),
+    PnL всех позиций считается одним проходом PortfolioState.
+    Готовые страницы живут ttl секунд и общие для всех пользователей;
+    одновременные вызовы ждут одну и ту же сборку (single-flight)
+    """
+
+    def __init__(self, db, price_fetcher=None, ttl: float = 5.0, page_size: int = 10):
+        if price_fetcher is None:
+            from parsing.coin_price_parcing import get_bybit_last_prices
+            price_fetcher = get_bybit_last_prices
+
+        self.db = db
+        self.price_fetcher = price_fetcher
+        self.ttl = ttl
+        self.page_size = page_size
+
+        self._pages: list[str] | None = None
+        self._snapshot: tuple[list, dict] = ([], {})
+        self.portfolio: PortfolioSnapshot = PortfolioState().evaluate({})
+        self._built_at = 0.0
+        self._inflight: asyncio.Task | None = None
+
+    async def pages(self) -> list[str]:
+        if self._pages is not None and time.monotonic() - self._built_at < self.ttl:
+            return self._pages
+
+        if self._inflight is None or self._inflight.done():
+            self._inflight = asyncio.create_task(self._rebuild())
+
+        # shield: отмена одного запроса не должна ломать сборку для остальных
+        return await asyncio.shield(self._inflight)
+
+    async def snapshot(self) -> tuple[list, dict]:
+        """(активные позиции, {symbol: price}) из того же кэша, что и страницы"""
+        await self.pages()
+        return self._snapshot
+
+    def invalidate(self):
+        """Сбросить кэш — например, после открытия или закрытия позиции"""
+        self._pages = None
+
+    async def _rebuild(self) -> list[str]:
+        positions = await asyncio.to_thread(self.db.get_all_positions, True)
+
+        symbols = sorted({pos["name"] for pos in positions})
+        prices = await asyncio.to_thread(self.price_fetcher, symbols) if symbols else {}
+
+        portfolio = PortfolioState(positions).evaluate(prices)
+        pages = self.render(positions, prices, portfolio)
+        self._snapshot, self.portfolio = (positions, prices), portfolio
+        self._pages, self._built_at = pages, time.monotonic()
+        return pages
+
+    def render(self, positions, prices, portfolio: PortfolioSnapshot | None = None) -> list[str]:
+        if not positions:
+            return ["📭 Нет активных позиций"]
+
+        if portfolio is None:
+            portfolio = PortfolioState(positions).evaluate(prices)
+        blocks = [
+            self.render_position(pos, prices.get(pos["name"]), portfolio.pnl_of(pos["id"]))
+            for pos in positions
+        ]
+        chunks = [
+            blocks[i:i + self.page_size]
+            for i in range(0, len(blocks), self.page_size)
+        ]
+
+        return [
+            f"📊 <b>Активные позиции: {len(positions)}</b> (стр. {number}/{len(chunks)})\n\n"
+            + "\n\n".join(chunk)
+            for number, chunk in enumerate(chunks, start=1)
+        ]
+
+    @staticmethod
+    def render_position(pos, price, pnl: float | None = None) -> str:
+        pos_type = pos.get("pos_type") or ""
+        if pnl is None:
+            pnl = pnl_percent(pos.get("entry_price"), price, pos.get("cross_margin"), pos_type)
+
+        if pnl is None:
+            pnl_text = "—"
+        else:
+            pnl_text = f"{'🟢' if pnl >= 0 else '🔴'} {pnl:+.2f}%"
+
+        return (
+            f"<b>{pos['name']}</b> {pos_type.upper()} x{pos.get('cross_margin')}\n"
+            f"Вход: {pos.get('entry_price')} | Цена: {price if price is not None else 'N/A'}\n"
+            f"TP: {pos.get('take_profit')} | SL: {pos.get('stop_loss')}\n"
+            f"PnL: {pnl_text}"
+        )
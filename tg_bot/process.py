@@ -0,0 +1,313 @@
+import asyncio
+import atexit
+import concurrent.futures
+import itertools
+import logging
+import multiprocessing
+import queue
+import threading
+import time
+
+from tg_bot.outbox import PRIORITY_BULK
+
+logger = logging.getLogger(__name__)
+
+# методы TradingBot, которые UI может вызвать через IPC
+REMOTE_METHODS = frozenset({
+    "notify",
+    "create_position_and_notify",
+    "notify_position_closed",
+    "remove_position",
+})
+
+
+def _default_factory(token, admin_ids):
+    from tg_bot.bot import TradingBot
+    return TradingBot(token=token, admin_ids=admin_ids)
+
+
+def run_bot_process(token, admin_ids, commands, events, heartbeat_interval, bot_factory=None):
+    """Точка входа дочернего процесса: свой event loop, своя БД, свой бот"""
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(_serve(
+        (bot_factory or _default_factory)(token, admin_ids),
+        commands,
+        events,
+        heartbeat_interval
+    ))
+
+
+async def _serve(bot, commands, events, heartbeat_interval):
+    polling = asyncio.create_task(bot.start(), name="bot")
+
+    async def heartbeat():
+        while True:
+            stats = {}
+            outbox = getattr(bot, "outbox", None)
+            if outbox is not None:
+                stats["outbox"] = outbox.stats()
+            events.put(("heartbeat", time.time(), stats))
+            await asyncio.sleep(heartbeat_interval)
+
+    async def handle(request_id, method, args, kwargs):
+        try:
+            if method not in REMOTE_METHODS:
+                raise AttributeError(f"method {method!r} is not remote")
+            result = getattr(bot, method)(*args, **kwargs)
+            if asyncio.iscoroutine(result):
+                result = await result
+            events.put(("result", request_id, True, result))
+        except Exception as e:
+            logger.exception("Remote call failed | %s", method)
+            events.put(("result", request_id, False, repr(e)))
+
+    beat = asyncio.create_task(heartbeat(), name="heartbeat")
+    calls = set()
+    try:
+        while not polling.done():
+            try:
+                command = await asyncio.to_thread(commands.get, True, 0.5)
+            except queue.Empty:
+                continue
+
+            if command[0] == "stop":
+                break
+
+            _, request_id, method, args, kwargs = command
+            task = asyncio.create_task(handle(request_id, method, args, kwargs))
+            calls.add(task)
+            task.add_done_callback(calls.discard)
+    finally:
+        await asyncio.gather(*calls, return_exceptions=True)
+        beat.cancel()
+        await bot.stop()
+        if not polling.done():
+            polling.cancel()
+        await asyncio.gather(polling, return_exceptions=True)
+
+
+class BotProcess:
+    """
+    TradingBot в отдельном процессе — рассылки и polling не делят
+    event loop с Flet UI.
+
+    Снаружи — тот же интерфейс, что нужен UI (notify,
+    create_position_and_notify, remove_position, start/stop): вызов
+    уходит командой в multiprocessing.Queue, ответ приходит в обратную
+    очередь вместе с heartbeat'ами и статистикой outbox.
+
+    Супервизор (поток в процессе UI) перезапускает бота, если процесс
+    умер или молчит дольше heartbeat_timeout, с нарастающей паузой
+    до max_backoff. Вызовы, не получившие ответа до падения, завершаются
+    ConnectionError — уведомления, уже поставленные в outbox, не теряются
+    """
+
+    def __init__(
+        self,
+        token: str,
+        admin_ids=None,
+        heartbeat_interval: float = 5.0,
+        heartbeat_timeout: float = 30.0,
+        call_timeout: float = 30.0,
+        max_backoff: float = 60.0,
+        tick: float = 0.5,
+        bot_factory=None,
+        start_method: str = "spawn",
+    ):
+        self.token = token
+        self.admin_ids = admin_ids or []
+        self.heartbeat_interval = heartbeat_interval
+        self.heartbeat_timeout = heartbeat_timeout
+        self.call_timeout = call_timeout
+        self.max_backoff = max_backoff
+        self.tick = tick
+        self.bot_factory = bot_factory
+        self.has_valid_token = True
+
+        self._ctx = multiprocessing.get_context(start_method)
+        self._process = None
+        self._commands = None
+        self._events = None
+        self._ids = itertools.count(1)
+        self._pending: dict[int, concurrent.futures.Future] = {}
+        self._lock = threading.Lock()
+
+        self._stop_flag = False
+        self._wakeup = threading.Event()
+        self._thread: threading.Thread | None = None
+        self._spawned_at = 0.0
+        self.restarts = 0
+        self.last_heartbeat = 0.0
+        self.last_stats: dict = {}
+
+    # ==========================
+    # LIFECYCLE
+    # ==========================
+
+    async def start(self):
+        """Запуск процесса и супервизора; возвращается сразу"""
+        if self._thread and self._thread.is_alive():
+            return
+
+        self._stop_flag = False
+        self._wakeup.clear()
+        self._spawn()
+        self._thread = threading.Thread(
+            target=self._supervise, daemon=True, name="bot_supervisor"
+        )
+        self._thread.start()
+        atexit.register(self.shutdown)
+
+    async def stop(self, timeout: float = 30.0):
+        await asyncio.to_thread(self.shutdown, timeout)
+
+    def shutdown(self, timeout: float = 30.0):
+        self._stop_flag = True
+        self._wakeup.set()
+        if self._thread:
+            self._thread.join()
+            self._thread = None
+
+        process = self._process
+        if process is not None and process.is_alive():
+            # бот сам досылает сводки и останавливает outbox
+            self._commands.put(("stop",))
+            process.join(timeout)
+            if process.is_alive():
+                logger.warning("Bot process did not stop in %ss, terminating", timeout)
+                process.terminate()
+                process.join()
+        self._fail_pending("bot process stopped")
+
+    def _spawn(self):
+        # свежие очереди: очередь, которую держал убитый процесс, может быть сломана
+        for old in (self._commands, self._events):
+            if old is not None:
+                # непрочитанные команды мёртвого процесса не должны держать выход
+                old.cancel_join_thread()
+                old.close()
+        self._commands = self._ctx.Queue()
+        self._events = self._ctx.Queue()
+        self._process = self._ctx.Process(
+            target=run_bot_process,
+            args=(
+                self.token,
+                self.admin_ids,
+                self._commands,
+                self._events,
+                self.heartbeat_interval,
+                self.bot_factory,
+            ),
+            daemon=True,
+            name="trading_bot",
+        )
+        self._process.start()
+        # время на запуск засчитываем как heartbeat
+        self._spawned_at = self.last_heartbeat = time.time()
+        logger.info("Bot process started | pid=%s", self._process.pid)
+
+    # ==========================
+    # SUPERVISOR
+    # ==========================
+
+    def _supervise(self):
+        backoff = 1.0
+        while not self._stop_flag:
+            self._drain(self.tick)
+
+            alive = self._process.is_alive()
+            silent = time.time() - self.last_heartbeat
+            if alive and silent < self.heartbeat_timeout:
+                # пауза перезапуска сбрасывается, когда процесс проработал дольше таймаута
+                if time.time() - self._spawned_at > self.heartbeat_timeout:
+                    backoff = 1.0
+                continue
+
+            if alive:
+                logger.error("Bot process unresponsive for %.0fs, killing", silent)
+                self._process.kill()
+            else:
+                logger.error("Bot process exited | code=%s", self._process.exitcode)
+            self._process.join()
+            self._fail_pending("bot process restarted")
+
+            self._wakeup.wait(backoff)
+            if self._stop_flag:
+                break
+            backoff = min(backoff * 2, self.max_backoff)
+
+            self._spawn()
+            self.restarts += 1
+
+    def _drain(self, timeout: float):
+        try:
+            event = self._events.get(timeout=timeout)
+        except queue.Empty:
+            return
+
+        while True:
+            if event[0] == "heartbeat":
+                _, self.last_heartbeat, self.last_stats = event
+            elif event[0] == "result":
+                _, request_id, ok, value = event
+                with self._lock:
+                    future = self._pending.pop(request_id, None)
+                if future is not None and not future.done():
+                    if ok:
+                        future.set_result(value)
+                    else:
+                        future.set_exception(RuntimeError(value))
+
+            try:
+                event = self._events.get_nowait()
+            except queue.Empty:
+                return
+
+    def _fail_pending(self, reason: str):
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        for future in pending.values():
+            if not future.done():
+                future.set_exception(ConnectionError(reason))
+
+    # ==========================
+    # IPC
+    # ==========================
+
+    def _send(self, method: str, *args, **kwargs) -> concurrent.futures.Future:
+        future = concurrent.futures.Future()
+        if self._process is None or self._stop_flag:
+            future.set_exception(ConnectionError("bot process is not running"))
+            return future
+
+        request_id = next(self._ids)
+        with self._lock:
+            self._pending[request_id] = future
+        try:
+            self._commands.put(("call", request_id, method, args, kwargs))
+        except ValueError:
+            # очередь закрыта — процесс как раз перезапускается
+            with self._lock:
+                self._pending.pop(request_id, None)
+            future.set_exception(ConnectionError("bot process is restarting"))
+        return future
+
+    async def call(self, method: str, *args, **kwargs):
+        future = self._send(method, *args, **kwargs)
+        try:
+            return await asyncio.wait_for(asyncio.wrap_future(future), self.call_timeout)
+        except asyncio.TimeoutError:
+            raise TimeoutError(f"bot process did not answer {method} in {self.call_timeout}s")
+
+    async def notify(self, message: str, symbol=None, side=None, priority: int = PRIORITY_BULK):
+        return await self.call("notify", message, symbol, side, priority)
+
+    async def create_position_and_notify(self, *args) -> int:
+        return await self.call("create_position_and_notify", *args)
+
+    async def notify_position_closed(self, *args):
+        return await self.call("notify_position_closed", *args)
+
+    def remove_position(self, position_id: int):
+        # хук без ответа — UI не ждёт
+        self._send("remove_position", position_id)
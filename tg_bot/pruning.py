@@ -0,0 +1,59 @@
+import asyncio
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+
+class UnreachableUsers:
+    """
+    Сбор недоступных пользователей во время рассылки.
+
+    Broadcaster вызывает add() на Forbidden / chat not found, flush()
+    отключает накопленных одним запросом (is_active = false, причина
+    и время). Следующие рассылки их уже не видят — каждый такой
+    получатель экономит токен rate limiter'а, т.е. 1/rate сек рассылки
+    """
+
+    def __init__(self, db, rate: float = 25):
+        self.db = db
+        self.rate = rate
+
+        self._pending: dict[int, str] = {}
+        self._lock = threading.Lock()
+
+    def add(self, chat_id: int, reason: str):
+        with self._lock:
+            self._pending[chat_id] = reason
+
+    def flush(self) -> int:
+        with self._lock:
+            batch, self._pending = self._pending, {}
+
+        if not batch:
+            return 0
+
+        try:
+            return self.db.deactivate_users(batch.items())
+        except Exception:
+            logger.exception("Failed to deactivate users | rows=%d", len(batch))
+            with self._lock:
+                for chat_id, reason in batch.items():
+                    self._pending.setdefault(chat_id, reason)
+            return 0
+
+    async def flush_async(self) -> int:
+        return await asyncio.to_thread(self.flush)
+
+    def stats(self) -> dict:
+        """
+        {pruned, by_reason, saved_per_broadcast} — saved_per_broadcast,
+        сек: столько каждая рассылка тратила бы на мёртвые чаты
+        """
+        by_reason = self.db.get_deactivation_stats()
+        pruned = sum(by_reason.values())
+        return {
+            "pruned": pruned,
+            "by_reason": by_reason,
+            "saved_per_broadcast": round(pruned / self.rate, 2) if self.rate else 0.0,
+        }
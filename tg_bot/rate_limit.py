@@ -0,0 +1,68 @@
+import asyncio
+import time
+
+
+class TokenBucket:
+    """
+    Асинхронный token bucket: rate токенов в секунду, запас до capacity.
+    pause() останавливает выдачу целиком (flood control от Telegram)
+    """
+
+    def __init__(self, rate: float, capacity: float | None = None):
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else max(rate, 1.0)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._lock = asyncio.Lock()
+
+    def _refill(self, now: float):
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def pause(self, seconds: float):
+        self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+
+    async def acquire(self):
+        # lock держится и на время ожидания — токены выдаются строго по очереди
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                if now < self._paused_until:
+                    await asyncio.sleep(self._paused_until - now)
+                    continue
+
+                self._refill(now)
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+
+class PerChatLimiter:
+    """Не чаще одного сообщения в interval секунд в один чат"""
+
+    def __init__(self, interval: float = 1.0):
+        self.interval = interval
+        self._next_allowed: dict[int, float] = {}
+        self._last_cleanup = time.monotonic()
+
+    async def acquire(self, chat_id: int):
+        now = time.monotonic()
+        ready_at = self._next_allowed.get(chat_id, 0.0)
+        self._next_allowed[chat_id] = max(now, ready_at) + self.interval
+
+        if ready_at > now:
+            await asyncio.sleep(ready_at - now)
+
+        if now - self._last_cleanup > 60:
+            self._cleanup(now)
+
+    def _cleanup(self, now: float):
+        self._last_cleanup = now
+        self._next_allowed = {
+            chat_id: ready_at
+            for chat_id, ready_at in self._next_allowed.items()
+            if ready_at > now
+        }
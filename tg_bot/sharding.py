@@ -0,0 +1,189 @@
+import asyncio
+import hashlib
+import logging
+import time
+
+from tg_bot.broadcast import Broadcaster
+from tg_bot.metrics import LatencyHistogram
+
+logger = logging.getLogger(__name__)
+
+
+def _weight(shard_key, chat_id: int) -> int:
+    digest = hashlib.blake2b(f"{shard_key}:{chat_id}".encode(), digest_size=8).digest()
+    return int.from_bytes(digest, "big")
+
+
+def shard_of(chat_id: int, shard_keys) -> int:
+    """
+    Номер шарда пользователя (rendezvous hashing по id ботов): зависит
+    от id пользователя и набора ботов, но не от их порядка и числа —
+    новый токен забирает ~1/N пользователей, остальные не переезжают
+    """
+    return max(range(len(shard_keys)), key=lambda i: _weight(shard_keys[i], chat_id))
+
+
+class _SecondaryShard(Broadcaster):
+    """
+    Broadcaster дополнительного бота. Бот шарда может писать только тем,
+    кто нажал у него Start, поэтому Forbidden от него не значит, что
+    пользователь недоступен: такие получатели на fallback_ttl сек уходят
+    через основной бот, а отключает их только ответ основного бота
+    """
+
+    def __init__(self, bot, primary: Broadcaster, fallback_ttl: float = 3600, **limits):
+        super().__init__(bot, on_unreachable=self._mark_fallback, **limits)
+        self.primary = primary
+        self.fallback_ttl = fallback_ttl
+        self._fallback: dict[int, float] = {}
+
+    def _mark_fallback(self, chat_id: int, reason: str):
+        self._fallback[chat_id] = time.monotonic()
+
+    def uses_fallback(self, chat_id: int) -> bool:
+        marked = self._fallback.get(chat_id)
+        if marked is None:
+            return False
+        if time.monotonic() - marked >= self.fallback_ttl:
+            # пора снова попробовать бот шарда — вдруг пользователь нажал Start
+            del self._fallback[chat_id]
+            return False
+        return True
+
+    async def send(self, chat_id: int, text: str, latency: LatencyHistogram | None = None, **kwargs) -> bool:
+        if not self.uses_fallback(chat_id):
+            if await super().send(chat_id, text, latency, **kwargs):
+                return True
+            if not self.uses_fallback(chat_id):
+                return False
+        return await self.primary.send(chat_id, text, latency, **kwargs)
+
+
+class ShardedBroadcaster:
+    """
+    Рассылка через пул ботов: глобальный лимит Telegram (~30 msg/s)
+    действует на токен, поэтому N токенов дают до N× пропускной способности.
+
+    Пользователь закреплён за шардом shard_of(chat_id, id ботов) —
+    при добавлении или удалении токена переезжает только ~1/N пользователей.
+    У каждого шарда свой Broadcaster: свой token bucket, свой flood control,
+    свой лимит на чат. broadcast() раскладывает пачки получателей по шардам
+    и рассылает параллельно, отчёты суммируются.
+
+    Бот может писать только тем, кто нажал у него Start, поэтому шард 0 —
+    основной бот, пользователи остальных шардов получают на /start ссылку
+    на бот своего шарда (link_for), а пока не нажали там Start — получают
+    сообщения от основного бота (_SecondaryShard). Интерфейс совпадает с Broadcaster:
+    send() идёт через шард получателя, call() — через основной бот
+    (им отправлены ответы на команды, их и правим)
+    """
+
+    def __init__(
+        self,
+        bots,
+        rate: float = 25,
+        concurrency: int = 20,
+        per_chat_interval: float = 1.0,
+        max_retries: int = 3,
+        on_unreachable=None,
+        fallback_ttl: float = 3600,
+    ):
+        if not bots:
+            raise ValueError("at least one bot is required")
+
+        limits = dict(
+            rate=rate,
+            concurrency=concurrency,
+            per_chat_interval=per_chat_interval,
+            max_retries=max_retries,
+        )
+        # отключает недоступных только основной бот — его пользователь точно запускал
+        primary = Broadcaster(bots[0], on_unreachable=on_unreachable, **limits)
+        self.shards = [primary] + [
+            _SecondaryShard(bot, primary, fallback_ttl=fallback_ttl, **limits)
+            for bot in bots[1:]
+        ]
+        self.shard_keys = [bot.id for bot in bots]
+        self.bot = bots[0]
+        # OutboxWorker запускает столько воркеров — хватает на все шарды
+        self.concurrency = concurrency * len(self.shards)
+        self._usernames: dict[int, str] = {}
+
+    def shard(self, chat_id: int) -> Broadcaster:
+        return self.shards[shard_of(chat_id, self.shard_keys)]
+
+    async def send(self, chat_id: int, text: str, latency: LatencyHistogram | None = None, **kwargs) -> bool:
+        return await self.shard(chat_id).send(chat_id, text, latency, **kwargs)
+
+    async def call(self, chat_id: int, request, latency: LatencyHistogram | None = None) -> bool:
+        return await self.shards[0].call(chat_id, request, latency)
+
+    async def link_for(self, chat_id: int) -> str | None:
+        """@username бота шарда, если это не основной бот"""
+        number = shard_of(chat_id, self.shard_keys)
+        if number == 0:
+            return None
+
+        if number not in self._usernames:
+            me = await self.shards[number].bot.get_me()
+            self._usernames[number] = me.username
+        return self._usernames[number]
+
+    async def broadcast(self, recipients, text: str, **kwargs) -> dict:
+        """
+        recipients — async-итератор пачек chat_id, как у Broadcaster.
+        Отчёт — суммарный {total, sent, failed, duration, throughput, latency}
+        плюс shards: отчёты по каждому токену
+        """
+        started = time.perf_counter()
+        latency = LatencyHistogram()
+        queues = [asyncio.Queue(maxsize=8) for _ in self.shards]
+
+        async def split():
+            try:
+                async for chat_ids in recipients:
+                    parts = [[] for _ in self.shards]
+                    for chat_id in chat_ids:
+                        parts[shard_of(chat_id, self.shard_keys)].append(chat_id)
+                    for queue, part in zip(queues, parts):
+                        if part:
+                            await queue.put(part)
+            finally:
+                for queue in queues:
+                    await queue.put(None)
+
+        async def shard_recipients(queue):
+            while True:
+                chat_ids = await queue.get()
+                if chat_ids is None:
+                    return
+                yield chat_ids
+
+        results = await asyncio.gather(
+            split(),
+            *(
+                shard.broadcast(shard_recipients(queue), text, latency, **kwargs)
+                for shard, queue in zip(self.shards, queues)
+            )
+        )
+        shard_reports = results[1:]
+
+        duration = time.perf_counter() - started
+        report = {
+            key: sum(shard_report[key] for shard_report in shard_reports)
+            for key in ("total", "sent", "failed")
+        }
+        report.update(
+            duration=round(duration, 3),
+            throughput=round(report["sent"] / duration, 2) if duration else 0.0,
+            latency=latency.as_dict(),
+            shards=[
+                {key: shard_report[key] for key in ("total", "sent", "failed", "throughput")}
+                for shard_report in shard_reports
+            ],
+        )
+        logger.info(
+            "Sharded broadcast done | shards=%d total=%s sent=%s %.1fs (%.1f msg/s)",
+            len(self.shards), report["total"], report["sent"], duration, report["throughput"]
+        )
+        return report
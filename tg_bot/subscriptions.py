@@ -0,0 +1,94 @@
+import threading
+
+# символ или сторона "любые"
+ANY = "*"
+SIDES = ("long", "short")
+
+
+class SubscriptionIndex:
+    """
+    Инвертированный индекс подписок в памяти: (symbol, side) -> chat_id.
+
+    Пользователь без подписок получает все уведомления (как раньше),
+    с подписками — только совпавшие по символу и стороне. ANY в symbol
+    или side означает «любой». Индекс — кэш таблицы user_subscriptions:
+    грузится при старте и обновляется вместе с ней
+    """
+
+    def __init__(self):
+        self._by_key: dict[tuple[str, str], set[int]] = {}
+        self._by_user: dict[int, set[tuple[str, str]]] = {}
+        self._lock = threading.Lock()
+
+    def load(self, rows):
+        with self._lock:
+            self._by_key.clear()
+            self._by_user.clear()
+            for user_id, symbol, side in rows:
+                self._add(user_id, symbol, side)
+
+    def add(self, user_id: int, symbol: str, side: str):
+        with self._lock:
+            self._add(user_id, symbol, side)
+
+    def remove(self, user_id: int, symbol: str | None = None, side: str | None = None):
+        with self._lock:
+            for key in list(self._by_user.get(user_id, ())):
+                if symbol is not None and key[0] != symbol:
+                    continue
+                if side is not None and key[1] != side:
+                    continue
+
+                self._by_user[user_id].discard(key)
+                chats = self._by_key.get(key)
+                if chats is not None:
+                    chats.discard(user_id)
+                    if not chats:
+                        del self._by_key[key]
+
+            if not self._by_user.get(user_id):
+                self._by_user.pop(user_id, None)
+
+    def _add(self, user_id, symbol, side):
+        key = (symbol, side)
+        self._by_key.setdefault(key, set()).add(user_id)
+        self._by_user.setdefault(user_id, set()).add(key)
+
+    def subscriptions(self, user_id: int) -> list[tuple[str, str]]:
+        with self._lock:
+            return sorted(self._by_user.get(user_id, ()))
+
+    def match(self, symbol: str | None, side: str | None = None) -> set[int]:
+        """Подписчики события: до четырёх обращений к словарю, без перебора пользователей"""
+        sides = (side, ANY) if side else (ANY,)
+        symbols = (symbol, ANY) if symbol else (ANY,)
+
+        with self._lock:
+            matched = set()
+            for key_symbol in symbols:
+                for key_side in sides:
+                    matched |= self._by_key.get((key_symbol, key_side), set())
+            return matched
+
+    def subscribers(self) -> set[int]:
+        """Пользователи, у которых есть хотя бы одна подписка"""
+        with self._lock:
+            return set(self._by_user)
+
+    def allows(self, user_id: int, matched: set[int]) -> bool:
+        """Получит ли пользователь событие с данным результатом match()"""
+        return user_id in matched or user_id not in self._by_user
+
+    @staticmethod
+    def parse(args: list[str]) -> tuple[str, str]:
+        """
+        Аргументы /subscribe: "BTCUSDT", "BTCUSDT long", "short" -> (symbol, side)
+        """
+        symbol, side = ANY, ANY
+        for arg in args:
+            value = arg.strip()
+            if value.lower() in SIDES:
+                side = value.lower()
+            elif value and value != ANY:
+                symbol = value.upper()
+        return symbol, side
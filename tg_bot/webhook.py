@@ -0,0 +1,127 @@
+import asyncio
+import hmac
+import logging
+import secrets
+
+from aiohttp import web
+from aiogram.types import Update
+
+logger = logging.getLogger(__name__)
+
+SECRET_HEADER = "X-Telegram-Bot-Api-Secret-Token"
+
+
+class WebhookServer:
+    """
+    Приём апдейтов через webhook на встроенном aiohttp-сервере.
+
+    Telegram получает 200 сразу после разбора апдейта, обработка идёт
+    в фоне: не больше max_concurrency хендлеров одновременно и не больше
+    max_pending апдейтов в работе — сверх этого отвечаем 503, и Telegram
+    повторит доставку позже. stop() перестаёт принимать новые апдейты
+    и ждёт уже принятые до drain_timeout сек.
+
+    Секрет проверяется всегда: без него любой, кто достучится до порта,
+    прислал бы апдейт от имени админа. Не задан — генерируется случайный
+    и передаётся Telegram в set_webhook
+    """
+
+    def __init__(
+        self,
+        bot,
+        dispatcher,
+        path: str = "/telegram/webhook",
+        secret_token: str | None = None,
+        host: str = "0.0.0.0",
+        port: int = 8080,
+        max_concurrency: int = 50,
+        max_pending: int = 1000,
+        drain_timeout: float = 30,
+    ):
+        self.bot = bot
+        self.dp = dispatcher
+        self.path = path
+        self._generated_secret = not secret_token
+        if self._generated_secret:
+            secret_token = secrets.token_urlsafe(32)
+            logger.warning("webhook_secret is not set, using a random secret for this run")
+        self.secret_token = secret_token
+        self.host = host
+        self.port = port
+        self.max_pending = max_pending
+        self.drain_timeout = drain_timeout
+
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._tasks: set[asyncio.Task] = set()
+        self._accepting = True
+        self._runner: web.AppRunner | None = None
+
+    def build_app(self) -> web.Application:
+        app = web.Application()
+        app.router.add_post(self.path, self._handle)
+        return app
+
+    async def start(self, public_url: str | None = None):
+        if self._generated_secret and not public_url:
+            # webhook зарегистрирован снаружи — случайный секрет Telegram не узнает
+            raise RuntimeError("webhook_secret is required when webhook_url is not set")
+
+        self._accepting = True
+        self._runner = web.AppRunner(self.build_app())
+        await self._runner.setup()
+        await web.TCPSite(self._runner, self.host, self.port).start()
+        logger.info("🌐 Webhook server listening on %s:%s%s", self.host, self.port, self.path)
+
+        if public_url:
+            await self.bot.set_webhook(
+                public_url.rstrip("/") + self.path,
+                secret_token=self.secret_token,
+                allowed_updates=self.dp.resolve_used_update_types(),
+            )
+            logger.info("Webhook registered | %s", public_url)
+
+    async def stop(self):
+        self._accepting = False
+
+        if self._tasks:
+            logger.info("Draining webhook handlers | pending=%d", len(self._tasks))
+            _, pending = await asyncio.wait(set(self._tasks), timeout=self.drain_timeout)
+            for task in pending:
+                task.cancel()
+            if pending:
+                logger.warning("Webhook drain timed out | cancelled=%d", len(pending))
+
+        if self._runner:
+            await self._runner.cleanup()
+            self._runner = None
+
+    @property
+    def pending(self) -> int:
+        return len(self._tasks)
+
+    async def _handle(self, request: web.Request) -> web.Response:
+        if not hmac.compare_digest(
+            request.headers.get(SECRET_HEADER, ""), self.secret_token
+        ):
+            return web.Response(status=401)
+
+        if not self._accepting or len(self._tasks) >= self.max_pending:
+            return web.Response(status=503, headers={"Retry-After": "1"})
+
+        try:
+            update = Update.model_validate(await request.json(), context={"bot": self.bot})
+        except Exception:
+            logger.warning("Malformed webhook update", exc_info=True)
+            return web.Response(status=400)
+
+        task = asyncio.create_task(self._process(update))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return web.Response()
+
+    async def _process(self, update: Update):
+        async with self._semaphore:
+            try:
+                await self.dp.feed_update(self.bot, update)
+            except Exception:
+                logger.exception("Update handling failed | id=%s", update.update_id)
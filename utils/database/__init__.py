@@ -0,0 +1,19 @@
+def create_database(backend: str | None = None):
+    """
+    Создаёт хранилище, выбранное настройкой db_backend:
+    postgres (DATABASE_URL) или sqlite (локальный файл db_path)
+    """
+    # конфиг читаем лениво — к этому моменту .env уже загружен
+    from settings import config
+
+    backend = (backend or config.DB_BACKEND or "postgres").strip().lower()
+
+    if backend == "sqlite":
+        from utils.database.trading_db_sqlite import TradingDBSQLite
+        return TradingDBSQLite(config.DB_PATH or config.get_default_db_path())
+
+    if backend in ("postgres", "postgresql"):
+        from utils.database.trading_db_postgres import TradingDBPostgres
+        return TradingDBPostgres()
+
+    raise ValueError(f"Unknown db_backend: {backend}")
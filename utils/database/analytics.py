@@ -0,0 +1,112 @@
+"""
+Статистика торговли поверх агрегатов position_stats_*.
+
+Агрегаты обновляются в момент закрытия позиции (close_position),
+поэтому запросы читают десятки строк вместо всей истории
+"""
+
+from dataclasses import dataclass
+from datetime import date, timedelta
+
+
+@dataclass
+class TradeStats:
+    trades: int = 0
+    wins: int = 0
+    pnl_sum: float = 0.0
+
+    @property
+    def losses(self) -> int:
+        return self.trades - self.wins
+
+    @property
+    def win_rate(self) -> float:
+        return self.wins / self.trades * 100 if self.trades else 0.0
+
+    @property
+    def avg_pnl(self) -> float:
+        return self.pnl_sum / self.trades if self.trades else 0.0
+
+    def add(self, row):
+        self.trades += int(row["trades"])
+        self.wins += int(row["wins"])
+        self.pnl_sum += float(row["pnl_sum"])
+
+
+class TradingAnalytics:
+    def __init__(self, db):
+        self.db = db
+
+    def get_summary(self, totals=None) -> TradeStats:
+        total = TradeStats()
+        for row in self._totals(totals):
+            total.add(row)
+        return total
+
+    def get_side_stats(self, totals=None) -> dict[str, TradeStats]:
+        return self._group(self._totals(totals), "side")
+
+    def get_symbol_stats(self, limit: int | None = None, totals=None) -> list[tuple[str, TradeStats]]:
+        """Символы, отсортированные по суммарному PnL"""
+        stats = sorted(
+            self._group(self._totals(totals), "symbol").items(),
+            key=lambda item: item[1].pnl_sum,
+            reverse=True
+        )
+        return stats[:limit] if limit else stats
+
+    def get_daily_stats(self, days: int = 7) -> list[tuple[str, TradeStats]]:
+        since = date.today() - timedelta(days=days - 1)
+        daily = self._group(self.db.get_stats_daily(since), "day")
+        return sorted(
+            ((str(day), stats) for day, stats in daily.items()),
+            reverse=True
+        )
+
+    def format_summary(self, top: int = 5, html: bool = True) -> str:
+        """Текст для бота (/stats, html) и панелей UI (html=False)"""
+        bold = (lambda text: f"<b>{text}</b>") if html else (lambda text: text)
+
+        totals = list(self.db.get_stats_totals())
+        summary = self.get_summary(totals)
+        if not summary.trades:
+            return "📭 Закрытых сделок пока нет"
+
+        lines = [
+            f"📊 {bold('Trading stats')}\n",
+            f"Trades: {summary.trades} (✅ {summary.wins} / ❌ {summary.losses})",
+            f"Win rate: {summary.win_rate:.1f}%",
+            f"Avg PnL: {summary.avg_pnl:.2f}%",
+            f"Total PnL: {summary.pnl_sum:.2f}%",
+        ]
+
+        sides = self.get_side_stats(totals)
+        if sides:
+            lines.append("")
+            for side, stats in sorted(sides.items()):
+                lines.append(
+                    f"{side.upper()}: {stats.trades} trades | "
+                    f"win {stats.win_rate:.1f}% | avg {stats.avg_pnl:.2f}%"
+                )
+
+        symbols = self.get_symbol_stats(limit=top, totals=totals)
+        if symbols:
+            lines.append(f"\n{bold('Top symbols')}")
+            for symbol, stats in symbols:
+                lines.append(
+                    f"{symbol}: {stats.pnl_sum:+.2f}% | "
+                    f"{stats.trades} trades | win {stats.win_rate:.1f}%"
+                )
+
+        return "\n".join(lines)
+
+    def _totals(self, totals):
+        """totals — уже прочитанные строки get_stats_totals(), чтобы не читать их повторно"""
+        return self.db.get_stats_totals() if totals is None else totals
+
+    @staticmethod
+    def _group(rows, key) -> dict:
+        grouped: dict = {}
+        for row in rows:
+            grouped.setdefault(row[key], TradeStats()).add(row)
+        return grouped
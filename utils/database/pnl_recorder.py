@@ -0,0 +1,137 @@
+import atexit
+import logging
+import threading
+import time
+from datetime import datetime, timedelta
+
+logger = logging.getLogger(__name__)
+
+
+class PnlRecorder:
+    """
+    Фоновая запись временного ряда PnL позиций в position_pnl.
+
+    record() вызывается на каждом тике цены и только кладёт сэмпл в буфер.
+    Прореживание при записи: не чаще sample_interval сек на позицию,
+    а неизменный PnL — не чаще heartbeat_interval. Буфер пишется пачкой
+    (COPY) каждые flush_interval сек или при max_rows сэмплах.
+
+    Обслуживание раз в maintenance_interval: сэмплы старше downsample_after
+    сжимаются до одного на downsample_bucket сек, старше retention — удаляются
+    """
+
+    def __init__(
+        self,
+        db,
+        sample_interval: float = 10,
+        heartbeat_interval: float = 60,
+        min_change: float = 0.01,
+        flush_interval: float = 5,
+        max_rows: int = 5000,
+        retention: timedelta = timedelta(days=30),
+        downsample_after: timedelta = timedelta(days=1),
+        downsample_bucket: int = 300,
+        maintenance_interval: float = 3600,
+    ):
+        self.db = db
+        self.sample_interval = sample_interval
+        self.heartbeat_interval = heartbeat_interval
+        self.min_change = min_change
+        self.flush_interval = flush_interval
+        self.max_rows = max_rows
+        self.retention = retention
+        self.downsample_after = downsample_after
+        self.downsample_bucket = downsample_bucket
+        self.maintenance_interval = maintenance_interval
+
+        self._samples: list[tuple] = []
+        self._last: dict[int, tuple[float, float]] = {}
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stop_flag = False
+        self._thread: threading.Thread | None = None
+        self._last_maintenance = 0.0
+        self._downsampled_until: datetime | None = None
+
+    def start(self):
+        if self._thread and self._thread.is_alive():
+            return self._thread
+
+        self._stop_flag = False
+        self._thread = threading.Thread(
+            target=self._run, daemon=True, name="pnl_recorder"
+        )
+        self._thread.start()
+        atexit.register(self.stop)
+        return self._thread
+
+    def record(self, position_id: int, price: float, pnl: float):
+        now = time.monotonic()
+
+        with self._lock:
+            last = self._last.get(position_id)
+            if last is not None:
+                elapsed = now - last[0]
+                changed = abs(pnl - last[1]) >= self.min_change
+                if elapsed < self.sample_interval:
+                    return
+                if not changed and elapsed < self.heartbeat_interval:
+                    return
+
+            self._last[position_id] = (now, pnl)
+            self._samples.append((position_id, datetime.now(), price, pnl))
+            full = len(self._samples) >= self.max_rows
+
+        if full:
+            self._wakeup.set()
+
+    def forget(self, position_id: int):
+        """Позиция закрыта — больше не ждём по ней сэмплов"""
+        with self._lock:
+            self._last.pop(position_id, None)
+
+    def flush(self) -> int:
+        with self._lock:
+            batch, self._samples = self._samples, []
+
+        if not batch:
+            return 0
+
+        try:
+            return self.db.write_pnl_samples(batch)
+        except Exception:
+            logger.exception("PnL flush failed | rows=%d", len(batch))
+            with self._lock:
+                # при долгом простое БД не растём бесконечно
+                self._samples = (batch + self._samples)[-self.max_rows * 10:]
+            return 0
+
+    def run_maintenance(self):
+        now = datetime.now()
+        until = now - self.downsample_after
+        since = self._downsampled_until or now - self.retention
+
+        try:
+            self.db.downsample_pnl_samples(since, until, self.downsample_bucket)
+            # последнее окно может быть неполным — захватываем его в следующий раз
+            self._downsampled_until = until - timedelta(seconds=self.downsample_bucket)
+            self.db.prune_pnl_samples(now - self.retention)
+        except Exception:
+            logger.exception("PnL maintenance failed")
+
+    def stop(self):
+        self._stop_flag = True
+        self._wakeup.set()
+        if self._thread and self._thread is not threading.current_thread():
+            self._thread.join(timeout=5)
+        self.flush()
+
+    def _run(self):
+        while not self._stop_flag:
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            self.flush()
+
+            if time.monotonic() - self._last_maintenance >= self.maintenance_interval:
+                self._last_maintenance = time.monotonic()
+                self.run_maintenance()
@@ -0,0 +1,79 @@
+"""
+Общие описания таблиц и лёгкие типы строк для постраничных запросов
+"""
+
+from collections import namedtuple
+from functools import lru_cache
+
+POSITION_COLUMNS = (
+    "id",
+    "name",
+    "percent",
+    "cross_margin",
+    "entry_price",
+    "take_profit",
+    "stop_loss",
+    "pos_type",
+    "is_active",
+    "close_reason",
+    "closed_at",
+    "final_pnl",
+    "created_at",
+)
+
+USER_COLUMNS = (
+    "user_id",
+    "username",
+    "first_name",
+    "last_name",
+    "is_active",
+    "created_at",
+)
+
+# Экспорт/импорт переносит и состояние отписки — иначе после импорта
+# отключённые пользователи снова получат рассылки
+USER_TRANSFER_COLUMNS = USER_COLUMNS + (
+    "deactivated_at",
+    "deactivation_reason",
+)
+
+# Таблицы для экспорта/импорта: первичный ключ и допустимые колонки
+TRANSFER_TABLES = {
+    "positions": ("id", POSITION_COLUMNS),
+    "bot_users": ("user_id", USER_TRANSFER_COLUMNS),
+}
+
+# Колонки keyset-курсора: (created_at, id) по убыванию
+POSITION_KEY = ("created_at", "id")
+USER_KEY = ("created_at", "user_id")
+
+DEFAULT_PAGE_SIZE = 500
+
+
+def projection(columns, allowed, key) -> tuple:
+    """
+    Проверяет запрошенные колонки по белому списку и добавляет колонки
+    курсора, чтобы по последней строке можно было запросить следующую страницу
+    """
+    if columns is None:
+        columns = allowed
+
+    unknown = [c for c in columns if c not in allowed]
+    if unknown:
+        raise ValueError(f"Unknown columns: {', '.join(unknown)}")
+
+    return tuple(columns) + tuple(k for k in key if k not in columns)
+
+
+@lru_cache(maxsize=64)
+def row_type(name: str, columns: tuple):
+    """namedtuple под конкретную проекцию — без dict на каждую строку"""
+    return namedtuple(name, columns)
+
+
+def page_cursor(rows, key=POSITION_KEY):
+    """Курсор (created_at, id) для следующей страницы или None"""
+    if not rows:
+        return None
+    last = rows[-1]
+    return tuple(getattr(last, k) for k in key)
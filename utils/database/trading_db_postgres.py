@@ -1,18 +1,177 @@
+import io
 import os
+import csv
+import time
+import uuid
 import logging
+import threading
+from contextlib import contextmanager
+
 import psycopg2
 from psycopg2.pool import SimpleConnectionPool
-from psycopg2.extras import RealDictCursor
+from psycopg2.extras import RealDictCursor, execute_values
+from psycopg2.extensions import cursor as TupleCursor
+
+from utils.database.rows import (
+    POSITION_COLUMNS,
+    USER_COLUMNS,
+    POSITION_KEY,
+    USER_KEY,
+    DEFAULT_PAGE_SIZE,
+    TRANSFER_TABLES,
+    projection,
+    row_type,
+    page_cursor,
+)
+
 # ==========================
 # LOGGER
 # ==========================
 logger = logging.getLogger(__name__)
 
+SCHEMA = """
+ALTER TABLE positions
+    ADD COLUMN IF NOT EXISTS close_reason TEXT,
+    ADD COLUMN IF NOT EXISTS closed_at TIMESTAMP,
+    ADD COLUMN IF NOT EXISTS final_pnl NUMERIC;
+
+ALTER TABLE bot_users
+    ADD COLUMN IF NOT EXISTS deactivated_at TIMESTAMP,
+    ADD COLUMN IF NOT EXISTS deactivation_reason TEXT;
+
+CREATE INDEX IF NOT EXISTS idx_positions_created_id
+    ON positions (created_at DESC, id DESC);
+
+CREATE INDEX IF NOT EXISTS idx_bot_users_active_created
+    ON bot_users (created_at DESC, user_id DESC)
+    WHERE is_active = true;
+
+CREATE TABLE IF NOT EXISTS position_stats_daily (
+    day DATE NOT NULL,
+    symbol TEXT NOT NULL,
+    side TEXT NOT NULL,
+    trades INTEGER NOT NULL DEFAULT 0,
+    wins INTEGER NOT NULL DEFAULT 0,
+    pnl_sum NUMERIC NOT NULL DEFAULT 0,
+    PRIMARY KEY (day, symbol, side)
+);
+
+CREATE TABLE IF NOT EXISTS position_stats_total (
+    symbol TEXT NOT NULL,
+    side TEXT NOT NULL,
+    trades INTEGER NOT NULL DEFAULT 0,
+    wins INTEGER NOT NULL DEFAULT 0,
+    pnl_sum NUMERIC NOT NULL DEFAULT 0,
+    PRIMARY KEY (symbol, side)
+);
+
+CREATE TABLE IF NOT EXISTS position_pnl (
+    position_id INTEGER NOT NULL,
+    ts TIMESTAMP NOT NULL,
+    price NUMERIC NOT NULL,
+    pnl NUMERIC NOT NULL
+);
+
+CREATE INDEX IF NOT EXISTS idx_position_pnl_position_ts
+    ON position_pnl (position_id, ts);
+
+CREATE INDEX IF NOT EXISTS idx_position_pnl_ts
+    ON position_pnl (ts);
+
+CREATE TABLE IF NOT EXISTS broadcast_jobs (
+    id BIGSERIAL PRIMARY KEY,
+    message TEXT NOT NULL,
+    status TEXT NOT NULL DEFAULT 'pending',
+    total INTEGER NOT NULL DEFAULT 0,
+    created_at TIMESTAMP NOT NULL DEFAULT now(),
+    finished_at TIMESTAMP
+);
+
+CREATE TABLE IF NOT EXISTS broadcast_deliveries (
+    job_id BIGINT NOT NULL REFERENCES broadcast_jobs (id) ON DELETE CASCADE,
+    user_id BIGINT NOT NULL,
+    status TEXT NOT NULL DEFAULT 'pending',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    error TEXT,
+    claimed_at TIMESTAMP,
+    updated_at TIMESTAMP,
+    PRIMARY KEY (job_id, user_id)
+);
+
+CREATE TABLE IF NOT EXISTS user_subscriptions (
+    user_id BIGINT NOT NULL,
+    symbol TEXT NOT NULL,
+    side TEXT NOT NULL,
+    created_at TIMESTAMP NOT NULL DEFAULT now(),
+    PRIMARY KEY (user_id, symbol, side)
+);
+
+ALTER TABLE broadcast_jobs
+    ADD COLUMN IF NOT EXISTS priority SMALLINT NOT NULL DEFAULT 3;
+
+ALTER TABLE broadcast_deliveries
+    ADD COLUMN IF NOT EXISTS priority SMALLINT NOT NULL DEFAULT 3;
+
+CREATE TABLE IF NOT EXISTS live_cards (
+    chat_id BIGINT NOT NULL,
+    position_id INTEGER NOT NULL,
+    message_id BIGINT NOT NULL,
+    PRIMARY KEY (chat_id, position_id)
+);
+
+CREATE TABLE IF NOT EXISTS price_alerts (
+    id BIGSERIAL PRIMARY KEY,
+    user_id BIGINT NOT NULL,
+    symbol TEXT NOT NULL,
+    price DOUBLE PRECISION NOT NULL,
+    direction TEXT NOT NULL,
+    created_at TIMESTAMP NOT NULL DEFAULT now()
+);
+
+CREATE INDEX IF NOT EXISTS idx_price_alerts_user
+    ON price_alerts (user_id);
+
+DROP INDEX IF EXISTS idx_broadcast_deliveries_open;
+
+CREATE INDEX IF NOT EXISTS idx_broadcast_deliveries_queue
+    ON broadcast_deliveries (priority, job_id, user_id)
+    WHERE status IN ('pending', 'sending');
+"""
+
+UPDATABLE_POSITION_COLUMNS = set(POSITION_COLUMNS) - {"id", "created_at"}
+
+# Как часто перепроверять отставание реплики, сек
+REPLICA_CHECK_INTERVAL = 1.0
+
+REPLICA_STATUS_QUERY = """
+    SELECT
+        CASE
+            WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+            ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0)
+        END,
+        pg_last_wal_replay_lsn()::text
+"""
+
+
+def _parse_lsn(lsn: str | None) -> int:
+    if not lsn:
+        return 0
+    high, low = lsn.split("/")
+    return (int(high, 16) << 32) + int(low, 16)
+
 
 class TradingDBPostgres:
     _pool: SimpleConnectionPool | None = None
+    _replica_pool: SimpleConnectionPool | None = None
 
-    def __init__(self):
+    # LSN последней записи и состояние реплики общие для всех экземпляров,
+    # как и пулы
+    _last_write_lsn: int = 0
+    _replica_state: tuple[float, float, int] | None = None
+    _replica_lock = threading.Lock()
+    _borrowed: dict[int, SimpleConnectionPool] = {}
+
+    def __init__(self, replica_dsn: str | None = None, max_replica_lag: float | None = None):
         if self.__class__._pool is None:
             logger.info("Initializing PostgreSQL connection pool")
 
@@ -22,28 +181,141 @@ class TradingDBPostgres:
                 dsn=os.getenv("DATABASE_URL"),
                 cursor_factory=RealDictCursor
             )
+            self._ensure_schema()
+
+        replica_dsn = replica_dsn or os.getenv("DATABASE_REPLICA_URL")
+        if replica_dsn and self.__class__._replica_pool is None:
+            logger.info("Initializing PostgreSQL replica pool")
+
+            self.__class__._replica_pool = SimpleConnectionPool(
+                minconn=1,
+                maxconn=5,
+                dsn=replica_dsn,
+                cursor_factory=RealDictCursor
+            )
+
+        self.max_replica_lag = float(
+            max_replica_lag
+            if max_replica_lag is not None
+            else os.getenv("DATABASE_REPLICA_MAX_LAG", 5)
+        )
 
 
     # ==========================
     # CONNECTION
     # ==========================
 
-    def _get_conn(self):
+    def _get_conn(self, readonly=False):
         if self._pool is None:
             raise RuntimeError("PostgreSQL pool is not initialized")
 
-        return self._pool.getconn()
+        pool = self._pool
+        if readonly and self._replica_pool is not None and self._replica_usable():
+            pool = self._replica_pool
+
+        conn = pool.getconn()
+        self._borrowed[id(conn)] = pool
+        return conn
 
     def _put_conn(self, conn):
-        if self._pool and conn:
-            self._pool.putconn(conn)
+        if not conn:
+            return
+
+        pool = self._borrowed.pop(id(conn), self._pool)
+        if pool is self._replica_pool:
+            # не держим снимок на реплике — иначе конфликты с репликацией
+            conn.rollback()
+        if pool:
+            pool.putconn(conn)
+
+    @contextmanager
+    def _connection(self, readonly=False, wrote=False):
+        """
+        wrote=True — блок закоммитил запись: после него запоминаем LSN,
+        чтобы следующие чтения этого процесса видели её (read-your-writes)
+        """
+        conn = self._get_conn(readonly)
+        try:
+            yield conn
+            if wrote and self._replica_pool is not None:
+                self._remember_write(conn)
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            self._put_conn(conn)
+
+    # ==========================
+    # REPLICA ROUTING
+    # ==========================
+
+    def _remember_write(self, conn):
+        """Запоминает LSN после коммита, чтобы читать свои записи"""
+        with conn.cursor(cursor_factory=TupleCursor) as cur:
+            cur.execute("SELECT pg_current_wal_lsn()::text")
+            lsn = _parse_lsn(cur.fetchone()[0])
+        conn.rollback()
+
+        with self._replica_lock:
+            if lsn > TradingDBPostgres._last_write_lsn:
+                TradingDBPostgres._last_write_lsn = lsn
+
+    def _replica_usable(self) -> bool:
+        """
+        Реплика подходит для чтения, если её отставание не больше
+        max_replica_lag и она уже проиграла последнюю запись этого процесса
+        (read-your-writes для того, кто только что писал)
+        """
+        required_lsn = TradingDBPostgres._last_write_lsn
+        state = TradingDBPostgres._replica_state
+
+        if (
+            state is None
+            or time.monotonic() - state[0] > REPLICA_CHECK_INTERVAL
+            or state[2] < required_lsn
+        ):
+            state = self._probe_replica()
+
+        return state[1] <= self.max_replica_lag and state[2] >= required_lsn
+
+    def _probe_replica(self) -> tuple[float, float, int]:
+        lag, replay_lsn = float("inf"), 0
+        conn = None
+        try:
+            conn = self._replica_pool.getconn()
+            with conn.cursor(cursor_factory=TupleCursor) as cur:
+                cur.execute(REPLICA_STATUS_QUERY)
+                lag, replay = cur.fetchone()
+            if replay is None:
+                logger.warning("Replica DSN points to a server that is not in recovery")
+            else:
+                lag, replay_lsn = float(lag), _parse_lsn(replay)
+        except Exception:
+            logger.exception("Replica status check failed, reading from primary")
+        finally:
+            if conn:
+                conn.rollback()
+                self._replica_pool.putconn(conn)
+
+        state = (time.monotonic(), lag, replay_lsn)
+        TradingDBPostgres._replica_state = state
+        return state
+
+    def _ensure_schema(self):
+        try:
+            with self._connection() as conn:
+                with conn.cursor() as cur:
+                    cur.execute(SCHEMA)
+                conn.commit()
+        except Exception:
+            logger.exception("Failed to apply PostgreSQL schema")
 
     # ==========================
     # POSITIONS
     # ==========================
 
     def get_all_positions(self, active_only=True):
-        conn = self._get_conn()
+        conn = self._get_conn(readonly=True)
         try:
             with conn.cursor() as cur:
                 cur.execute("""
@@ -65,6 +337,33 @@ class TradingDBPostgres:
         finally:
             self._put_conn(conn)
 
+    def get_positions_page(
+        self,
+        columns=None,
+        active_only=True,
+        after=None,
+        limit=DEFAULT_PAGE_SIZE
+    ):
+        """
+        Страница позиций по keyset-курсору (created_at, id) DESC.
+        Возвращает namedtuple-строки только с запрошенными колонками
+        """
+        return self._fetch_page(
+            "positions",
+            projection(columns, POSITION_COLUMNS, POSITION_KEY),
+            POSITION_KEY,
+            "is_active = true" if active_only else None,
+            after,
+            limit,
+            "PositionRow"
+        )
+
+    def iter_positions(self, columns=None, active_only=True, page_size=DEFAULT_PAGE_SIZE):
+        yield from self._iter_pages(
+            self.get_positions_page, POSITION_KEY, page_size,
+            columns=columns, active_only=active_only
+        )
+
     def add_to_db(
         self,
         name,
@@ -81,7 +380,7 @@ class TradingDBPostgres:
         )
 
         try:
-            with self._get_conn() as conn:
+            with self._connection(wrote=True) as conn:
                 with conn.cursor() as cur:
                     cur.execute("""
                         INSERT INTO positions (
@@ -120,12 +419,16 @@ class TradingDBPostgres:
         logger.info("Deleting position | id=%s", position_id)
 
         try:
-            with self._get_conn() as conn:
+            with self._connection(wrote=True) as conn:
                 with conn.cursor() as cur:
                     cur.execute(
                         "DELETE FROM positions WHERE id = %s",
                         (position_id,)
                     )
+                    cur.execute(
+                        "DELETE FROM position_pnl WHERE position_id = %s",
+                        (position_id,)
+                    )
 
                 conn.commit()
 
@@ -136,6 +439,78 @@ class TradingDBPostgres:
             logger.exception("Failed to delete position | id=%s", position_id)
             return False
 
+    def update_position(self, position_id: int, **fields) -> bool:
+        """
+        Обновляет поля позиции. is_active=False закрывает позицию
+        через close_position, чтобы обновить агрегаты статистики
+        """
+        if fields.get("is_active") is False:
+            fields.pop("is_active")
+            return self.close_position(position_id, **fields)
+
+        unknown = set(fields) - UPDATABLE_POSITION_COLUMNS
+        if unknown:
+            raise ValueError(f"Unknown position fields: {', '.join(sorted(unknown))}")
+        if not fields:
+            return False
+
+        assignments = ", ".join(f"{column} = %s" for column in fields)
+        try:
+            with self._connection(wrote=True) as conn:
+                with conn.cursor() as cur:
+                    cur.execute(
+                        f"UPDATE positions SET {assignments} WHERE id = %s",
+                        (*fields.values(), position_id)
+                    )
+                    updated = cur.rowcount > 0
+                conn.commit()
+            return updated
+        except Exception:
+            logger.exception("Failed to update position | id=%s", position_id)
+            return False
+
+    def close_position(
+        self,
+        position_id: int,
+        close_reason: str | None = None,
+        final_pnl: float | None = None,
+        closed_at=None
+    ) -> bool:
+        """
+        Закрывает активную позицию и в той же транзакции добавляет сделку
+        в агрегаты position_stats_*. Повторное закрытие ничего не меняет
+        """
+        logger.info(
+            "Closing position | id=%s reason=%s pnl=%s",
+            position_id, close_reason, final_pnl
+        )
+
+        try:
+            with self._connection(wrote=True) as conn:
+                with conn.cursor() as cur:
+                    cur.execute("""
+                        UPDATE positions
+                        SET
+                            is_active = false,
+                            close_reason = %s,
+                            final_pnl = %s,
+                            closed_at = COALESCE(%s::timestamp, now())
+                        WHERE id = %s AND is_active = true
+                        RETURNING name, pos_type, closed_at, final_pnl
+                    """, (close_reason, final_pnl, closed_at, position_id))
+
+                    closed = cur.fetchone()
+                    if closed:
+                        self._record_closed_trade(cur, closed)
+
+                conn.commit()
+
+            return closed is not None
+
+        except Exception:
+            logger.exception("Failed to close position | id=%s", position_id)
+            return False
+
     # ==========================
     # BOT USERS
     # ==========================
@@ -143,7 +518,7 @@ class TradingDBPostgres:
         logger.debug("Upserting user | id=%s username=%s", user_id, username)
 
         try:
-            with self._get_conn() as conn:
+            with self._connection(wrote=True) as conn:
                 with conn.cursor() as cur:
                     cur.execute("""
                         INSERT INTO bot_users (
@@ -159,7 +534,9 @@ class TradingDBPostgres:
                             username = EXCLUDED.username,
                             first_name = EXCLUDED.first_name,
                             last_name = EXCLUDED.last_name,
-                            is_active = true
+                            is_active = true,
+                            deactivated_at = NULL,
+                            deactivation_reason = NULL
                     """, (
                         user_id,
                         username,
@@ -174,9 +551,45 @@ class TradingDBPostgres:
         except Exception:
             logger.exception("Failed to add/update user | id=%s", user_id)
 
+    def add_users_bulk(self, users) -> int:
+        """
+        Upsert пачки пользователей одним запросом.
+        users — кортежи (user_id, username, first_name, last_name)
+        """
+        # ON CONFLICT не может обновить одну строку дважды за запрос
+        rows = list({row[0]: row for row in users}.values())
+        if not rows:
+            return 0
+
+        with self._connection(wrote=True) as conn:
+            with conn.cursor() as cur:
+                execute_values(cur, """
+                    INSERT INTO bot_users (
+                        user_id,
+                        username,
+                        first_name,
+                        last_name,
+                        is_active
+                    )
+                    VALUES %s
+                    ON CONFLICT (user_id) DO UPDATE
+                    SET
+                        username = EXCLUDED.username,
+                        first_name = EXCLUDED.first_name,
+                        last_name = EXCLUDED.last_name,
+                        is_active = true,
+                        deactivated_at = NULL,
+                        deactivation_reason = NULL
+                """, rows, template="(%s,%s,%s,%s,true)", page_size=len(rows))
+
+            conn.commit()
+
+        logger.info("Users saved in batch | rows=%d", len(rows))
+        return len(rows)
+
     def get_active_users(self):
         logger.debug("Fetching active bot users")
-        conn = self._get_conn()
+        conn = self._get_conn(readonly=True)
         try:
             with conn.cursor() as cur:
                 cur.execute("""
@@ -199,5 +612,766 @@ class TradingDBPostgres:
         except Exception:
             logger.exception("Failed to fetch active users")
             return []
+        finally:
+            self._put_conn(conn)
+
+    def iter_recipient_chunks(self, chunk_size=1000):
+        """
+        Стримит user_id активных пользователей пачками по chunk_size
+        через именованный (server-side) курсор — память не зависит от аудитории
+        """
+        conn = self._get_conn(readonly=True)
+        try:
+            with conn.cursor(
+                name=f"recipients_{uuid.uuid4().hex}",
+                cursor_factory=TupleCursor
+            ) as cur:
+                cur.itersize = chunk_size
+                cur.execute("""
+                    SELECT user_id
+                    FROM bot_users
+                    WHERE is_active = true
+                    ORDER BY user_id
+                """)
+
+                while True:
+                    rows = cur.fetchmany(chunk_size)
+                    if not rows:
+                        break
+                    yield [row[0] for row in rows]
+
+        except Exception:
+            logger.exception("Failed to stream recipients")
+            raise
+        finally:
+            # курсор живёт в транзакции — закрываем её перед возвратом в пул
+            conn.rollback()
+            self._put_conn(conn)
+
+    def deactivate_users(self, users) -> int:
+        """
+        Отключает недоступных пользователей одним запросом.
+        users — пары (user_id, reason): blocked, deactivated, chat_not_found...
+        """
+        rows = list(dict(users).items())
+        if not rows:
+            return 0
+
+        with self._connection(wrote=True) as conn:
+            with conn.cursor() as cur:
+                execute_values(cur, """
+                    UPDATE bot_users u
+                    SET
+                        is_active = false,
+                        deactivated_at = now(),
+                        deactivation_reason = v.reason
+                    FROM (VALUES %s) AS v (user_id, reason)
+                    WHERE u.user_id = v.user_id AND u.is_active = true
+                """, rows, page_size=len(rows))
+                updated = cur.rowcount
+            conn.commit()
+
+        logger.info("Unreachable users deactivated | rows=%d", updated)
+        return updated
 
+    def get_deactivation_stats(self) -> dict:
+        """Сколько пользователей отключено по каждой причине"""
+        try:
+            with self._connection(readonly=True) as conn:
+                with conn.cursor(cursor_factory=TupleCursor) as cur:
+                    cur.execute("""
+                        SELECT deactivation_reason, count(*)
+                        FROM bot_users
+                        WHERE is_active = false AND deactivation_reason IS NOT NULL
+                        GROUP BY deactivation_reason
+                    """)
+                    return dict(cur.fetchall())
+        except Exception:
+            logger.exception("Failed to fetch deactivation stats")
+            return {}
+
+    # ==========================
+    # SUBSCRIPTIONS
+    # ==========================
+
+    def add_subscription(self, user_id: int, symbol: str, side: str) -> bool:
+        with self._connection(wrote=True) as conn:
+            with conn.cursor() as cur:
+                cur.execute("""
+                    INSERT INTO user_subscriptions (user_id, symbol, side)
+                    VALUES (%s, %s, %s)
+                    ON CONFLICT DO NOTHING
+                """, (user_id, symbol, side))
+                added = cur.rowcount == 1
+            conn.commit()
 
+        logger.info("Subscription added | user=%s %s/%s", user_id, symbol, side)
+        return added
+
+    def remove_subscriptions(self, user_id: int, symbol=None, side=None) -> int:
+        """Удаляет подписки пользователя; None — любой символ / сторона"""
+        with self._connection(wrote=True) as conn:
+            with conn.cursor() as cur:
+                cur.execute("""
+                    DELETE FROM user_subscriptions
+                    WHERE user_id = %s
+                      AND (%s IS NULL OR symbol = %s)
+                      AND (%s IS NULL OR side = %s)
+                """, (user_id, symbol, symbol, side, side))
+                deleted = cur.rowcount
+            conn.commit()
+
+        logger.info("Subscriptions removed | user=%s rows=%d", user_id, deleted)
+        return deleted
+
+    def get_all_subscriptions(self):
+        """Все подписки кортежами (user_id, symbol, side) — для индекса в памяти"""
+        with self._connection(readonly=True) as conn:
+            with conn.cursor(cursor_factory=TupleCursor) as cur:
+                cur.execute("SELECT user_id, symbol, side FROM user_subscriptions")
+                return cur.fetchall()
+
+    def get_users_page(self, columns=None, after=None, limit=DEFAULT_PAGE_SIZE):
+        """Страница активных пользователей по keyset-курсору (created_at, user_id) DESC"""
+        return self._fetch_page(
+            "bot_users",
+            projection(columns, USER_COLUMNS, USER_KEY),
+            USER_KEY,
+            "is_active = true",
+            after,
+            limit,
+            "UserRow"
+        )
+
+    def iter_users(self, columns=None, page_size=DEFAULT_PAGE_SIZE):
+        yield from self._iter_pages(
+            self.get_users_page, USER_KEY, page_size, columns=columns
+        )
+
+    # ==========================
+    # PNL TIME SERIES
+    # ==========================
+
+    def write_pnl_samples(self, samples) -> int:
+        """
+        Пишет пачку сэмплов (position_id, ts, price, pnl) одним COPY
+        """
+        if not samples:
+            return 0
+
+        buffer = io.StringIO()
+        csv.writer(buffer).writerows(samples)
+        buffer.seek(0)
+
+        with self._connection(wrote=True) as conn:
+            with conn.cursor() as cur:
+                cur.copy_expert(
+                    "COPY position_pnl (position_id, ts, price, pnl) FROM STDIN WITH (FORMAT csv)",
+                    buffer
+                )
+            conn.commit()
+
+        logger.debug("PnL samples written | rows=%d", len(samples))
+        return len(samples)
+
+    def get_pnl_series(self, position_id: int, since=None):
+        """Ряд (ts, price, pnl) позиции для графиков equity/drawdown"""
+        try:
+            with self._connection(readonly=True) as conn:
+                with conn.cursor(cursor_factory=TupleCursor) as cur:
+                    cur.execute("""
+                        SELECT ts, price, pnl
+                        FROM position_pnl
+                        WHERE position_id = %s AND ts >= COALESCE(%s, '-infinity'::timestamp)
+                        ORDER BY ts
+                    """, (position_id, since))
+                    return cur.fetchall()
+        except Exception:
+            logger.exception("Failed to fetch PnL series | id=%s", position_id)
+            return []
+
+    def downsample_pnl_samples(self, since, until, bucket_seconds: int) -> int:
+        """
+        Оставляет в [since, until) по одному (последнему) сэмплу
+        на позицию в каждом окне bucket_seconds
+        """
+        with self._connection(wrote=True) as conn:
+            with conn.cursor() as cur:
+                cur.execute("""
+                    DELETE FROM position_pnl
+                    WHERE ctid IN (
+                        SELECT ctid
+                        FROM (
+                            SELECT
+                                ctid,
+                                row_number() OVER (
+                                    PARTITION BY position_id, floor(extract(epoch FROM ts) / %s)
+                                    ORDER BY ts DESC
+                                ) AS rn
+                            FROM position_pnl
+                            WHERE ts >= %s AND ts < %s
+                        ) ranked
+                        WHERE rn > 1
+                    )
+                """, (bucket_seconds, since, until))
+                deleted = cur.rowcount
+            conn.commit()
+
+        logger.info("PnL samples downsampled | deleted=%d", deleted)
+        return deleted
+
+    def prune_pnl_samples(self, older_than) -> int:
+        """Удаляет сэмплы старше older_than (политика хранения)"""
+        with self._connection(wrote=True) as conn:
+            with conn.cursor() as cur:
+                cur.execute("DELETE FROM position_pnl WHERE ts < %s", (older_than,))
+                deleted = cur.rowcount
+            conn.commit()
+
+        logger.info("PnL samples pruned | deleted=%d", deleted)
+        return deleted
+
+    # ==========================
+    # BROADCAST OUTBOX
+    # ==========================
+
+    def enqueue_broadcast(self, message: str, subscribers=None, priority: int = 3, recipients=None) -> int:
+        """
+        Создаёт задание рассылки и строку доставки на каждого активного
+        пользователя — одной транзакцией, без выгрузки user_id в Python.
+        subscribers — адресная рассылка: пользователи без подписок
+        плюс перечисленные (совпавшие по символу/стороне).
+        recipients — ровно эти пользователи (если активны).
+        priority — класс срочности, 0 — самый срочный
+        """
+        with self._connection(wrote=True) as conn:
+            with conn.cursor(cursor_factory=TupleCursor) as cur:
+                cur.execute(
+                    "INSERT INTO broadcast_jobs (message, priority) VALUES (%s, %s) RETURNING id",
+                    (message, priority)
+                )
+                job_id = cur.fetchone()[0]
+
+                if recipients is not None:
+                    cur.execute("""
+                        INSERT INTO broadcast_deliveries (job_id, user_id, priority)
+                        SELECT %s, user_id, %s
+                        FROM bot_users
+                        WHERE is_active = true AND user_id = ANY(%s)
+                    """, (job_id, priority, list(recipients)))
+                elif subscribers is None:
+                    cur.execute("""
+                        INSERT INTO broadcast_deliveries (job_id, user_id, priority)
+                        SELECT %s, user_id, %s
+                        FROM bot_users
+                        WHERE is_active = true
+                    """, (job_id, priority))
+                else:
+                    cur.execute("""
+                        INSERT INTO broadcast_deliveries (job_id, user_id, priority)
+                        SELECT %s, u.user_id, %s
+                        FROM bot_users u
+                        WHERE u.is_active = true
+                          AND (
+                              u.user_id = ANY(%s)
+                              OR NOT EXISTS (
+                                  SELECT 1 FROM user_subscriptions s WHERE s.user_id = u.user_id
+                              )
+                          )
+                    """, (job_id, priority, list(subscribers)))
+                total = cur.rowcount
+
+                cur.execute("""
+                    UPDATE broadcast_jobs
+                    SET
+                        total = %s,
+                        status = CASE WHEN %s = 0 THEN 'done' ELSE status END,
+                        finished_at = CASE WHEN %s = 0 THEN now() END
+                    WHERE id = %s
+                """, (total, total, total, job_id))
+            conn.commit()
+
+        logger.info("Broadcast enqueued | job=%s recipients=%d", job_id, total)
+        return job_id
+
+    def claim_broadcast_batch(self, limit=200, stale_after=120, quotas=None):
+        """
+        Забирает до limit доставок в работу: status -> 'sending',
+        сначала самые срочные. FOR UPDATE SKIP LOCKED — несколько воркеров
+        не получат одну строку. 'sending' старше stale_after сек считается
+        брошенной (процесс упал) и забирается повторно.
+        quotas — {priority: сколько взять из класса}: сначала доли классов,
+        остаток до limit — самыми срочными. Всё в одной транзакции: now()
+        в ней не меняется, и строки, взятые раньше в этом же вызове, не
+        выглядят брошенными даже при stale_after=0. Возвращает кортежи
+        (job_id, user_id, message, priority)
+        """
+        rows = []
+        with self._connection(wrote=True) as conn:
+            with conn.cursor(cursor_factory=TupleCursor) as cur:
+                for priority, quota in (quotas or {}).items():
+                    quota = min(quota, limit - len(rows))
+                    if quota > 0:
+                        rows += self._claim_deliveries(cur, quota, stale_after, priority)
+                if len(rows) < limit:
+                    rows += self._claim_deliveries(cur, limit - len(rows), stale_after)
+            conn.commit()
+
+        return rows
+
+    @staticmethod
+    def _claim_deliveries(cur, limit, stale_after, priority=None):
+        cur.execute("""
+            WITH batch AS (
+                SELECT job_id, user_id
+                FROM broadcast_deliveries
+                WHERE (
+                        status = 'pending'
+                        OR (status = 'sending' AND claimed_at < now() - %s * interval '1 second')
+                      )
+                  AND (%s::smallint IS NULL OR priority = %s::smallint)
+                ORDER BY priority, job_id, user_id
+                LIMIT %s
+                FOR UPDATE SKIP LOCKED
+            )
+            UPDATE broadcast_deliveries d
+            SET
+                status = 'sending',
+                claimed_at = now(),
+                attempts = d.attempts + 1
+            FROM batch
+            JOIN broadcast_jobs j ON j.id = batch.job_id
+            WHERE d.job_id = batch.job_id AND d.user_id = batch.user_id
+            RETURNING d.job_id, d.user_id, j.message, d.priority
+        """, (stale_after, priority, priority, limit))
+        return cur.fetchall()
+
+    def complete_broadcast_batch(self, results):
+        """
+        Фиксирует итог доставок: results — кортежи (job_id, user_id, sent, error).
+        Возвращает id заданий, у которых не осталось незавершённых доставок
+        """
+        rows = [
+            (job_id, user_id, "sent" if sent else "failed", error)
+            for job_id, user_id, sent, error in results
+        ]
+        if not rows:
+            return []
+
+        with self._connection(wrote=True) as conn:
+            with conn.cursor(cursor_factory=TupleCursor) as cur:
+                execute_values(cur, """
+                    UPDATE broadcast_deliveries d
+                    SET
+                        status = v.status,
+                        error = v.error,
+                        updated_at = now()
+                    FROM (VALUES %s) AS v (job_id, user_id, status, error)
+                    WHERE d.job_id = v.job_id AND d.user_id = v.user_id
+                """, rows, page_size=len(rows))
+
+                cur.execute("""
+                    UPDATE broadcast_jobs j
+                    SET status = 'done', finished_at = now()
+                    WHERE j.id = ANY(%s)
+                      AND j.status = 'pending'
+                      AND NOT EXISTS (
+                          SELECT 1
+                          FROM broadcast_deliveries d
+                          WHERE d.job_id = j.id AND d.status IN ('pending', 'sending')
+                      )
+                    RETURNING j.id
+                """, (sorted({row[0] for row in rows}),))
+                finished = [row[0] for row in cur.fetchall()]
+            conn.commit()
+
+        return finished
+
+    def get_broadcast_report(self, job_id: int) -> dict:
+        """Отчёт по заданию: {job_id, status, total, sent, failed, pending}"""
+        with self._connection() as conn:
+            with conn.cursor(cursor_factory=TupleCursor) as cur:
+                cur.execute("""
+                    SELECT
+                        j.status,
+                        j.total,
+                        count(*) FILTER (WHERE d.status = 'sent'),
+                        count(*) FILTER (WHERE d.status = 'failed'),
+                        count(*) FILTER (WHERE d.status IN ('pending', 'sending'))
+                    FROM broadcast_jobs j
+                    LEFT JOIN broadcast_deliveries d ON d.job_id = j.id
+                    WHERE j.id = %s
+                    GROUP BY j.id
+                """, (job_id,))
+                row = cur.fetchone()
+
+        if row is None:
+            return {}
+
+        status, total, sent, failed, pending = row
+        return {
+            "job_id": job_id,
+            "status": status,
+            "total": total,
+            "sent": sent,
+            "failed": failed,
+            "pending": pending,
+        }
+
+    def prune_broadcast_jobs(self, older_than) -> int:
+        """Удаляет завершённые задания старше older_than вместе с доставками"""
+        with self._connection(wrote=True) as conn:
+            with conn.cursor() as cur:
+                cur.execute(
+                    "DELETE FROM broadcast_jobs WHERE status = 'done' AND finished_at < %s",
+                    (older_than,)
+                )
+                deleted = cur.rowcount
+            conn.commit()
+
+        logger.info("Broadcast jobs pruned | deleted=%d", deleted)
+        return deleted
+
+    # ==========================
+    # PRICE ALERTS
+    # ==========================
+
+    def add_price_alert(self, user_id: int, symbol: str, price: float, direction: str) -> int:
+        """direction: 'above' — сработает при цене >= price, 'below' — при <= price"""
+        with self._connection(wrote=True) as conn:
+            with conn.cursor(cursor_factory=TupleCursor) as cur:
+                cur.execute("""
+                    INSERT INTO price_alerts (user_id, symbol, price, direction)
+                    VALUES (%s, %s, %s, %s)
+                    RETURNING id
+                """, (user_id, symbol, price, direction))
+                alert_id = cur.fetchone()[0]
+            conn.commit()
+
+        logger.info("Price alert added | id=%s user=%s %s %s %s", alert_id, user_id, symbol, direction, price)
+        return alert_id
+
+    def delete_price_alerts(self, alert_ids) -> int:
+        """Удаляет сработавшие алерты одним запросом"""
+        alert_ids = list(alert_ids)
+        if not alert_ids:
+            return 0
+
+        with self._connection(wrote=True) as conn:
+            with conn.cursor() as cur:
+                cur.execute("DELETE FROM price_alerts WHERE id = ANY(%s)", (alert_ids,))
+                deleted = cur.rowcount
+            conn.commit()
+        return deleted
+
+    def remove_price_alerts(self, user_id: int, symbol=None) -> list[int]:
+        """Удаляет алерты пользователя (None — все), возвращает их id"""
+        with self._connection(wrote=True) as conn:
+            with conn.cursor(cursor_factory=TupleCursor) as cur:
+                cur.execute("""
+                    DELETE FROM price_alerts
+                    WHERE user_id = %s AND (%s::text IS NULL OR symbol = %s::text)
+                    RETURNING id
+                """, (user_id, symbol, symbol))
+                removed = [row[0] for row in cur.fetchall()]
+            conn.commit()
+
+        logger.info("Price alerts removed | user=%s rows=%d", user_id, len(removed))
+        return removed
+
+    def get_price_alerts(self):
+        """Все алерты кортежами (id, user_id, symbol, price, direction) — для индекса в памяти"""
+        with self._connection(readonly=True) as conn:
+            with conn.cursor(cursor_factory=TupleCursor) as cur:
+                cur.execute("SELECT id, user_id, symbol, price, direction FROM price_alerts")
+                return cur.fetchall()
+
+    # ==========================
+    # LIVE CARDS
+    # ==========================
+
+    def save_live_card(self, chat_id: int, position_id: int, message_id: int):
+        with self._connection(wrote=True) as conn:
+            with conn.cursor() as cur:
+                cur.execute("""
+                    INSERT INTO live_cards (chat_id, position_id, message_id)
+                    VALUES (%s, %s, %s)
+                    ON CONFLICT (chat_id, position_id) DO UPDATE
+                    SET message_id = EXCLUDED.message_id
+                """, (chat_id, position_id, message_id))
+            conn.commit()
+
+    def delete_live_cards(self, chat_id=None, position_id=None) -> int:
+        """Удаляет карточки чата и/или позиции; None — любые"""
+        with self._connection(wrote=True) as conn:
+            with conn.cursor() as cur:
+                cur.execute("""
+                    DELETE FROM live_cards
+                    WHERE (%s::bigint IS NULL OR chat_id = %s::bigint)
+                      AND (%s::integer IS NULL OR position_id = %s::integer)
+                """, (chat_id, chat_id, position_id, position_id))
+                deleted = cur.rowcount
+            conn.commit()
+        return deleted
+
+    def get_live_cards(self):
+        """Все карточки кортежами (chat_id, position_id, message_id)"""
+        with self._connection(readonly=True) as conn:
+            with conn.cursor(cursor_factory=TupleCursor) as cur:
+                cur.execute("SELECT chat_id, position_id, message_id FROM live_cards")
+                return cur.fetchall()
+
+    # ==========================
+    # EXPORT / IMPORT
+    # ==========================
+
+    @staticmethod
+    def _transfer_columns(table, columns=None):
+        if table not in TRANSFER_TABLES:
+            raise ValueError(f"Unknown table: {table}")
+
+        key, allowed = TRANSFER_TABLES[table]
+        columns = tuple(columns or allowed)
+        unknown = [c for c in columns if c not in allowed]
+        if unknown:
+            raise ValueError(f"Unknown columns: {', '.join(unknown)}")
+        return key, columns
+
+    def _transfer_select(self, cur, table, columns, since, until, active):
+        key, columns = self._transfer_columns(table, columns)
+
+        where, params = [], []
+        if since is not None:
+            where.append("created_at >= %s")
+            params.append(since)
+        if until is not None:
+            where.append("created_at < %s")
+            params.append(until)
+        if active is not None:
+            where.append("is_active = %s")
+            params.append(active)
+
+        query = (
+            f"SELECT {', '.join(columns)} FROM {table}"
+            + (f" WHERE {' AND '.join(where)}" if where else "")
+            + f" ORDER BY {key}"
+        )
+        # COPY не принимает параметры — подставляем их безопасно заранее
+        return cur.mogrify(query, params).decode()
+
+    def export_table(self, table, fileobj, columns=None, since=None, until=None, active=None):
+        """
+        Стримит таблицу в CSV (с заголовком) через COPY ... TO STDOUT.
+        Фильтры: created_at в [since, until), is_active = active
+        """
+        logger.info("Exporting %s | since=%s until=%s active=%s", table, since, until, active)
+
+        with self._connection(readonly=True) as conn:
+            with conn.cursor() as cur:
+                select = self._transfer_select(cur, table, columns, since, until, active)
+                cur.copy_expert(
+                    f"COPY ({select}) TO STDOUT WITH (FORMAT csv, HEADER true)",
+                    fileobj
+                )
+                return cur.rowcount
+
+    def iter_table_chunks(
+        self, table, columns=None, since=None, until=None, active=None, chunk_size=50_000
+    ):
+        """Те же строки, что и export_table, пачками кортежей через server-side курсор"""
+        conn = self._get_conn(readonly=True)
+        try:
+            with conn.cursor(
+                name=f"export_{uuid.uuid4().hex}",
+                cursor_factory=TupleCursor
+            ) as cur:
+                cur.itersize = chunk_size
+                cur.execute(self._transfer_select(cur, table, columns, since, until, active))
+
+                while True:
+                    rows = cur.fetchmany(chunk_size)
+                    if not rows:
+                        break
+                    yield rows
+        finally:
+            conn.rollback()
+            self._put_conn(conn)
+
+    def import_table(self, table, columns, sources, upsert=False) -> int:
+        """
+        Загружает CSV без заголовка (sources — итерируемое file-like объектов)
+        через COPY ... FROM STDIN во временную таблицу и переносит строки
+        одним INSERT ... ON CONFLICT. Всё в одной транзакции
+        """
+        key, columns = self._transfer_columns(table, columns)
+        column_list = ", ".join(columns)
+
+        if upsert:
+            updates = ", ".join(f"{c} = EXCLUDED.{c}" for c in columns if c != key)
+            conflict = f"DO UPDATE SET {updates}" if updates else "DO NOTHING"
+        else:
+            conflict = "DO NOTHING"
+
+        logger.info("Importing %s | columns=%s upsert=%s", table, column_list, upsert)
+
+        with self._connection(wrote=True) as conn:
+            with conn.cursor() as cur:
+                cur.execute(f"""
+                    CREATE TEMP TABLE transfer_staging ON COMMIT DROP AS
+                    SELECT {column_list} FROM {table} WITH NO DATA
+                """)
+
+                for source in sources:
+                    cur.copy_expert(
+                        f"COPY transfer_staging ({column_list}) FROM STDIN WITH (FORMAT csv)",
+                        source
+                    )
+
+                insert = f"""
+                    INSERT INTO {table} ({column_list})
+                    SELECT {column_list} FROM transfer_staging
+                """
+                if key in columns:
+                    insert += f" ON CONFLICT ({key}) {conflict}"
+                cur.execute(insert)
+                imported = cur.rowcount
+
+                if table == "positions" and key in columns:
+                    cur.execute("""
+                        SELECT setval(
+                            pg_get_serial_sequence('positions', 'id'),
+                            GREATEST((SELECT max(id) FROM positions), 1)
+                        )
+                    """)
+
+            conn.commit()
+
+        logger.info("Imported %s | rows=%d", table, imported)
+        return imported
+
+    # ==========================
+    # PAGINATION
+    # ==========================
+
+    def _fetch_page(self, table, columns, key, condition, after, limit, type_name):
+        # имена колонок и таблиц — только из белых списков rows.py
+        where = [condition] if condition else []
+        params = []
+        if after is not None:
+            where.append(f"({key[0]}, {key[1]}) < (%s, %s)")
+            params.extend(after)
+
+        query = (
+            f"SELECT {', '.join(columns)} FROM {table}"
+            + (f" WHERE {' AND '.join(where)}" if where else "")
+            + f" ORDER BY {key[0]} DESC, {key[1]} DESC LIMIT %s"
+        )
+        params.append(limit)
+
+        Row = row_type(type_name, columns)
+        try:
+            with self._connection(readonly=True) as conn:
+                with conn.cursor(cursor_factory=TupleCursor) as cur:
+                    cur.execute(query, params)
+                    return list(map(Row._make, cur.fetchall()))
+        except Exception:
+            logger.exception("Failed to fetch page | table=%s", table)
+            return []
+
+    @staticmethod
+    def _iter_pages(fetch_page, key, page_size, **kwargs):
+        after = None
+        while True:
+            rows = fetch_page(after=after, limit=page_size, **kwargs)
+            yield from rows
+            if len(rows) < page_size:
+                return
+            after = page_cursor(rows, key)
+
+    # ==========================
+    # ANALYTICS
+    # ==========================
+
+    @staticmethod
+    def _record_closed_trade(cur, closed):
+        pnl = closed["final_pnl"] or 0
+        params = (closed["name"], closed["pos_type"] or "unknown", 1 if pnl > 0 else 0, pnl)
+
+        cur.execute("""
+            INSERT INTO position_stats_daily (day, symbol, side, trades, wins, pnl_sum)
+            VALUES (%s::date, %s, %s, 1, %s, %s)
+            ON CONFLICT (day, symbol, side) DO UPDATE
+            SET
+                trades = position_stats_daily.trades + 1,
+                wins = position_stats_daily.wins + EXCLUDED.wins,
+                pnl_sum = position_stats_daily.pnl_sum + EXCLUDED.pnl_sum
+        """, (closed["closed_at"], *params))
+
+        cur.execute("""
+            INSERT INTO position_stats_total (symbol, side, trades, wins, pnl_sum)
+            VALUES (%s, %s, 1, %s, %s)
+            ON CONFLICT (symbol, side) DO UPDATE
+            SET
+                trades = position_stats_total.trades + 1,
+                wins = position_stats_total.wins + EXCLUDED.wins,
+                pnl_sum = position_stats_total.pnl_sum + EXCLUDED.pnl_sum
+        """, params)
+
+    def get_stats_totals(self):
+        """Агрегаты за всё время по (symbol, side) — строк не больше, чем символов × 2"""
+        try:
+            with self._connection(readonly=True) as conn:
+                with conn.cursor() as cur:
+                    cur.execute("""
+                        SELECT symbol, side, trades, wins, pnl_sum
+                        FROM position_stats_total
+                    """)
+                    return cur.fetchall()
+        except Exception:
+            logger.exception("Failed to fetch stats totals")
+            return []
+
+    def get_stats_daily(self, since_day):
+        """Агрегаты по дням начиная с since_day (date)"""
+        try:
+            with self._connection(readonly=True) as conn:
+                with conn.cursor() as cur:
+                    cur.execute("""
+                        SELECT day, symbol, side, trades, wins, pnl_sum
+                        FROM position_stats_daily
+                        WHERE day >= %s
+                        ORDER BY day DESC
+                    """, (since_day,))
+                    return cur.fetchall()
+        except Exception:
+            logger.exception("Failed to fetch daily stats")
+            return []
+
+    def rebuild_stats(self) -> bool:
+        """Пересчитывает агрегаты по всей истории (разовая миграция)"""
+        logger.info("Rebuilding position stats")
+        try:
+            with self._connection(wrote=True) as conn:
+                with conn.cursor() as cur:
+                    cur.execute("TRUNCATE position_stats_daily, position_stats_total")
+                    cur.execute("""
+                        INSERT INTO position_stats_daily (day, symbol, side, trades, wins, pnl_sum)
+                        SELECT
+                            closed_at::date, name, COALESCE(pos_type, 'unknown'), count(*),
+                            count(*) FILTER (WHERE final_pnl > 0),
+                            COALESCE(sum(final_pnl), 0)
+                        FROM positions
+                        WHERE is_active = false AND closed_at IS NOT NULL
+                        GROUP BY 1, 2, 3
+                    """)
+                    cur.execute("""
+                        INSERT INTO position_stats_total (symbol, side, trades, wins, pnl_sum)
+                        SELECT symbol, side, sum(trades), sum(wins), sum(pnl_sum)
+                        FROM position_stats_daily
+                        GROUP BY symbol, side
+                    """)
+                conn.commit()
+            return True
+        except Exception:
+            logger.exception("Failed to rebuild position stats")
+            return False
@@ -0,0 +1,1476 @@
+import csv
+import io
+import json
+import logging
+import sqlite3
+import threading
+import uuid
+from datetime import datetime, timezone
+from functools import lru_cache
+
+from utils.database.rows import (
+    POSITION_COLUMNS,
+    USER_COLUMNS,
+    POSITION_KEY,
+    USER_KEY,
+    DEFAULT_PAGE_SIZE,
+    TRANSFER_TABLES,
+    projection,
+    row_type,
+    page_cursor,
+)
+
+# ==========================
+# LOGGER
+# ==========================
+logger = logging.getLogger(__name__)
+
+_NOW = "(strftime('%Y-%m-%d %H:%M:%f', 'now'))"
+
+SCHEMA = f"""
+CREATE TABLE IF NOT EXISTS positions (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    name TEXT NOT NULL,
+    percent REAL,
+    cross_margin REAL,
+    entry_price REAL,
+    take_profit REAL,
+    stop_loss REAL,
+    pos_type TEXT,
+    is_active BOOLEAN NOT NULL DEFAULT 1,
+    close_reason TEXT,
+    closed_at TIMESTAMP,
+    final_pnl REAL,
+    created_at TIMESTAMP NOT NULL DEFAULT {_NOW}
+);
+
+CREATE INDEX IF NOT EXISTS idx_positions_active_created
+    ON positions (is_active, created_at);
+
+CREATE INDEX IF NOT EXISTS idx_positions_created_id
+    ON positions (created_at DESC, id DESC);
+
+CREATE TABLE IF NOT EXISTS bot_users (
+    user_id INTEGER PRIMARY KEY,
+    username TEXT,
+    first_name TEXT,
+    last_name TEXT,
+    is_active BOOLEAN NOT NULL DEFAULT 1,
+    created_at TIMESTAMP NOT NULL DEFAULT {_NOW},
+    deactivated_at TIMESTAMP,
+    deactivation_reason TEXT
+);
+
+CREATE INDEX IF NOT EXISTS idx_bot_users_active_created
+    ON bot_users (created_at DESC, user_id DESC)
+    WHERE is_active = 1;
+
+CREATE TABLE IF NOT EXISTS position_stats_daily (
+    day TEXT NOT NULL,
+    symbol TEXT NOT NULL,
+    side TEXT NOT NULL,
+    trades INTEGER NOT NULL DEFAULT 0,
+    wins INTEGER NOT NULL DEFAULT 0,
+    pnl_sum REAL NOT NULL DEFAULT 0,
+    PRIMARY KEY (day, symbol, side)
+);
+
+CREATE TABLE IF NOT EXISTS position_stats_total (
+    symbol TEXT NOT NULL,
+    side TEXT NOT NULL,
+    trades INTEGER NOT NULL DEFAULT 0,
+    wins INTEGER NOT NULL DEFAULT 0,
+    pnl_sum REAL NOT NULL DEFAULT 0,
+    PRIMARY KEY (symbol, side)
+);
+
+CREATE TABLE IF NOT EXISTS position_pnl (
+    position_id INTEGER NOT NULL,
+    ts TIMESTAMP NOT NULL,
+    price REAL NOT NULL,
+    pnl REAL NOT NULL
+);
+
+CREATE INDEX IF NOT EXISTS idx_position_pnl_position_ts
+    ON position_pnl (position_id, ts);
+
+CREATE INDEX IF NOT EXISTS idx_position_pnl_ts
+    ON position_pnl (ts);
+
+CREATE TABLE IF NOT EXISTS broadcast_jobs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    message TEXT NOT NULL,
+    status TEXT NOT NULL DEFAULT 'pending',
+    priority INTEGER NOT NULL DEFAULT 3,
+    total INTEGER NOT NULL DEFAULT 0,
+    created_at TIMESTAMP NOT NULL DEFAULT {_NOW},
+    finished_at TIMESTAMP
+);
+
+CREATE TABLE IF NOT EXISTS broadcast_deliveries (
+    job_id INTEGER NOT NULL REFERENCES broadcast_jobs (id) ON DELETE CASCADE,
+    user_id INTEGER NOT NULL,
+    status TEXT NOT NULL DEFAULT 'pending',
+    priority INTEGER NOT NULL DEFAULT 3,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    error TEXT,
+    claimed_at TIMESTAMP,
+    updated_at TIMESTAMP,
+    PRIMARY KEY (job_id, user_id)
+);
+
+CREATE TABLE IF NOT EXISTS user_subscriptions (
+    user_id INTEGER NOT NULL,
+    symbol TEXT NOT NULL,
+    side TEXT NOT NULL,
+    created_at TIMESTAMP NOT NULL DEFAULT {_NOW},
+    PRIMARY KEY (user_id, symbol, side)
+);
+
+CREATE TABLE IF NOT EXISTS live_cards (
+    chat_id INTEGER NOT NULL,
+    position_id INTEGER NOT NULL,
+    message_id INTEGER NOT NULL,
+    PRIMARY KEY (chat_id, position_id)
+);
+
+CREATE TABLE IF NOT EXISTS price_alerts (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    user_id INTEGER NOT NULL,
+    symbol TEXT NOT NULL,
+    price REAL NOT NULL,
+    direction TEXT NOT NULL,
+    created_at TIMESTAMP NOT NULL DEFAULT {_NOW}
+);
+
+CREATE INDEX IF NOT EXISTS idx_price_alerts_user
+    ON price_alerts (user_id);
+
+DROP INDEX IF EXISTS idx_broadcast_deliveries_open;
+
+CREATE INDEX IF NOT EXISTS idx_broadcast_deliveries_queue
+    ON broadcast_deliveries (priority, job_id, user_id)
+    WHERE status IN ('pending', 'sending');
+"""
+
+# Колонки, добавленные после первой версии схемы: (таблица, колонка, тип).
+# В SQLite нет ADD COLUMN IF NOT EXISTS — старые файлы догоняем вручную
+MIGRATIONS = (
+    ("bot_users", "deactivated_at", "TIMESTAMP"),
+    ("bot_users", "deactivation_reason", "TEXT"),
+    ("broadcast_jobs", "priority", "INTEGER NOT NULL DEFAULT 3"),
+    ("broadcast_deliveries", "priority", "INTEGER NOT NULL DEFAULT 3"),
+)
+
+UPDATABLE_POSITION_COLUMNS = set(POSITION_COLUMNS) - {"id", "created_at"}
+
+
+# ==========================
+# TYPES
+# ==========================
+
+# sqlite хранит bool/timestamp как числа и строки — приводим к тем же типам,
+# что отдаёт psycopg2, чтобы UI и бот не различали бэкенды. Только на своих
+# соединениях: глобальные sqlite3.register_adapter / register_converter
+# поменяли бы типы всем пользователям sqlite3 в процессе
+
+def _to_bool(value):
+    return bool(value)
+
+
+def _to_datetime(value):
+    return datetime.fromisoformat(value) if isinstance(value, str) else value
+
+
+def _column_converters():
+    """Колонка -> преобразование по объявленному в SCHEMA типу"""
+    decl_converters = {"BOOLEAN": _to_bool, "TIMESTAMP": _to_datetime}
+
+    conn = sqlite3.connect(":memory:")
+    try:
+        conn.executescript(SCHEMA)
+        tables = [row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")]
+        return {
+            column: decl_converters[decltype.upper()]
+            for table in tables
+            for _, column, decltype, *_ in conn.execute(f"PRAGMA table_info({table})")
+            if decltype.upper() in decl_converters
+        }
+    finally:
+        conn.close()
+
+
+COLUMN_CONVERTERS = _column_converters()
+
+
+@lru_cache(maxsize=256)
+def _row_converters(description):
+    return tuple(COLUMN_CONVERTERS.get(col[0]) for col in description)
+
+
+def _convert(converters, row):
+    return [
+        value if convert is None or value is None else convert(value)
+        for convert, value in zip(converters, row)
+    ]
+
+
+def _dict_factory(cursor, row):
+    converters = _row_converters(cursor.description)
+    return {
+        col[0]: value
+        for col, value in zip(cursor.description, _convert(converters, row))
+    }
+
+
+def _tuple_factory(cursor, row):
+    return tuple(_convert(_row_converters(cursor.description), row))
+
+
+def _adapt(value):
+    if isinstance(value, datetime):
+        return value.isoformat(" ", timespec="milliseconds")
+    return value
+
+
+def _adapt_params(params):
+    if isinstance(params, dict):
+        return {key: _adapt(value) for key, value in params.items()}
+    return [_adapt(value) for value in params]
+
+
+class _Cursor(sqlite3.Cursor):
+    """Курсор, который сам переводит datetime в параметрах в текст"""
+
+    def execute(self, sql, params=()):
+        return super().execute(sql, _adapt_params(params))
+
+    def executemany(self, sql, seq_of_params):
+        return super().executemany(sql, map(_adapt_params, seq_of_params))
+
+
+class _Connection(sqlite3.Connection):
+    def cursor(self, factory=_Cursor):
+        return super().cursor(factory)
+
+    def execute(self, sql, params=()):
+        return self.cursor().execute(sql, params)
+
+    def executemany(self, sql, seq_of_params):
+        return self.cursor().executemany(sql, seq_of_params)
+
+
+class TradingDBSQLite:
+    """
+    Локальное хранилище на SQLite (WAL) с тем же интерфейсом,
+    что и TradingDBPostgres — для однопользовательской установки и тестов
+    """
+
+    def __init__(self, db_path: str):
+        if db_path == ":memory:":
+            # каждому потоку своё соединение, поэтому in-memory база
+            # должна быть именованной и shared-cache
+            self._dsn = f"file:trading-{uuid.uuid4().hex}?mode=memory&cache=shared"
+        else:
+            self._dsn = f"file:{db_path}"
+
+        self._local = threading.local()
+        logger.info("Initializing SQLite storage | %s", db_path)
+
+        # держим одно соединение открытым, иначе in-memory база исчезнет
+        self._keeper = self._connect()
+        self._migrate(self._keeper)
+        self._keeper.executescript(SCHEMA)
+        self._keeper.commit()
+
+    # ==========================
+    # CONNECTION
+    # ==========================
+
+    def _connect(self):
+        conn = sqlite3.connect(
+            self._dsn,
+            uri=True,
+            timeout=30,
+            check_same_thread=False,
+            factory=_Connection,
+        )
+        conn.row_factory = _dict_factory
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute("PRAGMA foreign_keys=ON")
+        return conn
+
+    @staticmethod
+    def _migrate(conn):
+        for table, column, decl in MIGRATIONS:
+            existing = {
+                row["name"] for row in conn.execute(f"PRAGMA table_info({table})").fetchall()
+            }
+            # пустой set — таблицы ещё нет, её создаст SCHEMA
+            if existing and column not in existing:
+                conn.execute(f"ALTER TABLE {table} ADD COLUMN {column} {decl}")
+
+    def _get_conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = self._connect()
+            self._local.conn = conn
+        return conn
+
+    def _put_conn(self, conn):
+        # соединения привязаны к потоку и живут вместе с ним
+        pass
+
+    # ==========================
+    # POSITIONS
+    # ==========================
+
+    def get_all_positions(self, active_only=True):
+        conn = self._get_conn()
+        try:
+            rows = conn.execute("""
+                SELECT *
+                FROM positions
+                WHERE is_active = 1
+                ORDER BY created_at DESC
+            """ if active_only else """
+                SELECT *
+                FROM positions
+                ORDER BY is_active DESC, created_at DESC
+            """).fetchall()
+            logger.info("Fetched %d positions", len(rows))
+            return rows
+        except Exception:
+            logger.exception("Failed to fetch positions")
+            return []
+        finally:
+            self._put_conn(conn)
+
+    def get_positions_page(
+        self,
+        columns=None,
+        active_only=True,
+        after=None,
+        limit=DEFAULT_PAGE_SIZE
+    ):
+        """
+        Страница позиций по keyset-курсору (created_at, id) DESC.
+        Возвращает namedtuple-строки только с запрошенными колонками
+        """
+        return self._fetch_page(
+            "positions",
+            projection(columns, POSITION_COLUMNS, POSITION_KEY),
+            POSITION_KEY,
+            "is_active = 1" if active_only else None,
+            after,
+            limit,
+            "PositionRow"
+        )
+
+    def iter_positions(self, columns=None, active_only=True, page_size=DEFAULT_PAGE_SIZE):
+        yield from self._iter_pages(
+            self.get_positions_page, POSITION_KEY, page_size,
+            columns=columns, active_only=active_only
+        )
+
+    def add_to_db(
+        self,
+        name,
+        percent,
+        cross_margin,
+        entry_price,
+        take_profit,
+        stop_loss,
+        pos_type
+    ):
+        logger.info(
+            "Adding position | %s %s entry=%s TP=%s SL=%s",
+            name, pos_type, entry_price, take_profit, stop_loss
+        )
+
+        conn = self._get_conn()
+        try:
+            position_id = conn.execute("""
+                INSERT INTO positions (
+                    name,
+                    percent,
+                    cross_margin,
+                    entry_price,
+                    take_profit,
+                    stop_loss,
+                    pos_type,
+                    is_active
+                )
+                VALUES (?,?,?,?,?,?,?,1)
+                RETURNING id
+            """, (
+                name,
+                percent,
+                cross_margin,
+                entry_price,
+                take_profit,
+                stop_loss,
+                pos_type
+            )).fetchone()["id"]
+            conn.commit()
+
+            logger.info("Position created | id=%s", position_id)
+            return position_id
+
+        except Exception:
+            conn.rollback()
+            logger.exception("Failed to add position")
+            raise
+        finally:
+            self._put_conn(conn)
+
+    def delete_position(self, position_id: int) -> bool:
+        logger.info("Deleting position | id=%s", position_id)
+
+        conn = self._get_conn()
+        try:
+            conn.execute("DELETE FROM positions WHERE id = ?", (position_id,))
+            conn.execute("DELETE FROM position_pnl WHERE position_id = ?", (position_id,))
+            conn.commit()
+
+            logger.info("Position deleted | id=%s", position_id)
+            return True
+
+        except Exception:
+            conn.rollback()
+            logger.exception("Failed to delete position | id=%s", position_id)
+            return False
+        finally:
+            self._put_conn(conn)
+
+    def update_position(self, position_id: int, **fields) -> bool:
+        """
+        Обновляет поля позиции. is_active=False закрывает позицию
+        через close_position, чтобы обновить агрегаты статистики
+        """
+        if fields.get("is_active") is False:
+            fields.pop("is_active")
+            return self.close_position(position_id, **fields)
+
+        unknown = set(fields) - UPDATABLE_POSITION_COLUMNS
+        if unknown:
+            raise ValueError(f"Unknown position fields: {', '.join(sorted(unknown))}")
+        if not fields:
+            return False
+
+        assignments = ", ".join(f"{column} = ?" for column in fields)
+        conn = self._get_conn()
+        try:
+            cur = conn.execute(
+                f"UPDATE positions SET {assignments} WHERE id = ?",
+                (*fields.values(), position_id)
+            )
+            conn.commit()
+            return cur.rowcount > 0
+        except Exception:
+            conn.rollback()
+            logger.exception("Failed to update position | id=%s", position_id)
+            return False
+        finally:
+            self._put_conn(conn)
+
+    def close_position(
+        self,
+        position_id: int,
+        close_reason: str | None = None,
+        final_pnl: float | None = None,
+        closed_at=None
+    ) -> bool:
+        """
+        Закрывает активную позицию и в той же транзакции добавляет сделку
+        в агрегаты position_stats_*. Повторное закрытие ничего не меняет
+        """
+        logger.info(
+            "Closing position | id=%s reason=%s pnl=%s",
+            position_id, close_reason, final_pnl
+        )
+
+        conn = self._get_conn()
+        try:
+            closed = conn.execute(f"""
+                UPDATE positions
+                SET
+                    is_active = 0,
+                    close_reason = ?,
+                    final_pnl = ?,
+                    closed_at = COALESCE(?, {_NOW})
+                WHERE id = ? AND is_active = 1
+                RETURNING name, pos_type, closed_at, final_pnl
+            """, (close_reason, final_pnl, closed_at, position_id)).fetchone()
+
+            if closed:
+                self._record_closed_trade(conn, closed)
+
+            conn.commit()
+            return closed is not None
+
+        except Exception:
+            conn.rollback()
+            logger.exception("Failed to close position | id=%s", position_id)
+            return False
+        finally:
+            self._put_conn(conn)
+
+    # ==========================
+    # BOT USERS
+    # ==========================
+    def add_user(self, user_id, username, first_name, last_name):
+        logger.debug("Upserting user | id=%s username=%s", user_id, username)
+
+        conn = self._get_conn()
+        try:
+            conn.execute("""
+                INSERT INTO bot_users (
+                    user_id,
+                    username,
+                    first_name,
+                    last_name,
+                    is_active
+                )
+                VALUES (?,?,?,?,1)
+                ON CONFLICT (user_id) DO UPDATE
+                SET
+                    username = excluded.username,
+                    first_name = excluded.first_name,
+                    last_name = excluded.last_name,
+                    is_active = 1,
+                    deactivated_at = NULL,
+                    deactivation_reason = NULL
+            """, (
+                user_id,
+                username,
+                first_name,
+                last_name
+            ))
+            conn.commit()
+
+            logger.info("User saved | id=%s", user_id)
+
+        except Exception:
+            conn.rollback()
+            logger.exception("Failed to add/update user | id=%s", user_id)
+        finally:
+            self._put_conn(conn)
+
+    def add_users_bulk(self, users) -> int:
+        """
+        Upsert пачки пользователей одной транзакцией.
+        users — кортежи (user_id, username, first_name, last_name)
+        """
+        rows = list({row[0]: row for row in users}.values())
+        if not rows:
+            return 0
+
+        conn = self._get_conn()
+        try:
+            conn.executemany("""
+                INSERT INTO bot_users (
+                    user_id,
+                    username,
+                    first_name,
+                    last_name,
+                    is_active
+                )
+                VALUES (?,?,?,?,1)
+                ON CONFLICT (user_id) DO UPDATE
+                SET
+                    username = excluded.username,
+                    first_name = excluded.first_name,
+                    last_name = excluded.last_name,
+                    is_active = 1,
+                    deactivated_at = NULL,
+                    deactivation_reason = NULL
+            """, rows)
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            self._put_conn(conn)
+
+        logger.info("Users saved in batch | rows=%d", len(rows))
+        return len(rows)
+
+    def get_active_users(self):
+        logger.debug("Fetching active bot users")
+        conn = self._get_conn()
+        try:
+            users = conn.execute("""
+                SELECT
+                    user_id,
+                    username,
+                    first_name,
+                    last_name,
+                    created_at
+                FROM bot_users
+                WHERE is_active = 1
+                ORDER BY created_at DESC
+            """).fetchall()
+
+            logger.info("Fetched %d active users", len(users))
+            return users
+
+        except Exception:
+            logger.exception("Failed to fetch active users")
+            return []
+        finally:
+            self._put_conn(conn)
+
+    def iter_recipient_chunks(self, chunk_size=1000):
+        """
+        Стримит user_id активных пользователей пачками по chunk_size.
+        Отдельное соединение: генератор могут продвигать разные потоки
+        """
+        conn = self._connect()
+        try:
+            cur = conn.cursor()
+            cur.row_factory = None
+            cur.execute("""
+                SELECT user_id
+                FROM bot_users
+                WHERE is_active = 1
+                ORDER BY user_id
+            """)
+
+            while True:
+                rows = cur.fetchmany(chunk_size)
+                if not rows:
+                    break
+                yield [row[0] for row in rows]
+
+        except Exception:
+            logger.exception("Failed to stream recipients")
+            raise
+        finally:
+            conn.close()
+
+    def deactivate_users(self, users) -> int:
+        """
+        Отключает недоступных пользователей одной транзакцией.
+        users — пары (user_id, reason): blocked, deactivated, chat_not_found...
+        """
+        rows = [(reason, user_id) for user_id, reason in dict(users).items()]
+        if not rows:
+            return 0
+
+        conn = self._get_conn()
+        try:
+            updated = conn.executemany(f"""
+                UPDATE bot_users
+                SET
+                    is_active = 0,
+                    deactivated_at = {_NOW},
+                    deactivation_reason = ?
+                WHERE user_id = ? AND is_active = 1
+            """, rows).rowcount
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            self._put_conn(conn)
+
+        logger.info("Unreachable users deactivated | rows=%d", updated)
+        return updated
+
+    def get_deactivation_stats(self) -> dict:
+        """Сколько пользователей отключено по каждой причине"""
+        conn = self._get_conn()
+        try:
+            rows = conn.execute("""
+                SELECT deactivation_reason AS reason, count(*) AS users
+                FROM bot_users
+                WHERE is_active = 0 AND deactivation_reason IS NOT NULL
+                GROUP BY deactivation_reason
+            """).fetchall()
+            return {row["reason"]: row["users"] for row in rows}
+        except Exception:
+            logger.exception("Failed to fetch deactivation stats")
+            return {}
+        finally:
+            self._put_conn(conn)
+
+    # ==========================
+    # SUBSCRIPTIONS
+    # ==========================
+
+    def add_subscription(self, user_id: int, symbol: str, side: str) -> bool:
+        conn = self._get_conn()
+        try:
+            added = conn.execute("""
+                INSERT INTO user_subscriptions (user_id, symbol, side)
+                VALUES (?, ?, ?)
+                ON CONFLICT DO NOTHING
+            """, (user_id, symbol, side)).rowcount == 1
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            self._put_conn(conn)
+
+        logger.info("Subscription added | user=%s %s/%s", user_id, symbol, side)
+        return added
+
+    def remove_subscriptions(self, user_id: int, symbol=None, side=None) -> int:
+        """Удаляет подписки пользователя; None — любой символ / сторона"""
+        conn = self._get_conn()
+        try:
+            deleted = conn.execute("""
+                DELETE FROM user_subscriptions
+                WHERE user_id = ?
+                  AND (? IS NULL OR symbol = ?)
+                  AND (? IS NULL OR side = ?)
+            """, (user_id, symbol, symbol, side, side)).rowcount
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            self._put_conn(conn)
+
+        logger.info("Subscriptions removed | user=%s rows=%d", user_id, deleted)
+        return deleted
+
+    def get_all_subscriptions(self):
+        """Все подписки кортежами (user_id, symbol, side) — для индекса в памяти"""
+        conn = self._get_conn()
+        try:
+            cur = conn.cursor()
+            cur.row_factory = None
+            return cur.execute("SELECT user_id, symbol, side FROM user_subscriptions").fetchall()
+        finally:
+            self._put_conn(conn)
+
+    def get_users_page(self, columns=None, after=None, limit=DEFAULT_PAGE_SIZE):
+        """Страница активных пользователей по keyset-курсору (created_at, user_id) DESC"""
+        return self._fetch_page(
+            "bot_users",
+            projection(columns, USER_COLUMNS, USER_KEY),
+            USER_KEY,
+            "is_active = 1",
+            after,
+            limit,
+            "UserRow"
+        )
+
+    def iter_users(self, columns=None, page_size=DEFAULT_PAGE_SIZE):
+        yield from self._iter_pages(
+            self.get_users_page, USER_KEY, page_size, columns=columns
+        )
+
+    # ==========================
+    # PNL TIME SERIES
+    # ==========================
+
+    def write_pnl_samples(self, samples) -> int:
+        """Пишет пачку сэмплов (position_id, ts, price, pnl) одной транзакцией"""
+        if not samples:
+            return 0
+
+        conn = self._get_conn()
+        try:
+            conn.executemany(
+                "INSERT INTO position_pnl (position_id, ts, price, pnl) VALUES (?,?,?,?)",
+                samples
+            )
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            self._put_conn(conn)
+
+        logger.debug("PnL samples written | rows=%d", len(samples))
+        return len(samples)
+
+    def get_pnl_series(self, position_id: int, since=None):
+        """Ряд (ts, price, pnl) позиции для графиков equity/drawdown"""
+        conn = self._get_conn()
+        try:
+            cur = conn.cursor()
+            cur.row_factory = _tuple_factory
+            return cur.execute("""
+                SELECT ts, price, pnl
+                FROM position_pnl
+                WHERE position_id = ? AND (? IS NULL OR ts >= ?)
+                ORDER BY ts
+            """, (position_id, since, since)).fetchall()
+        except Exception:
+            logger.exception("Failed to fetch PnL series | id=%s", position_id)
+            return []
+        finally:
+            self._put_conn(conn)
+
+    def downsample_pnl_samples(self, since, until, bucket_seconds: int) -> int:
+        """
+        Оставляет в [since, until) по одному (последнему) сэмплу
+        на позицию в каждом окне bucket_seconds
+        """
+        conn = self._get_conn()
+        try:
+            deleted = conn.execute("""
+                DELETE FROM position_pnl
+                WHERE rowid IN (
+                    SELECT rowid
+                    FROM (
+                        SELECT
+                            rowid,
+                            row_number() OVER (
+                                PARTITION BY position_id, CAST(strftime('%s', ts) AS INTEGER) / ?
+                                ORDER BY ts DESC
+                            ) AS rn
+                        FROM position_pnl
+                        WHERE ts >= ? AND ts < ?
+                    )
+                    WHERE rn > 1
+                )
+            """, (bucket_seconds, since, until)).rowcount
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            self._put_conn(conn)
+
+        logger.info("PnL samples downsampled | deleted=%d", deleted)
+        return deleted
+
+    def prune_pnl_samples(self, older_than) -> int:
+        """Удаляет сэмплы старше older_than (политика хранения)"""
+        conn = self._get_conn()
+        try:
+            deleted = conn.execute(
+                "DELETE FROM position_pnl WHERE ts < ?", (older_than,)
+            ).rowcount
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            self._put_conn(conn)
+
+        logger.info("PnL samples pruned | deleted=%d", deleted)
+        return deleted
+
+    # ==========================
+    # BROADCAST OUTBOX
+    # ==========================
+
+    def enqueue_broadcast(self, message: str, subscribers=None, priority: int = 3, recipients=None) -> int:
+        """
+        Создаёт задание рассылки и строку доставки на каждого активного
+        пользователя — одной транзакцией.
+        subscribers — адресная рассылка: пользователи без подписок
+        плюс перечисленные (совпавшие по символу/стороне).
+        recipients — ровно эти пользователи (если активны).
+        priority — класс срочности, 0 — самый срочный
+        """
+        conn = self._get_conn()
+        try:
+            job_id = conn.execute(
+                "INSERT INTO broadcast_jobs (message, priority) VALUES (?, ?)", (message, priority)
+            ).lastrowid
+
+            if recipients is not None:
+                total = conn.execute("""
+                    INSERT INTO broadcast_deliveries (job_id, user_id, priority)
+                    SELECT ?, user_id, ?
+                    FROM bot_users
+                    WHERE is_active = 1
+                      AND user_id IN (SELECT value FROM json_each(?))
+                """, (job_id, priority, json.dumps(list(recipients)))).rowcount
+            elif subscribers is None:
+                total = conn.execute("""
+                    INSERT INTO broadcast_deliveries (job_id, user_id, priority)
+                    SELECT ?, user_id, ?
+                    FROM bot_users
+                    WHERE is_active = 1
+                """, (job_id, priority)).rowcount
+            else:
+                total = conn.execute("""
+                    INSERT INTO broadcast_deliveries (job_id, user_id, priority)
+                    SELECT ?, u.user_id, ?
+                    FROM bot_users u
+                    WHERE u.is_active = 1
+                      AND (
+                          u.user_id IN (SELECT value FROM json_each(?))
+                          OR NOT EXISTS (
+                              SELECT 1 FROM user_subscriptions s WHERE s.user_id = u.user_id
+                          )
+                      )
+                """, (job_id, priority, json.dumps(list(subscribers)))).rowcount
+
+            conn.execute(f"""
+                UPDATE broadcast_jobs
+                SET
+                    total = ?,
+                    status = CASE WHEN ? = 0 THEN 'done' ELSE status END,
+                    finished_at = CASE WHEN ? = 0 THEN {_NOW} END
+                WHERE id = ?
+            """, (total, total, total, job_id))
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            self._put_conn(conn)
+
+        logger.info("Broadcast enqueued | job=%s recipients=%d", job_id, total)
+        return job_id
+
+    def claim_broadcast_batch(self, limit=200, stale_after=120, quotas=None):
+        """
+        Забирает до limit доставок в работу: status -> 'sending',
+        сначала самые срочные. SKIP LOCKED в SQLite нет — выборка и пометка
+        идут под BEGIN IMMEDIATE, второй писатель ждёт.
+        quotas — {priority: сколько взять из класса}: сначала доли классов,
+        остаток до limit — самыми срочными. Время вызова фиксируется один
+        раз, и строки, взятые раньше в этом же вызове, не выглядят
+        брошенными даже при stale_after=0. Возвращает кортежи
+        (job_id, user_id, message, priority)
+        """
+        conn = self._get_conn()
+        rows = []
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+
+            cur = conn.cursor()
+            cur.row_factory = None
+            claimed_at, stale_before = cur.execute(
+                "SELECT strftime('%Y-%m-%d %H:%M:%f', 'now'), strftime('%Y-%m-%d %H:%M:%f', 'now', ?)",
+                (f"-{stale_after} seconds",)
+            ).fetchone()
+
+            for priority, quota in (quotas or {}).items():
+                quota = min(quota, limit - len(rows))
+                if quota > 0:
+                    rows += self._claim_deliveries(cur, quota, claimed_at, stale_before, priority)
+            if len(rows) < limit:
+                rows += self._claim_deliveries(cur, limit - len(rows), claimed_at, stale_before)
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            self._put_conn(conn)
+
+        return rows
+
+    @staticmethod
+    def _claim_deliveries(cur, limit, claimed_at, stale_before, priority=None):
+        rows = cur.execute("""
+            SELECT d.job_id, d.user_id, j.message, d.priority
+            FROM broadcast_deliveries d
+            JOIN broadcast_jobs j ON j.id = d.job_id
+            WHERE (
+                    d.status = 'pending'
+                    OR (d.status = 'sending' AND d.claimed_at < ?)
+                  )
+              AND (? IS NULL OR d.priority = ?)
+            ORDER BY d.priority, d.job_id, d.user_id
+            LIMIT ?
+        """, (stale_before, priority, priority, limit)).fetchall()
+
+        cur.executemany("""
+            UPDATE broadcast_deliveries
+            SET
+                status = 'sending',
+                claimed_at = ?,
+                attempts = attempts + 1
+            WHERE job_id = ? AND user_id = ?
+        """, [(claimed_at, row[0], row[1]) for row in rows])
+        return rows
+
+    def complete_broadcast_batch(self, results):
+        """
+        Фиксирует итог доставок: results — кортежи (job_id, user_id, sent, error).
+        Возвращает id заданий, у которых не осталось незавершённых доставок
+        """
+        rows = [
+            ("sent" if sent else "failed", error, job_id, user_id)
+            for job_id, user_id, sent, error in results
+        ]
+        if not rows:
+            return []
+
+        job_ids = sorted({row[2] for row in rows})
+
+        conn = self._get_conn()
+        try:
+            conn.executemany(f"""
+                UPDATE broadcast_deliveries
+                SET
+                    status = ?,
+                    error = ?,
+                    updated_at = {_NOW}
+                WHERE job_id = ? AND user_id = ?
+            """, rows)
+
+            placeholders = ", ".join("?" * len(job_ids))
+            finished = [
+                row["id"] for row in conn.execute(f"""
+                    UPDATE broadcast_jobs
+                    SET status = 'done', finished_at = {_NOW}
+                    WHERE id IN ({placeholders})
+                      AND status = 'pending'
+                      AND NOT EXISTS (
+                          SELECT 1
+                          FROM broadcast_deliveries d
+                          WHERE d.job_id = broadcast_jobs.id AND d.status IN ('pending', 'sending')
+                      )
+                    RETURNING id
+                """, job_ids).fetchall()
+            ]
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            self._put_conn(conn)
+
+        return finished
+
+    def get_broadcast_report(self, job_id: int) -> dict:
+        """Отчёт по заданию: {job_id, status, total, sent, failed, pending}"""
+        conn = self._get_conn()
+        try:
+            row = conn.execute("""
+                SELECT
+                    j.status,
+                    j.total,
+                    count(*) FILTER (WHERE d.status = 'sent') AS sent,
+                    count(*) FILTER (WHERE d.status = 'failed') AS failed,
+                    count(*) FILTER (WHERE d.status IN ('pending', 'sending')) AS pending
+                FROM broadcast_jobs j
+                LEFT JOIN broadcast_deliveries d ON d.job_id = j.id
+                WHERE j.id = ?
+                GROUP BY j.id
+            """, (job_id,)).fetchone()
+        finally:
+            self._put_conn(conn)
+
+        if row is None:
+            return {}
+
+        return {"job_id": job_id, **row}
+
+    def prune_broadcast_jobs(self, older_than) -> int:
+        """Удаляет завершённые задания старше older_than вместе с доставками"""
+        conn = self._get_conn()
+        try:
+            deleted = conn.execute(
+                "DELETE FROM broadcast_jobs WHERE status = 'done' AND finished_at < ?",
+                (older_than,)
+            ).rowcount
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            self._put_conn(conn)
+
+        logger.info("Broadcast jobs pruned | deleted=%d", deleted)
+        return deleted
+
+    # ==========================
+    # PRICE ALERTS
+    # ==========================
+
+    def add_price_alert(self, user_id: int, symbol: str, price: float, direction: str) -> int:
+        """direction: 'above' — сработает при цене >= price, 'below' — при <= price"""
+        conn = self._get_conn()
+        try:
+            alert_id = conn.execute("""
+                INSERT INTO price_alerts (user_id, symbol, price, direction)
+                VALUES (?, ?, ?, ?)
+            """, (user_id, symbol, price, direction)).lastrowid
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            self._put_conn(conn)
+
+        logger.info("Price alert added | id=%s user=%s %s %s %s", alert_id, user_id, symbol, direction, price)
+        return alert_id
+
+    def delete_price_alerts(self, alert_ids) -> int:
+        """Удаляет сработавшие алерты одним запросом"""
+        alert_ids = list(alert_ids)
+        if not alert_ids:
+            return 0
+
+        conn = self._get_conn()
+        try:
+            deleted = conn.execute(
+                "DELETE FROM price_alerts WHERE id IN (SELECT value FROM json_each(?))",
+                (json.dumps(alert_ids),)
+            ).rowcount
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            self._put_conn(conn)
+        return deleted
+
+    def remove_price_alerts(self, user_id: int, symbol=None) -> list[int]:
+        """Удаляет алерты пользователя (None — все), возвращает их id"""
+        conn = self._get_conn()
+        try:
+            cur = conn.cursor()
+            cur.row_factory = None
+            removed = [row[0] for row in cur.execute("""
+                DELETE FROM price_alerts
+                WHERE user_id = ? AND (? IS NULL OR symbol = ?)
+                RETURNING id
+            """, (user_id, symbol, symbol)).fetchall()]
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            self._put_conn(conn)
+
+        logger.info("Price alerts removed | user=%s rows=%d", user_id, len(removed))
+        return removed
+
+    def get_price_alerts(self):
+        """Все алерты кортежами (id, user_id, symbol, price, direction) — для индекса в памяти"""
+        conn = self._get_conn()
+        try:
+            cur = conn.cursor()
+            cur.row_factory = None
+            return cur.execute("SELECT id, user_id, symbol, price, direction FROM price_alerts").fetchall()
+        finally:
+            self._put_conn(conn)
+
+    # ==========================
+    # LIVE CARDS
+    # ==========================
+
+    def save_live_card(self, chat_id: int, position_id: int, message_id: int):
+        conn = self._get_conn()
+        try:
+            conn.execute("""
+                INSERT INTO live_cards (chat_id, position_id, message_id)
+                VALUES (?, ?, ?)
+                ON CONFLICT (chat_id, position_id) DO UPDATE
+                SET message_id = excluded.message_id
+            """, (chat_id, position_id, message_id))
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            self._put_conn(conn)
+
+    def delete_live_cards(self, chat_id=None, position_id=None) -> int:
+        """Удаляет карточки чата и/или позиции; None — любые"""
+        conn = self._get_conn()
+        try:
+            deleted = conn.execute("""
+                DELETE FROM live_cards
+                WHERE (? IS NULL OR chat_id = ?)
+                  AND (? IS NULL OR position_id = ?)
+            """, (chat_id, chat_id, position_id, position_id)).rowcount
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            self._put_conn(conn)
+        return deleted
+
+    def get_live_cards(self):
+        """Все карточки кортежами (chat_id, position_id, message_id)"""
+        conn = self._get_conn()
+        try:
+            cur = conn.cursor()
+            cur.row_factory = None
+            return cur.execute("SELECT chat_id, position_id, message_id FROM live_cards").fetchall()
+        finally:
+            self._put_conn(conn)
+
+    # ==========================
+    # EXPORT / IMPORT
+    # ==========================
+
+    @staticmethod
+    def _transfer_columns(table, columns=None):
+        if table not in TRANSFER_TABLES:
+            raise ValueError(f"Unknown table: {table}")
+
+        key, allowed = TRANSFER_TABLES[table]
+        columns = tuple(columns or allowed)
+        unknown = [c for c in columns if c not in allowed]
+        if unknown:
+            raise ValueError(f"Unknown columns: {', '.join(unknown)}")
+        return key, columns
+
+    def _transfer_select(self, table, columns, since, until, active):
+        key, columns = self._transfer_columns(table, columns)
+
+        where, params = [], []
+        if since is not None:
+            where.append("created_at >= ?")
+            params.append(since)
+        if until is not None:
+            where.append("created_at < ?")
+            params.append(until)
+        if active is not None:
+            where.append("is_active = ?")
+            params.append(int(active))
+
+        query = (
+            f"SELECT {', '.join(columns)} FROM {table}"
+            + (f" WHERE {' AND '.join(where)}" if where else "")
+            + f" ORDER BY {key}"
+        )
+        return columns, query, params
+
+    @staticmethod
+    def _csv_value(value):
+        # как в COPY ... FORMAT csv у Postgres: NULL — пустое поле, bool — t/f
+        if value is None:
+            return ""
+        if isinstance(value, bool):
+            return "t" if value else "f"
+        if isinstance(value, datetime):
+            return value.isoformat(" ")
+        return value
+
+    @staticmethod
+    def _sql_value(decltype, value):
+        if value == "":
+            return None
+        if decltype == "BOOLEAN":
+            return value.lower() in ("t", "true", "1")
+        if decltype == "TIMESTAMP":
+            # файл из Postgres или Parquet — приводим к наивному UTC этой базы
+            value = datetime.fromisoformat(value)
+            if value.tzinfo is not None:
+                value = value.astimezone(timezone.utc).replace(tzinfo=None)
+            return value
+        return value
+
+    def export_table(self, table, fileobj, columns=None, since=None, until=None, active=None):
+        """
+        Пишет таблицу в CSV (с заголовком) в том же виде, что COPY у Postgres.
+        Фильтры: created_at в [since, until), is_active = active
+        """
+        logger.info("Exporting %s | since=%s until=%s active=%s", table, since, until, active)
+
+        writer = csv.writer(fileobj)
+        writer.writerow(self._transfer_columns(table, columns)[1])
+
+        exported = 0
+        for rows in self.iter_table_chunks(table, columns, since, until, active):
+            writer.writerows([self._csv_value(value) for value in row] for row in rows)
+            exported += len(rows)
+        return exported
+
+    def iter_table_chunks(
+        self, table, columns=None, since=None, until=None, active=None, chunk_size=50_000
+    ):
+        """Те же строки, что и export_table, пачками кортежей"""
+        columns, query, params = self._transfer_select(table, columns, since, until, active)
+
+        conn = self._get_conn()
+        try:
+            cur = conn.cursor()
+            cur.row_factory = _tuple_factory
+            cur.execute(query, params)
+            while True:
+                rows = cur.fetchmany(chunk_size)
+                if not rows:
+                    break
+                yield rows
+        finally:
+            self._put_conn(conn)
+
+    def import_table(self, table, columns, sources, upsert=False) -> int:
+        """
+        Загружает CSV без заголовка (sources — итерируемое file-like объектов,
+        текстовых или байтовых) одним INSERT ... ON CONFLICT на пачку.
+        Всё в одной транзакции
+        """
+        key, columns = self._transfer_columns(table, columns)
+        column_list = ", ".join(columns)
+
+        insert = f"INSERT INTO {table} ({column_list}) VALUES ({', '.join('?' for _ in columns)})"
+        if key in columns:
+            updates = ", ".join(f"{c} = excluded.{c}" for c in columns if c != key)
+            if upsert and updates:
+                insert += f" ON CONFLICT ({key}) DO UPDATE SET {updates}"
+            else:
+                insert += f" ON CONFLICT ({key}) DO NOTHING"
+
+        logger.info("Importing %s | columns=%s upsert=%s", table, column_list, upsert)
+
+        conn = self._get_conn()
+        try:
+            decltypes = {
+                row["name"]: (row["type"] or "").upper()
+                for row in conn.execute(f"PRAGMA table_info({table})").fetchall()
+            }
+            types = [decltypes[column] for column in columns]
+
+            conn.execute("BEGIN IMMEDIATE")
+            changes = conn.total_changes
+            for source in sources:
+                if not isinstance(source, io.TextIOBase):
+                    source = io.TextIOWrapper(source, encoding="utf-8", newline="")
+                conn.executemany(insert, (
+                    [self._sql_value(decltype, value) for decltype, value in zip(types, row)]
+                    for row in csv.reader(source)
+                ))
+            imported = conn.total_changes - changes
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            self._put_conn(conn)
+
+        logger.info("Imported %s | rows=%d", table, imported)
+        return imported
+
+    # ==========================
+    # PAGINATION
+    # ==========================
+
+    def _fetch_page(self, table, columns, key, condition, after, limit, type_name):
+        # имена колонок и таблиц — только из белых списков rows.py
+        where = [condition] if condition else []
+        params = []
+        if after is not None:
+            where.append(f"({key[0]}, {key[1]}) < (?, ?)")
+            params.extend(after)
+
+        query = (
+            f"SELECT {', '.join(columns)} FROM {table}"
+            + (f" WHERE {' AND '.join(where)}" if where else "")
+            + f" ORDER BY {key[0]} DESC, {key[1]} DESC LIMIT ?"
+        )
+        params.append(limit)
+
+        Row = row_type(type_name, columns)
+        conn = self._get_conn()
+        try:
+            cur = conn.cursor()
+            cur.row_factory = _tuple_factory
+            return list(map(Row._make, cur.execute(query, params).fetchall()))
+        except Exception:
+            logger.exception("Failed to fetch page | table=%s", table)
+            return []
+        finally:
+            self._put_conn(conn)
+
+    @staticmethod
+    def _iter_pages(fetch_page, key, page_size, **kwargs):
+        after = None
+        while True:
+            rows = fetch_page(after=after, limit=page_size, **kwargs)
+            yield from rows
+            if len(rows) < page_size:
+                return
+            after = page_cursor(rows, key)
+
+    # ==========================
+    # ANALYTICS
+    # ==========================
+
+    @staticmethod
+    def _record_closed_trade(conn, closed):
+        pnl = closed["final_pnl"] or 0
+        params = (closed["name"], closed["pos_type"] or "unknown", 1 if pnl > 0 else 0, pnl)
+
+        conn.execute("""
+            INSERT INTO position_stats_daily (day, symbol, side, trades, wins, pnl_sum)
+            VALUES (date(?), ?, ?, 1, ?, ?)
+            ON CONFLICT (day, symbol, side) DO UPDATE
+            SET
+                trades = trades + 1,
+                wins = wins + excluded.wins,
+                pnl_sum = pnl_sum + excluded.pnl_sum
+        """, (closed["closed_at"], *params))
+
+        conn.execute("""
+            INSERT INTO position_stats_total (symbol, side, trades, wins, pnl_sum)
+            VALUES (?, ?, 1, ?, ?)
+            ON CONFLICT (symbol, side) DO UPDATE
+            SET
+                trades = trades + 1,
+                wins = wins + excluded.wins,
+                pnl_sum = pnl_sum + excluded.pnl_sum
+        """, params)
+
+    def get_stats_totals(self):
+        """Агрегаты за всё время по (symbol, side) — строк не больше, чем символов × 2"""
+        conn = self._get_conn()
+        try:
+            return conn.execute("""
+                SELECT symbol, side, trades, wins, pnl_sum
+                FROM position_stats_total
+            """).fetchall()
+        except Exception:
+            logger.exception("Failed to fetch stats totals")
+            return []
+        finally:
+            self._put_conn(conn)
+
+    def get_stats_daily(self, since_day):
+        """Агрегаты по дням начиная с since_day (date)"""
+        conn = self._get_conn()
+        try:
+            return conn.execute("""
+                SELECT day, symbol, side, trades, wins, pnl_sum
+                FROM position_stats_daily
+                WHERE day >= ?
+                ORDER BY day DESC
+            """, (since_day.isoformat(),)).fetchall()
+        except Exception:
+            logger.exception("Failed to fetch daily stats")
+            return []
+        finally:
+            self._put_conn(conn)
+
+    def rebuild_stats(self) -> bool:
+        """Пересчитывает агрегаты по всей истории (разовая миграция)"""
+        logger.info("Rebuilding position stats")
+        conn = self._get_conn()
+        try:
+            conn.execute("DELETE FROM position_stats_daily")
+            conn.execute("DELETE FROM position_stats_total")
+            conn.execute("""
+                INSERT INTO position_stats_daily (day, symbol, side, trades, wins, pnl_sum)
+                SELECT
+                    date(closed_at), name, COALESCE(pos_type, 'unknown'), count(*),
+                    count(*) FILTER (WHERE final_pnl > 0),
+                    COALESCE(sum(final_pnl), 0)
+                FROM positions
+                WHERE is_active = 0 AND closed_at IS NOT NULL
+                GROUP BY 1, 2, 3
+            """)
+            conn.execute("""
+                INSERT INTO position_stats_total (symbol, side, trades, wins, pnl_sum)
+                SELECT symbol, side, sum(trades), sum(wins), sum(pnl_sum)
+                FROM position_stats_daily
+                GROUP BY symbol, side
+            """)
+            conn.commit()
+            return True
+        except Exception:
+            conn.rollback()
+            logger.exception("Failed to rebuild position stats")
+            return False
+        finally:
+            self._put_conn(conn)
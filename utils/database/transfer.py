@@ -0,0 +1,167 @@
+#!/usr/bin/env python3
+"""
+Экспорт и импорт positions / bot_users через COPY.
+
+    python -m utils.database.transfer export positions positions.csv --since 2026-01-01
+    python -m utils.database.transfer export bot_users users.parquet --active
+    python -m utils.database.transfer import positions positions.parquet --upsert
+
+CSV идёт напрямую через COPY ... TO STDOUT / FROM STDIN, Parquet — пачками
+по --chunk-size строк (нужен pyarrow). Память не зависит от размера таблицы.
+Бэкенд — настройка db_backend или --backend; на SQLite CSV пишется и читается
+построчно в том же формате, так что файлы переносятся между бэкендами
+"""
+
+import argparse
+import csv
+import io
+import logging
+import sys
+import time
+from datetime import datetime, timezone
+
+from utils.database import create_database
+from utils.database.rows import TRANSFER_TABLES
+
+logger = logging.getLogger(__name__)
+
+FLOAT_COLUMNS = {"percent", "cross_margin", "entry_price", "take_profit", "stop_loss", "final_pnl"}
+INT_COLUMNS = {"id", "user_id"}
+BOOL_COLUMNS = {"is_active"}
+TIMESTAMP_COLUMNS = {"created_at", "closed_at", "deactivated_at"}
+
+
+def _detect_format(path, fmt):
+    if fmt:
+        return fmt
+    return "parquet" if str(path).lower().endswith(".parquet") else "csv"
+
+
+def _import_pyarrow():
+    try:
+        import pyarrow
+        import pyarrow.csv
+        import pyarrow.parquet
+        return pyarrow
+    except ImportError:
+        raise SystemExit("❌ Для Parquet нужен pyarrow: pip install pyarrow")
+
+
+def _arrow_schema(pa, columns):
+    def arrow_type(column):
+        if column in INT_COLUMNS:
+            return pa.int64()
+        if column in FLOAT_COLUMNS:
+            return pa.float64()
+        if column in BOOL_COLUMNS:
+            return pa.bool_()
+        if column in TIMESTAMP_COLUMNS:
+            return pa.timestamp("us")
+        return pa.string()
+
+    return pa.schema([(column, arrow_type(column)) for column in columns])
+
+
+def _normalize(column, value):
+    if value is None:
+        return None
+    if column in FLOAT_COLUMNS:
+        return float(value)
+    if column in TIMESTAMP_COLUMNS and value.tzinfo is not None:
+        return value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+
+def export_table(db, table, path, fmt=None, since=None, until=None, active=None, chunk_size=50_000):
+    if _detect_format(path, fmt) == "csv":
+        with open(path, "w", newline="", encoding="utf-8") as fileobj:
+            return db.export_table(table, fileobj, since=since, until=until, active=active)
+
+    pa = _import_pyarrow()
+    columns = TRANSFER_TABLES[table][1]
+    schema = _arrow_schema(pa, columns)
+
+    exported = 0
+    with pa.parquet.ParquetWriter(path, schema) as writer:
+        for rows in db.iter_table_chunks(
+            table, since=since, until=until, active=active, chunk_size=chunk_size
+        ):
+            arrays = [
+                pa.array([_normalize(column, row[i]) for row in rows], type=schema.field(i).type)
+                for i, column in enumerate(columns)
+            ]
+            writer.write_batch(pa.RecordBatch.from_arrays(arrays, schema=schema))
+            exported += len(rows)
+
+    return exported
+
+
+def import_table(db, table, path, fmt=None, upsert=False, chunk_size=50_000):
+    if _detect_format(path, fmt) == "csv":
+        with open(path, newline="", encoding="utf-8") as fileobj:
+            columns = next(csv.reader([fileobj.readline()]))
+            return db.import_table(table, columns, [fileobj], upsert=upsert)
+
+    pa = _import_pyarrow()
+    parquet_file = pa.parquet.ParquetFile(path)
+    columns = parquet_file.schema_arrow.names
+
+    def sources():
+        # каждая пачка превращается в CSV-буфер только на время своего COPY
+        options = pa.csv.WriteOptions(include_header=False)
+        for batch in parquet_file.iter_batches(batch_size=chunk_size):
+            buffer = io.BytesIO()
+            pa.csv.write_csv(batch, buffer, options)
+            buffer.seek(0)
+            yield buffer
+
+    return db.import_table(table, columns, sources(), upsert=upsert)
+
+
+def _parse_date(value):
+    return datetime.fromisoformat(value)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Экспорт/импорт таблиц через COPY")
+    parser.add_argument("command", choices=["export", "import"])
+    parser.add_argument("table", choices=sorted(TRANSFER_TABLES))
+    parser.add_argument("path")
+    parser.add_argument("--format", choices=["csv", "parquet"], help="по умолчанию — по расширению")
+    parser.add_argument("--since", type=_parse_date, help="created_at >= (ISO дата)")
+    parser.add_argument("--until", type=_parse_date, help="created_at < (ISO дата)")
+    status = parser.add_mutually_exclusive_group()
+    status.add_argument("--active", dest="active", action="store_const", const=True)
+    status.add_argument("--inactive", dest="active", action="store_const", const=False)
+    parser.add_argument("--upsert", action="store_true", help="обновлять существующие строки при импорте")
+    parser.add_argument("--chunk-size", type=int, default=50_000)
+    parser.add_argument("--backend", choices=["postgres", "sqlite"], help="по умолчанию — настройка db_backend")
+    args = parser.parse_args(argv)
+
+    from dotenv import load_dotenv
+    load_dotenv(override=True)
+    logging.basicConfig(level=logging.INFO)
+
+    db = create_database(args.backend)
+    started = time.perf_counter()
+
+    if args.command == "export":
+        rows = export_table(
+            db, args.table, args.path, args.format,
+            since=args.since, until=args.until, active=args.active,
+            chunk_size=args.chunk_size
+        )
+    else:
+        if args.since or args.until or args.active is not None:
+            parser.error("фильтры --since/--until/--active применимы только к export")
+        rows = import_table(
+            db, args.table, args.path, args.format,
+            upsert=args.upsert, chunk_size=args.chunk_size
+        )
+
+    print(f"✅ {args.command} {args.table}: {rows} строк за {time.perf_counter() - started:.2f} сек")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,88 @@
+import atexit
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+
+class UserUpsertBuffer:
+    """
+    Отложенная запись пользователей бота.
+
+    /start кладёт upsert в буфер, фоновый поток пишет накопленное одним
+    multi-row INSERT ... ON CONFLICT каждые flush_interval_ms или при
+    max_rows записях. Повторные /start одного пользователя схлопываются
+    """
+
+    def __init__(self, db, flush_interval_ms: int = 500, max_rows: int = 500):
+        self.db = db
+        self.flush_interval = flush_interval_ms / 1000
+        self.max_rows = max_rows
+
+        self._pending: dict[int, tuple] = {}
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stop_flag = False
+        self._thread: threading.Thread | None = None
+
+    def start(self):
+        if self._thread and self._thread.is_alive():
+            return self._thread
+
+        self._stop_flag = False
+        self._thread = threading.Thread(
+            target=self._flush_loop, daemon=True, name="user_upsert_buffer"
+        )
+        self._thread.start()
+        atexit.register(self.stop)
+        return self._thread
+
+    def add(self, user_id, username, first_name, last_name):
+        with self._lock:
+            self._pending[user_id] = (user_id, username, first_name, last_name)
+            full = len(self._pending) >= self.max_rows
+
+        if self._stop_flag:
+            # после stop() потока нет — пишем сразу, а не теряем запись
+            self.flush()
+            return
+
+        if not (self._thread and self._thread.is_alive()):
+            self.start()
+        if full:
+            self._wakeup.set()
+
+    def flush(self) -> int:
+        # один flush за раз, чтобы при повторе не перепутать порядок записей
+        with self._flush_lock:
+            with self._lock:
+                batch = list(self._pending.values())
+                self._pending.clear()
+
+            if not batch:
+                return 0
+
+            try:
+                self.db.add_users_bulk(batch)
+                return len(batch)
+            except Exception:
+                logger.exception("User batch flush failed | rows=%d", len(batch))
+                # возвращаем в буфер, не затирая более свежие данные
+                with self._lock:
+                    for row in batch:
+                        self._pending.setdefault(row[0], row)
+                return 0
+
+    def stop(self):
+        self._stop_flag = True
+        self._wakeup.set()
+        if self._thread and self._thread is not threading.current_thread():
+            self._thread.join(timeout=5)
+        self.flush()
+
+    def _flush_loop(self):
+        while not self._stop_flag:
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            self.flush()
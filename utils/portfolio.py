@@ -0,0 +1,124 @@
+import numpy as np
+
+LONG = 1.0
+SHORT = -1.0
+
+
+class PortfolioSnapshot:
+    """
+    Результат одного тика PortfolioState.evaluate: массивы по позициям
+    в порядке ids плюс агрегаты. Неизменяемый — его безопасно отдавать
+    UI, боту и рекордерам из разных потоков
+    """
+
+    __slots__ = (
+        "ids", "price", "pnl",
+        "exposure", "long_exposure", "short_exposure", "unrealized",
+        "prices", "_index",
+    )
+
+    def __init__(self, ids, price, pnl, exposure, long_exposure, short_exposure, unrealized, prices, index):
+        self.ids = ids
+        self.price = price
+        self.pnl = pnl
+        self.exposure = exposure
+        self.long_exposure = long_exposure
+        self.short_exposure = short_exposure
+        self.unrealized = unrealized
+        self.prices = prices
+        self._index = index
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def pnl_of(self, position_id: int) -> float | None:
+        """PnL позиции в %, None — позиции нет в снимке или нет цены"""
+        i = self._index.get(position_id)
+        if i is None or np.isnan(self.pnl[i]):
+            return None
+        return float(self.pnl[i])
+
+    def price_of(self, position_id: int) -> float | None:
+        i = self._index.get(position_id)
+        if i is None or np.isnan(self.price[i]):
+            return None
+        return float(self.price[i])
+
+    def rows(self):
+        """(position_id, price, pnl) позиций с известной ценой — для рекордеров"""
+        known = ~np.isnan(self.pnl)
+        return zip(self.ids[known].tolist(), self.price[known].tolist(), self.pnl[known].tolist())
+
+
+class PortfolioState:
+    """
+    Открытые позиции в колонках NumPy: entry, leverage, side (+1 long,
+    -1 short), доля баланса и индекс символа в symbols.
+
+    evaluate(prices) одним векторным проходом считает PnL в % с учётом
+    плеча и экспозицию (доля баланса × плечо):
+    на тысячах позиций это микросекунды, а не цикл с float() по карточкам.
+    Состояние перестраивается только при изменении набора позиций
+    """
+
+    def __init__(self, positions=()):
+        positions = [
+            pos for pos in positions
+            if pos.get("name") and pos.get("pos_type") in ("long", "short")
+        ]
+        count = len(positions)
+
+        self.symbols: list[str] = sorted({pos["name"] for pos in positions})
+        symbol_index = {symbol: i for i, symbol in enumerate(self.symbols)}
+
+        self.ids = np.fromiter((pos["id"] for pos in positions), dtype=np.int64, count=count)
+        self.symbol_idx = np.fromiter(
+            (symbol_index[pos["name"]] for pos in positions), dtype=np.intp, count=count
+        )
+        self.side = np.fromiter(
+            (SHORT if pos["pos_type"] == "short" else LONG for pos in positions),
+            dtype=np.float64, count=count
+        )
+        self.entry = self._column(positions, "entry_price")
+        self.leverage = self._column(positions, "cross_margin")
+        self.percent = self._column(positions, "percent")
+
+        # цена входа 0 — PnL не определён, как и без цены
+        self.entry[self.entry <= 0] = np.nan
+        self._index = {position_id: i for i, position_id in enumerate(self.ids.tolist())}
+
+    @staticmethod
+    def _column(positions, field) -> np.ndarray:
+        # None и 0 (не задано) -> NaN: PnL такой позиции не определён
+        return np.fromiter(
+            (float(pos.get(field) or "nan") for pos in positions),
+            dtype=np.float64, count=len(positions)
+        )
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def evaluate(self, prices: dict) -> PortfolioSnapshot:
+        """prices — {symbol: price или None}, как у price_fetcher"""
+        quotes = np.fromiter(
+            (np.nan if prices.get(symbol) is None else float(prices[symbol]) for symbol in self.symbols),
+            dtype=np.float64, count=len(self.symbols)
+        )
+        price = quotes[self.symbol_idx]
+        signed_move = self.side * (price - self.entry)
+
+        pnl = np.round(signed_move / self.entry * self.leverage * 100, 2)
+
+        notional = np.nan_to_num(self.percent * self.leverage)
+        return PortfolioSnapshot(
+            ids=self.ids,
+            price=price,
+            pnl=pnl,
+            exposure=float(notional.sum()),
+            long_exposure=float(notional[self.side > 0].sum()),
+            short_exposure=float(notional[self.side < 0].sum()),
+            # PnL портфеля в % баланса: доля позиции × её PnL
+            unrealized=float(np.nansum(self.percent * pnl) / 100),
+            prices=prices,
+            index=self._index,
+        )
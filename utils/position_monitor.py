@@ -0,0 +1,284 @@
+import atexit
+import logging
+import threading
+import time
+from dataclasses import dataclass
+
+from utils.portfolio import PortfolioSnapshot, PortfolioState
+from utils.triggers import ABOVE, BELOW, TriggerBook
+
+logger = logging.getLogger(__name__)
+
+# направление срабатывания уровня: (pos_type, 'tp'|'sl') -> ABOVE/BELOW
+_DIRECTIONS = {
+    ("long", "tp"): ABOVE,
+    ("long", "sl"): BELOW,
+    ("short", "tp"): BELOW,
+    ("short", "sl"): ABOVE,
+}
+
+
+@dataclass
+class PositionClosed:
+    position_id: int
+    name: str
+    pos_type: str
+    entry_price: float
+    close_price: float
+    close_reason: str
+    final_pnl: float
+
+
+class PositionMonitor:
+    """
+    Headless-мониторинг TP/SL всех активных позиций, независимо от UI.
+
+    Уровни лежат в TriggerBook: ключ (position_id, 'tp'|'sl'), у long
+    TP срабатывает выше цены, SL — ниже, у short наоборот. На тике
+    одним батчем котируются только символы с открытыми позициями
+    и снимаются только пересечённые уровни. Позиция закрывается
+    в БД (close_position идемпотентен), после чего подписчики получают
+    PositionClosed — UI перерисовывает список, бот рассылает закрытие.
+
+    PnL и экспозиция всех позиций считаются векторно в PortfolioState
+    (он же даёт final_pnl закрытых), последний снимок лежит в snapshot —
+    его читают UI и бот, сэмплы пишутся в pnl_recorder. Срабатывания
+    определяет только TriggerBook.
+
+    Подписчики вызываются из потока монитора и не должны блокировать.
+    Позиции, созданные не через этот процесс (бот, другой терминал),
+    подхватываются reload() раз в reload_interval
+    """
+
+    def __init__(
+        self,
+        db,
+        price_fetcher=None,
+        interval: float = 1.0,
+        reload_interval: float = 30.0,
+        pnl_recorder=None,
+    ):
+        if price_fetcher is None:
+            from parsing.price_cache import shared_price_cache
+            price_fetcher = shared_price_cache().prices
+
+        self.db = db
+        self.price_fetcher = price_fetcher
+        self.interval = interval
+        self.reload_interval = reload_interval
+        self.pnl_recorder = pnl_recorder
+
+        self.book = TriggerBook()
+        self._positions: dict[int, dict] = {}
+        self.portfolio = PortfolioState()
+        self.snapshot: PortfolioSnapshot | None = None
+        self._portfolio_dirty = False
+        self._subscribers: list = []
+        self._lock = threading.Lock()
+
+        self.closed = 0
+        self._last_reload: float | None = None
+        self._wakeup = threading.Event()
+        self._stop_flag = False
+        self._thread: threading.Thread | None = None
+
+    def __len__(self) -> int:
+        return len(self._positions)
+
+    # ==========================
+    # SUBSCRIBERS
+    # ==========================
+
+    def subscribe(self, callback):
+        """callback(PositionClosed) — вызывается из потока монитора"""
+        with self._lock:
+            self._subscribers.append(callback)
+        return callback
+
+    def unsubscribe(self, callback):
+        with self._lock:
+            if callback in self._subscribers:
+                self._subscribers.remove(callback)
+
+    def _emit(self, event: PositionClosed):
+        with self._lock:
+            subscribers = list(self._subscribers)
+        for callback in subscribers:
+            try:
+                callback(event)
+            except Exception:
+                logger.exception("Position closed subscriber failed | id=%s", event.position_id)
+
+    # ==========================
+    # POSITIONS
+    # ==========================
+
+    def reload(self) -> int:
+        """Сверяет индекс с активными позициями в БД"""
+        positions = self.db.get_all_positions(active_only=True)
+        self._last_reload = time.monotonic()
+
+        active = set()
+        for position in positions:
+            active.add(position["id"])
+            self.track(position)
+
+        for position_id in set(self._positions) - active:
+            self.untrack(position_id)
+        return len(self._positions)
+
+    def track(self, position: dict):
+        """Добавляет или обновляет уровни позиции"""
+        position_id = position["id"]
+        pos_type = position.get("pos_type")
+        name = position.get("name")
+
+        if not position.get("is_active", True) or not name or pos_type not in ("long", "short"):
+            self.untrack(position_id)
+            return
+
+        # позиция не менялась — ни уровни, ни колонки PnL не трогаем
+        known = self._positions.get(position_id)
+        if known is not None and all(
+            known.get(field) == position.get(field)
+            for field in ("name", "pos_type", "entry_price", "cross_margin", "percent", "take_profit", "stop_loss")
+        ):
+            return
+
+        self.untrack(position_id)
+        self._positions[position_id] = dict(position)
+        self._portfolio_dirty = True
+        for kind, field in (("tp", "take_profit"), ("sl", "stop_loss")):
+            level = position.get(field)
+            # 0 или пусто — уровень не задан
+            if level:
+                self.book.add((position_id, kind), name, float(level), _DIRECTIONS[pos_type, kind])
+
+    def untrack(self, position_id: int):
+        if self._positions.pop(position_id, None) is not None:
+            self._portfolio_dirty = True
+        self.book.remove((position_id, "tp"))
+        self.book.remove((position_id, "sl"))
+
+    # ==========================
+    # ENGINE
+    # ==========================
+
+    def _rebuild_portfolio(self):
+        # колонки пересобираются только при изменении набора позиций
+        if self._portfolio_dirty:
+            self.portfolio = PortfolioState(self._positions.values())
+            self._portfolio_dirty = False
+
+    def evaluate(self, prices: dict) -> PortfolioSnapshot:
+        """Векторный пересчёт PnL/экспозиции; снимок становится общим"""
+        self._rebuild_portfolio()
+        self.snapshot = self.portfolio.evaluate(prices)
+        return self.snapshot
+
+    def check(self, prices: dict, snapshot: PortfolioSnapshot | None = None) -> list[PositionClosed]:
+        """Закрывает позиции с пересечёнными уровнями, возвращает события"""
+        if snapshot is None:
+            snapshot = self.evaluate(prices)
+
+        hits: dict[int, tuple[str, float]] = {}
+        for symbol, price in prices.items():
+            if price is None:
+                continue
+            for position_id, kind in self.book.crossed(symbol, price):
+                # оба уровня за один тик — только при кривых TP/SL, приоритет у TP
+                if position_id not in hits or kind == "tp":
+                    hits[position_id] = (kind, float(price))
+
+        events = []
+        for position_id, (close_reason, price) in hits.items():
+            position = self._positions.get(position_id)
+            if position is None:
+                continue
+            self.untrack(position_id)
+
+            final_pnl = snapshot.pnl_of(position_id) or 0.0
+            try:
+                closed = self.db.close_position(position_id, close_reason=close_reason, final_pnl=final_pnl)
+            except Exception:
+                # позиция осталась активной — reload вернёт её уровни
+                logger.exception("Failed to close position | id=%s", position_id)
+                continue
+            if not closed:
+                # уже закрыта или удалена в другом месте
+                continue
+
+            events.append(PositionClosed(
+                position_id=position_id,
+                name=position["name"],
+                pos_type=position["pos_type"],
+                entry_price=float(position.get("entry_price") or 0),
+                close_price=price,
+                close_reason=close_reason,
+                final_pnl=final_pnl,
+            ))
+
+        for event in events:
+            self.closed += 1
+            logger.info(
+                "Position closed by %s | id=%s %s price=%s pnl=%s%%",
+                event.close_reason.upper(), event.position_id, event.name, event.close_price, event.final_pnl
+            )
+            self._emit(event)
+        return events
+
+    def tick(self) -> list[PositionClosed]:
+        if self._last_reload is None or time.monotonic() - self._last_reload >= self.reload_interval:
+            self.reload()
+
+        self._rebuild_portfolio()
+        symbols = self.portfolio.symbols
+        if not symbols:
+            self.snapshot = None
+            return []
+
+        # один запрос котировок на все символы с открытыми позициями
+        prices = self.price_fetcher(symbols)
+        snapshot = self.evaluate(prices)
+
+        if self.pnl_recorder is not None:
+            for position_id, price, pnl in snapshot.rows():
+                self.pnl_recorder.record(position_id, price, pnl)
+        return self.check(prices, snapshot)
+
+    # ==========================
+    # BACKGROUND LOOP
+    # ==========================
+
+    def start(self):
+        if self._thread and self._thread.is_alive():
+            return self._thread
+
+        self._stop_flag = False
+        self._thread = threading.Thread(
+            target=self._run, daemon=True, name="position_monitor"
+        )
+        self._thread.start()
+        atexit.register(self.stop)
+        return self._thread
+
+    def wake(self):
+        """Внеочередная сверка с БД и тик — после создания или удаления позиции"""
+        self._last_reload = None
+        self._wakeup.set()
+
+    def stop(self):
+        self._stop_flag = True
+        self._wakeup.set()
+        if self._thread and self._thread is not threading.current_thread():
+            self._thread.join(timeout=5)
+            self._thread = None
+
+    def _run(self):
+        while not self._stop_flag:
+            try:
+                self.tick()
+            except Exception:
+                logger.exception("Position monitor tick failed")
+            self._wakeup.wait(self.interval)
+            self._wakeup.clear()
@@ -0,0 +1,140 @@
+from datetime import datetime
+
+from utils.database.rows import POSITION_COLUMNS, page_cursor
+from utils.portfolio import PortfolioSnapshot, PortfolioState
+
+SORT_CREATED = "created"
+SORT_PNL = "pnl"
+SORT_NAME = "name"
+
+SIDE_ANY = "all"
+STATUS_ANY = "all"
+STATUS_ACTIVE = "active"
+STATUS_CLOSED = "closed"
+
+# Колонки, которые показывает список (closed_at — нет)
+LIST_COLUMNS = tuple(c for c in POSITION_COLUMNS if c != "closed_at")
+
+# Сколько последних закрытых позиций держит список: история в память целиком не грузится
+CLOSED_LIMIT = 200
+
+
+def load_positions(db, closed_limit: int = CLOSED_LIMIT) -> list[dict]:
+    """
+    Позиции для списка терминала через keyset-страницы: все активные
+    и не больше closed_limit последних закрытых. Порядок — как у БД
+    (активные, затем закрытые; внутри — новые первыми)
+    """
+    active = [row._asdict() for row in db.iter_positions(columns=LIST_COLUMNS, active_only=True)]
+
+    closed, after = [], None
+    while len(closed) < closed_limit:
+        page = db.get_positions_page(columns=LIST_COLUMNS, active_only=False, after=after, limit=closed_limit)
+        if not page:
+            break
+        closed += [row._asdict() for row in page if not row.is_active]
+        after = page_cursor(page)
+
+    return active + closed[:closed_limit]
+
+
+class PositionRows:
+    """
+    Данные списка позиций терминала: все позиции в памяти, текущие
+    цены и PnL, фильтр и сортировка. Фильтр и сортировка не ходят в БД:
+    view() пересобирается только после изменения данных, фильтра или
+    сортировки (по PnL — и после нового тика цен), window() отдаёт срез
+    для видимых строк.
+
+    PnL берётся из снимка PositionMonitor, а без него считается своим
+    PortfolioState; у закрытых позиций — final_pnl
+    """
+
+    def __init__(self):
+        self._positions: list[dict] = []
+        self._portfolio = PortfolioState()
+        self.snapshot: PortfolioSnapshot | None = None
+
+        self.query = ""
+        self.side = SIDE_ANY
+        self.status = STATUS_ANY
+        self.sort_key = SORT_CREATED
+        self.descending = True
+        self._view: list[dict] | None = None
+
+    def __len__(self) -> int:
+        return len(self.view())
+
+    # ==========================
+    # DATA
+    # ==========================
+
+    def set_positions(self, positions):
+        self._positions = list(positions)
+        self._portfolio = PortfolioState(pos for pos in self._positions if pos.get("is_active", True))
+        if self.snapshot is not None:
+            self.set_prices(self.snapshot.prices)
+        self._view = None
+
+    def set_prices(self, prices: dict, snapshot: PortfolioSnapshot | None = None):
+        self.snapshot = snapshot if snapshot is not None else self._portfolio.evaluate(prices)
+        if self.sort_key == SORT_PNL:
+            self._view = None
+
+    def price_of(self, pos: dict):
+        return self.snapshot.prices.get(pos.get("name")) if self.snapshot is not None else None
+
+    def pnl_of(self, pos: dict) -> float | None:
+        if not pos.get("is_active", True):
+            return float(pos["final_pnl"]) if pos.get("final_pnl") is not None else None
+        return self.snapshot.pnl_of(pos["id"]) if self.snapshot is not None else None
+
+    # ==========================
+    # FILTER / SORT
+    # ==========================
+
+    def set_filter(self, query: str | None = None, side: str | None = None, status: str | None = None):
+        if query is not None:
+            self.query = query.strip().upper()
+        if side is not None:
+            self.side = side
+        if status is not None:
+            self.status = status
+        self._view = None
+
+    def set_sort(self, key: str, descending: bool = True):
+        self.sort_key, self.descending = key, descending
+        self._view = None
+
+    def _matches(self, pos: dict) -> bool:
+        if self.query and self.query not in (pos.get("name") or "").upper():
+            return False
+        if self.side != SIDE_ANY and pos.get("pos_type") != self.side:
+            return False
+        if self.status != STATUS_ANY:
+            active = bool(pos.get("is_active", True))
+            return active == (self.status == STATUS_ACTIVE)
+        return True
+
+    def view(self) -> list[dict]:
+        if self._view is not None:
+            return self._view
+
+        rows = [pos for pos in self._positions if self._matches(pos)]
+        if self.sort_key == SORT_PNL:
+            # позиции без цены — в конце при любом направлении
+            known = [pos for pos in rows if self.pnl_of(pos) is not None]
+            unknown = [pos for pos in rows if self.pnl_of(pos) is None]
+            known.sort(key=self.pnl_of, reverse=self.descending)
+            rows = known + unknown
+        elif self.sort_key == SORT_NAME:
+            rows.sort(key=lambda pos: ((pos.get("name") or ""), pos["id"]), reverse=self.descending)
+        else:
+            # по дате создания, без учёта статуса: порядок БД ставит активные первыми
+            rows.sort(key=lambda pos: (pos.get("created_at") or datetime.min, pos["id"]), reverse=self.descending)
+
+        self._view = rows
+        return rows
+
+    def window(self, first: int, count: int) -> list[dict]:
+        return self.view()[first:first + count]
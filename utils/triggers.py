@@ -0,0 +1,132 @@
+import bisect
+import math
+import threading
+
+ABOVE = "above"
+BELOW = "below"
+
+
+class _Levels:
+    """
+    Уровни одного символа и направления, отсортированные так,
+    что сработавшие всегда лежат в конце списка: снимаются
+    срезом del levels[i:] за O(k), без сдвига остальных
+    """
+
+    __slots__ = ("levels", "keys")
+
+    def __init__(self):
+        self.levels: list[float] = []
+        self.keys: list = []
+
+    def insert(self, level: float, key):
+        i = bisect.bisect_right(self.levels, level)
+        self.levels.insert(i, level)
+        self.keys.insert(i, key)
+
+    def remove(self, level: float, key) -> bool:
+        i = bisect.bisect_left(self.levels, level)
+        end = bisect.bisect_right(self.levels, level)
+        for j in range(i, end):
+            if self.keys[j] == key:
+                del self.levels[j]
+                del self.keys[j]
+                return True
+        return False
+
+    def pop_from(self, i: int) -> list:
+        fired = self.keys[i:]
+        del self.levels[i:]
+        del self.keys[i:]
+        return fired
+
+
+class TriggerBook:
+    """
+    Индекс ценовых триггеров по символам: для каждого символа два
+    отсортированных списка — «выше» (сработает при цене >= level)
+    и «ниже» (при цене <= level).
+
+    crossed(symbol, price) находит границу бинарным поиском и снимает
+    только пересечённые уровни: O(log n + k), где k — число сработавших,
+    без перебора всех триггеров на каждом тике. Ключ — любой hashable
+    (id алерта, (position_id, 'tp')), по нему триггер можно удалить.
+    Уровень — конечное положительное число: NaN сломал бы порядок
+    бинарного поиска для всех триггеров символа
+    """
+
+    def __init__(self):
+        # «выше» храним с обратным знаком: сработавшие — наибольшие -level, в конце
+        self._above: dict[str, _Levels] = {}
+        self._below: dict[str, _Levels] = {}
+        self._where: dict = {}
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._where)
+
+    def __contains__(self, key) -> bool:
+        return key in self._where
+
+    def symbols(self) -> list[str]:
+        """Символы, по которым есть хотя бы один триггер — их и нужно котировать"""
+        with self._lock:
+            return sorted(
+                {symbol for symbol, levels in self._above.items() if levels.levels}
+                | {symbol for symbol, levels in self._below.items() if levels.levels}
+            )
+
+    def add(self, key, symbol: str, level: float, direction: str):
+        if direction not in (ABOVE, BELOW):
+            raise ValueError(f"Unknown direction: {direction}")
+        level = float(level)
+        if not math.isfinite(level) or level <= 0:
+            raise ValueError(f"Invalid level: {level}")
+
+        with self._lock:
+            if key in self._where:
+                self._remove(key)
+
+            if direction == ABOVE:
+                self._above.setdefault(symbol, _Levels()).insert(-level, key)
+            else:
+                self._below.setdefault(symbol, _Levels()).insert(level, key)
+            self._where[key] = (symbol, direction, level)
+
+    def remove(self, key) -> bool:
+        with self._lock:
+            return self._remove(key)
+
+    def _remove(self, key) -> bool:
+        where = self._where.pop(key, None)
+        if where is None:
+            return False
+
+        symbol, direction, level = where
+        if direction == ABOVE:
+            return self._above[symbol].remove(-level, key)
+        return self._below[symbol].remove(level, key)
+
+    def crossed(self, symbol: str, price: float) -> list:
+        """Снимает и возвращает ключи триггеров, пересечённых ценой price"""
+        price = float(price)
+        fired = []
+
+        with self._lock:
+            above = self._above.get(symbol)
+            if above and above.levels and above.levels[-1] >= -price:
+                # level <= price  <=>  -level >= -price
+                fired += above.pop_from(bisect.bisect_left(above.levels, -price))
+
+            below = self._below.get(symbol)
+            if below and below.levels and below.levels[-1] >= price:
+                fired += below.pop_from(bisect.bisect_left(below.levels, price))
+
+            for key in fired:
+                del self._where[key]
+
+        return fired
+
+    def get(self, key) -> tuple[str, str, float] | None:
+        """(symbol, direction, level) триггера или None"""
+        return self._where.get(key)